@@ -5,8 +5,7 @@ from django.contrib.auth.forms import PasswordChangeForm
 from django.contrib import messages
 from django.contrib.auth import update_session_auth_hash
 from django.views.decorators.csrf import csrf_exempt
-from channels.layers import get_channel_layer
-from asgiref.sync import async_to_sync
+from clinic_project.broadcast import broadcast
 from django.http import JsonResponse
 from django.template.loader import select_template
 import json
@@ -22,9 +21,6 @@ def register(request):
             user.username = form.cleaned_data['email']
             user.save()
             
-            # Get the channel layer
-            channel_layer = get_channel_layer()
-            
             # Prepare patient data for WebSocket
             patient_data = {
                 'id': user.id,
@@ -37,8 +33,8 @@ def register(request):
                 'initials': f"{(user.first_name[0] if user.first_name else '')}{(user.last_name[0] if user.last_name else '')}" or 'P'
             }
             
-            # Send WebSocket message
-            async_to_sync(channel_layer.group_send)(
+            # Send WebSocket message after commit, batched with other dashboard updates
+            broadcast(
                 'dashboard_updates',
                 {
                     'type': 'patient.update',
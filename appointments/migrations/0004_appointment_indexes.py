@@ -0,0 +1,23 @@
+# Generated by Django 5.0.14 on 2026-10-19 07:59
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('appointments', '0003_alter_appointment_options_and_more'),
+        ('doctors', '0002_specialization_slug'),
+        ('patients', '0013_payment_expense_indexes'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='appointment',
+            index=models.Index(fields=['doctor', 'appointment_date', 'status'], name='appointments_doc_date_st_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='appointment',
+            index=models.Index(fields=['appointment_date', 'appointment_time'], name='appointments_date_time_idx'),
+        ),
+    ]
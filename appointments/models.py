@@ -177,6 +177,12 @@ class Appointment(models.Model):
         verbose_name_plural = _('appointments')
         ordering = ['-appointment_date', '-appointment_time']
         unique_together = ('doctor', 'appointment_date', 'appointment_time')
+        indexes = [
+            # Doctor revenue and schedule lookups filter on doctor, date range and status
+            models.Index(fields=['doctor', 'appointment_date', 'status'], name='appointments_doc_date_st_idx'),
+            # Day views and "upcoming" lists filter and sort on date then time
+            models.Index(fields=['appointment_date', 'appointment_time'], name='appointments_date_time_idx'),
+        ]
 
 class Prescription(models.Model):
     """Model representing a prescription for a patient"""
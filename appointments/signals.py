@@ -1,5 +1,7 @@
-from django.db.models.signals import post_save
+from django.db import transaction
+from django.db.models.signals import post_delete, post_init, post_save
 from django.dispatch import receiver
+from clinic_project.query_cache import APPOINTMENTS, bump
 from .models import Appointment
 
 
@@ -31,3 +33,27 @@ def store_original_status(sender, instance, **kwargs):
             instance._original_status = original.status
         except Appointment.DoesNotExist:
             instance._original_status = None
+
+
+@receiver(post_save, sender=Appointment)
+@receiver(post_delete, sender=Appointment)
+def bump_appointments_cache(sender, instance, **kwargs):
+    """Invalidate cached appointment counts once the write is committed"""
+    transaction.on_commit(lambda: bump(APPOINTMENTS))
+
+
+@receiver(post_init, sender=Appointment)
+def remember_appointment_status(sender, instance, **kwargs):
+    # Read from __dict__ so a deferred status field is not fetched just for this
+    instance._loaded_status = instance.__dict__.get('status')
+
+
+@receiver(post_save, sender=Appointment)
+def publish_appointment_status(sender, instance, created, **kwargs):
+    """Push new appointments and status changes to the live dashboards"""
+    from clinic_project import live
+
+    old_status = None if created else instance._loaded_status
+    if created or old_status != instance.status:
+        live.appointment_status_changed(instance, old_status)
+    instance._loaded_status = instance.status
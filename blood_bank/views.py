@@ -35,26 +35,34 @@ def get_donor_statistics():
     }
     return stats
 
+BLOOD_TYPES = ['A+', 'A-', 'B+', 'B-', 'AB+', 'AB-', 'O+', 'O-']
+
+def _inventory_querysets():
+    """Donated and transferred units per blood type, one grouped query each"""
+    from django.db.models import Sum
+    donated = Donor.objects.values_list('blood_group').annotate(total=Sum('donation_count')).order_by()
+    transferred = BloodTransfer.objects.values_list('blood_type').annotate(total=Sum('units')).order_by()
+    return donated, transferred
+
+def _available_units(donated, transferred):
+    # Available = Donated - Transferred (minimum 0, never negative)
+    return {
+        blood_type: max(0, (donated.get(blood_type) or 0) - (transferred.get(blood_type) or 0))
+        for blood_type in BLOOD_TYPES
+    }
+
 def get_blood_inventory():
     """Get blood inventory counts - donated units minus transferred units"""
-    from django.db.models import Sum
-    blood_types = ['A+', 'A-', 'B+', 'B-', 'AB+', 'AB-', 'O+', 'O-']
-    inventory = {}
-    
-    for blood_type in blood_types:
-        # Sum the donation_count for all donors of this blood type
-        total_donated = Donor.objects.filter(blood_group=blood_type).aggregate(Sum('donation_count'))['donation_count__sum']
-        total_donated = total_donated if total_donated else 0
-        
-        # Sum the units transferred for this blood type
-        total_transferred = BloodTransfer.objects.filter(blood_type=blood_type).aggregate(Sum('units'))['units__sum']
-        total_transferred = total_transferred if total_transferred else 0
-        
-        # Available = Donated - Transferred (minimum 0, never negative)
-        available = total_donated - total_transferred
-        inventory[blood_type] = max(0, available)  # Never show negative inventory
-    
-    return inventory
+    donated, transferred = _inventory_querysets()
+    return _available_units(dict(donated), dict(transferred))
+
+async def aget_blood_inventory():
+    """Async variant of get_blood_inventory for the polled inventory API"""
+    donated, transferred = _inventory_querysets()
+    return _available_units(
+        {blood_type: total async for blood_type, total in donated},
+        {blood_type: total async for blood_type, total in transferred},
+    )
 
 def get_blood_flow_totals():
     """Get total units in (donated) and out (transferred)"""
@@ -78,9 +86,9 @@ def donor_statistics_api(request):
     return JsonResponse(stats)
 
 @require_http_methods(["GET"])
-def blood_inventory_api(request):
+async def blood_inventory_api(request):
     """API endpoint to get blood inventory"""
-    inventory = get_blood_inventory()
+    inventory = await aget_blood_inventory()
     return JsonResponse(inventory)
 
 @require_http_methods(["GET"])
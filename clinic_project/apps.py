@@ -0,0 +1,19 @@
+from django.apps import AppConfig
+
+
+class ClinicProjectConfig(AppConfig):
+    name = 'clinic_project'
+    verbose_name = 'Clinic project'
+    
+    def ready(self):
+        from django.conf import settings
+        from django.db.backends.signals import connection_created
+        from .database import configure_sqlite
+        
+        connection_created.connect(configure_sqlite, dispatch_uid='clinic_project.configure_sqlite')
+        if settings.METRICS_ENABLED:
+            from . import metrics
+            connection_created.connect(metrics.install_on_connect, dispatch_uid='clinic_project.metrics')
+        if settings.QUERY_BUDGET_ENABLED:
+            from .query_budget import install_on_connect
+            connection_created.connect(install_on_connect, dispatch_uid='clinic_project.query_budget')
@@ -0,0 +1,40 @@
+"""
+Helpers for async read-only JSON endpoints.
+
+Frequently polled endpoints (vitals, equipment status, blood inventory, the
+OT calendar) are ``async def`` views under daphne. A waiting poller costs
+a coroutine rather than a worker thread, and the whole middleware chain is
+async-capable (see ``clinic_project.static``), so these requests are not
+routed through a thread either. Throughput is another matter. Django runs
+every async ORM query on one shared thread per process, so the requests
+per second of a process are about the same as with sync views. Add
+processes to get more.
+
+Django 5.0's ``login_required`` does not support coroutine views, so
+``async_login_required`` is provided for them.
+"""
+from functools import wraps
+
+from django.contrib.auth.views import redirect_to_login
+
+
+async def fetch_json(queryset, serialize):
+    """Evaluate ``queryset`` with the async ORM and serialize each row"""
+    return [serialize(obj) async for obj in queryset]
+
+
+def async_login_required(view):
+    """``login_required`` for ``async def`` views; resolves the user without blocking"""
+    @wraps(view)
+    async def wrapper(request, *args, **kwargs):
+        user = await request.auser()
+        if not user.is_authenticated:
+            return redirect_to_login(request.get_full_path())
+        return await view(request, *args, **kwargs)
+    return wrapper
+
+
+async def authenticated_user(request):
+    """The request's user, or ``None`` if anonymous (for endpoints answering 401/403 in JSON)"""
+    user = await request.auser()
+    return user if user.is_authenticated else None
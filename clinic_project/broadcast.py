@@ -0,0 +1,128 @@
+"""
+Coalesced, post-commit broadcasts to WebSocket groups.
+
+Views and signal handlers call ``broadcast(group, message)`` instead of
+``async_to_sync(channel_layer.group_send)``. Messages are queued once the
+surrounding transaction commits and a background thread delivers them
+every ``FLUSH_INTERVAL`` seconds as one ``dashboard.batch`` message per
+group. A request never waits on the channel layer, and an import that
+writes thousands of rows sends a handful of layer messages instead of one
+per row.
+
+Each group buffers at most ``MAX_PENDING`` KPI deltas per tick. When a
+burst exceeds that, the buffered deltas are dropped and a single
+``dashboard.resync`` is sent instead, telling clients to fetch a fresh KPI
+snapshot rather than replaying the backlog. A snapshot cannot replace any
+other message, so alerts and patient updates are always delivered.
+
+The thread is a daemon, so a management command can finish before its
+last tick. ``manage.py`` therefore calls ``broadcaster.flush()`` once the
+command returns, which waits for a flush already in progress and sends
+whatever is still queued.
+
+``InMemoryChannelLayer`` queues are bound to the server's event loop and
+must not be written from another thread, so with that (development-only)
+layer messages are delivered inline on commit instead of by the thread.
+"""
+import logging
+import threading
+import time
+from collections import defaultdict
+
+from asgiref.sync import async_to_sync
+from channels.layers import InMemoryChannelLayer, get_channel_layer
+from django.db import transaction
+
+logger = logging.getLogger(__name__)
+
+FLUSH_INTERVAL = 0.25
+MAX_PENDING = 500
+# Messages a dashboard.resync (a fresh KPI snapshot) makes redundant
+RESYNC_REPLACES = ('kpi.delta',)
+
+
+class Broadcaster:
+    def __init__(self, interval=FLUSH_INTERVAL, max_pending=MAX_PENDING):
+        self.interval = interval
+        self.max_pending = max_pending
+        self._lock = threading.Lock()
+        self._pending = defaultdict(list)
+        self._replaceable = defaultdict(int)
+        self._overflowed = set()
+        self._flushing = threading.Lock()
+        self._wakeup = threading.Event()
+        self._thread = None
+
+    def send(self, group, message):
+        """Queue ``message`` for ``group`` once the current transaction commits"""
+        transaction.on_commit(lambda: self._enqueue(group, message))
+
+    def _enqueue(self, group, message):
+        if isinstance(get_channel_layer(), InMemoryChannelLayer):
+            self._deliver(group, {'type': 'dashboard.batch', 'messages': [message]})
+            return
+        with self._lock:
+            pending = self._pending[group]
+            if message.get('type') in RESYNC_REPLACES:
+                if group in self._overflowed:
+                    return
+                if self._replaceable[group] >= self.max_pending:
+                    self._overflowed.add(group)
+                    pending[:] = [queued for queued in pending if queued.get('type') not in RESYNC_REPLACES]
+                    self._ensure_thread()
+                    self._wakeup.set()
+                    return
+                self._replaceable[group] += 1
+            pending.append(message)
+            self._ensure_thread()
+        self._wakeup.set()
+
+    def _ensure_thread(self):
+        if self._thread is None or not self._thread.is_alive():
+            self._thread = threading.Thread(target=self._run, name='dashboard-broadcaster', daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        while True:
+            self._wakeup.wait()
+            # Let the rest of the tick's messages arrive before sending
+            time.sleep(self.interval)
+            self._wakeup.clear()
+            self.flush()
+
+    def flush(self):
+        """Deliver everything queued so far; returns the number of layer messages sent"""
+        # One flush at a time, so a caller also waits for the thread's delivery in progress
+        with self._flushing:
+            with self._lock:
+                pending, self._pending = self._pending, defaultdict(list)
+                overflowed, self._overflowed = self._overflowed, set()
+                self._replaceable = defaultdict(int)
+
+            sent = 0
+            for group in set(pending) | overflowed:
+                # The resync goes first, so the kept messages arrive after the snapshot
+                messages = ([{'type': 'dashboard.resync'}] if group in overflowed else []) + pending[group]
+                if messages:
+                    sent += self._deliver(group, {'type': 'dashboard.batch', 'messages': messages})
+            return sent
+
+    def _deliver(self, group, message):
+        channel_layer = get_channel_layer()
+        if channel_layer is None:
+            return 0
+        try:
+            async_to_sync(channel_layer.group_send)(group, message)
+        except Exception as e:
+            # A dashboard refresh is never worth failing the write that triggered it
+            logger.error(f"Could not broadcast to {group}: {str(e)}")
+            return 0
+        return 1
+
+
+broadcaster = Broadcaster()
+
+
+def broadcast(group, message):
+    """Send ``message`` to ``group`` after commit, coalesced with other messages of the same tick"""
+    broadcaster.send(group, message)
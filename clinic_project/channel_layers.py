@@ -0,0 +1,166 @@
+"""
+SQLite-backed channel layer.
+
+``InMemoryChannelLayer`` only delivers messages inside one process, so a
+broadcast from one daphne worker never reaches sockets held by another.
+This layer keeps channels and groups in a shared SQLite file (WAL mode), so
+every worker on the same host sees the same messages without running a
+separate broker. It is opt-in (``DJANGO_CHANNEL_LAYER=sqlite``), meant for
+tests and multi-process development: every open socket polls the file.
+Production uses ``channels_redis`` (``DJANGO_CHANNEL_LAYER=redis``).
+
+Receivers poll their channel every ``poll_interval`` seconds with a
+read-only query; the write lock is only taken to remove a message that was
+found. Each channel
+holds at most ``capacity`` unexpired messages; ``send`` raises
+``ChannelFull`` beyond that and ``group_send`` skips the full member, so a
+consumer that stops reading cannot grow the queue without bound.
+"""
+import asyncio
+import json
+import sqlite3
+import threading
+import time
+import uuid
+
+from channels.exceptions import ChannelFull
+from channels.layers import BaseChannelLayer
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS channel_messages (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    channel TEXT NOT NULL,
+    body TEXT NOT NULL,
+    expires REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS channel_messages_channel_idx ON channel_messages (channel, id);
+CREATE TABLE IF NOT EXISTS channel_groups (
+    group_name TEXT NOT NULL,
+    channel TEXT NOT NULL,
+    expires REAL NOT NULL,
+    PRIMARY KEY (group_name, channel)
+);
+"""
+
+
+class SQLiteChannelLayer(BaseChannelLayer):
+    extensions = ['groups', 'flush']
+
+    def __init__(self, path, expiry=60, group_expiry=86400, capacity=100, channel_capacity=None,
+                 poll_interval=0.05, **kwargs):
+        super().__init__(expiry=expiry, capacity=capacity, channel_capacity=channel_capacity, **kwargs)
+        self.path = str(path)
+        self.group_expiry = group_expiry
+        self.poll_interval = poll_interval
+        self._local = threading.local()
+        self._connection().executescript(SCHEMA)
+
+    def _connection(self):
+        # sqlite3 connections cannot be shared across threads, and the
+        # blocking calls below run in a worker thread pool
+        connection = getattr(self._local, 'connection', None)
+        if connection is None:
+            connection = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            connection.execute('PRAGMA journal_mode=WAL')
+            connection.execute('PRAGMA synchronous=NORMAL')
+            self._local.connection = connection
+        return connection
+
+    # Blocking helpers, always run through asyncio.to_thread
+
+    def _send_many(self, channels, body, ignore_full):
+        connection = self._connection()
+        now = time.time()
+        connection.execute('BEGIN IMMEDIATE')
+        try:
+            for channel in channels:
+                connection.execute('DELETE FROM channel_messages WHERE channel = ? AND expires < ?', (channel, now))
+                (queued,) = connection.execute(
+                    'SELECT COUNT(*) FROM channel_messages WHERE channel = ?', (channel,)
+                ).fetchone()
+                if queued >= self.get_capacity(channel):
+                    if ignore_full:
+                        continue
+                    raise ChannelFull(channel)
+                connection.execute(
+                    'INSERT INTO channel_messages (channel, body, expires) VALUES (?, ?, ?)',
+                    (channel, body, now + self.expiry),
+                )
+        except BaseException:
+            connection.execute('ROLLBACK')
+            raise
+        connection.execute('COMMIT')
+
+    def _pop(self, channel):
+        connection = self._connection()
+        while True:
+            # A plain read takes no lock under WAL, so polling an empty channel
+            # never competes with writers; only a found message is deleted
+            row = connection.execute(
+                'SELECT id, body FROM channel_messages WHERE channel = ? AND expires >= ? ORDER BY id LIMIT 1',
+                (channel, time.time()),
+            ).fetchone()
+            if row is None:
+                return None
+            # Single-statement delete; if another receiver took the row first, look again
+            if connection.execute('DELETE FROM channel_messages WHERE id = ?', (row[0],)).rowcount:
+                return row[1]
+
+    def _group_channels(self, group):
+        return [
+            channel for (channel,) in self._connection().execute(
+                'SELECT channel FROM channel_groups WHERE group_name = ? AND expires >= ?', (group, time.time())
+            )
+        ]
+
+    def _execute(self, sql, params=()):
+        self._connection().execute(sql, params)
+
+    # Channel layer API
+
+    async def send(self, channel, message):
+        assert isinstance(message, dict), 'message is not a dict'
+        assert self.require_valid_channel_name(channel)
+        await asyncio.to_thread(self._send_many, [channel], json.dumps(message), False)
+
+    async def receive(self, channel):
+        assert self.require_valid_channel_name(channel)
+        while True:
+            body = await asyncio.to_thread(self._pop, channel)
+            if body is not None:
+                return json.loads(body)
+            await asyncio.sleep(self.poll_interval)
+
+    async def new_channel(self, prefix='specific'):
+        return f'{prefix}.sqlite!{uuid.uuid4().hex}'
+
+    async def group_add(self, group, channel):
+        assert self.require_valid_group_name(group), 'Group name not valid'
+        assert self.require_valid_channel_name(channel), 'Channel name not valid'
+        await asyncio.to_thread(
+            self._execute,
+            'INSERT OR REPLACE INTO channel_groups (group_name, channel, expires) VALUES (?, ?, ?)',
+            (group, channel, time.time() + self.group_expiry),
+        )
+
+    async def group_discard(self, group, channel):
+        assert self.require_valid_group_name(group), 'Group name not valid'
+        assert self.require_valid_channel_name(channel), 'Channel name not valid'
+        await asyncio.to_thread(
+            self._execute, 'DELETE FROM channel_groups WHERE group_name = ? AND channel = ?', (group, channel)
+        )
+
+    async def group_send(self, group, message):
+        assert isinstance(message, dict), 'Message is not a dict'
+        assert self.require_valid_group_name(group), 'Group name not valid'
+        channels = await asyncio.to_thread(self._group_channels, group)
+        if channels:
+            # Members that are full simply miss the message, as with the other layers
+            await asyncio.to_thread(self._send_many, channels, json.dumps(message), True)
+
+    async def flush(self):
+        await asyncio.to_thread(self._execute, 'DELETE FROM channel_messages')
+        await asyncio.to_thread(self._execute, 'DELETE FROM channel_groups')
+
+    async def close(self):
+        pass
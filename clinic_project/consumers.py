@@ -7,16 +7,42 @@ from django.contrib.auth import get_user_model
 logger = logging.getLogger(__name__)
 
 
+def _can_view_kpis(user):
+    return user is not None and user.is_authenticated and (user.is_staff or getattr(user, 'user_type', '') == 'admin')
+
+
+def _can_view_alerts(user):
+    return user is not None and user.is_authenticated and (
+        user.is_staff or getattr(user, 'user_type', '') in ('admin', 'doctor', 'nurse')
+    )
+
+
 class DashboardConsumer(AsyncWebsocketConsumer):
+    kpis_enabled = False
+    alerts_enabled = False
+    
     async def connect(self):
         try:
             # Add this connection to the 'dashboard_updates' group
             await self.channel_layer.group_add("dashboard_updates", self.channel_name)
             await self.accept()
             logger.info("WebSocket connected")
+            
+            # Financial KPIs are only streamed to staff
+            self.kpis_enabled = _can_view_kpis(self.scope.get('user'))
+            # Clinical alerts go to clinicians as well
+            self.alerts_enabled = _can_view_alerts(self.scope.get('user'))
+            if self.kpis_enabled:
+                await self.send_snapshot()
         except Exception as e:
             logger.error(f"WebSocket connection error: {str(e)}")
             await self.close()
+    
+    async def send_snapshot(self):
+        from .live import kpi_snapshot
+        
+        snapshot = await database_sync_to_async(kpi_snapshot)()
+        await self.send(text_data=json.dumps({'type': 'kpi.snapshot', 'data': snapshot}))
 
     async def disconnect(self, close_code):
         # Remove this connection from the 'dashboard_updates' group
@@ -32,6 +58,10 @@ class DashboardConsumer(AsyncWebsocketConsumer):
             if text_data:
                 data = json.loads(text_data)
                 logger.info(f"Received WebSocket message: {data}")
+                
+                # Clients re-sync after missing events (e.g. a hidden tab)
+                if data.get('type') == 'kpi.snapshot' and self.kpis_enabled:
+                    await self.send_snapshot()
         except Exception as e:
             logger.error(f"Error processing WebSocket message: {str(e)}")
 
@@ -69,3 +99,37 @@ class DashboardConsumer(AsyncWebsocketConsumer):
                 }))
             except:
                 pass
+
+    async def kpi_delta(self, event):
+        """Forward a typed KPI delta event published by clinic_project.live"""
+        if not self.kpis_enabled:
+            return
+        await self.send(text_data=json.dumps({
+            'type': 'kpi.delta',
+            'event': event['event'],
+            'data': event['data'],
+        }))
+
+    async def alerts_created(self, event):
+        """Forward a batch of new alerts raised by emr.alerting"""
+        if not self.alerts_enabled:
+            return
+        await self.send(text_data=json.dumps({
+            'type': 'alerts.created',
+            'count': event['count'],
+            'alerts': event['alerts'],
+        }))
+
+    async def dashboard_batch(self, event):
+        """Unpack messages coalesced by clinic_project.broadcast and dispatch each to its handler"""
+        for message in event['messages']:
+            handler = getattr(self, message['type'].replace('.', '_'), None)
+            if handler is None:
+                logger.error(f"No handler for dashboard message {message['type']}")
+                continue
+            await handler(message)
+
+    async def dashboard_resync(self, event):
+        """Too many events arrived at once; replace them with a fresh snapshot"""
+        if self.kpis_enabled:
+            await self.send_snapshot()
@@ -0,0 +1,170 @@
+"""
+Live dashboard events.
+
+Model writes publish small typed *delta* events to the ``dashboard_updates``
+channel group through the coalescing broadcaster. Connected dashboards apply them to their KPI counters
+instead of polling ``refresh_financial_data``. A client that connects (or
+reconnects) first receives a ``kpi.snapshot`` built by ``kpi_snapshot()``.
+
+Event types:
+
+- ``payment.created``: ``amount``, ``payment_type``, ``patient_id``, ``date``
+- ``payments.bulk_created``: ``amount``, ``bill_payment_amount``, ``settled_overdue_count``, ``count``, ``date``
+- ``expense.created``: ``amount``, ``category``, ``date``
+- ``bill.created``: ``bill_id``, ``amount``, ``overdue``
+- ``bills.bulk_created``: ``amount``, ``count``, ``overdue_count``
+- ``bill.paid``: ``bill_id``, ``bill_number``, ``amount``, ``patient_id``, ``was_overdue``
+- ``appointment.status_changed``: ``appointment_id``, ``doctor_id``, ``date``, ``old_status``
+  (None for a new appointment), ``status``
+- ``inventory.low_stock``: ``item_id``, ``name``, ``quantity``, ``minimum_quantity``
+
+Clinical alerts (``emr.alerting``) travel on the same group as their own
+``alerts.created`` message, which also reaches doctors and nurses.
+"""
+from datetime import date, timedelta
+
+from .broadcast import broadcast
+
+GROUP = 'dashboard_updates'
+
+
+def publish(event, data):
+    """Send a delta event to every dashboard once the current transaction commits"""
+    broadcast(GROUP, {
+        'type': 'kpi.delta',
+        'event': event,
+        'data': data,
+    })
+
+
+def _money(value):
+    return float(value or 0)
+
+
+def _as_date(value):
+    # Views often assign raw POST strings to date fields before saving
+    return date.fromisoformat(value) if isinstance(value, str) else value
+
+
+def _is_overdue(bill):
+    return bill.status != 'paid' and _as_date(bill.due_date) < date.today()
+
+
+def kpi_snapshot():
+    """Current KPI values a freshly connected dashboard starts from"""
+    from appointments.models import Appointment
+    from clinic_project.query_cache import APPOINTMENTS, BILLS, cached_result
+    from django.db.models import Count, F, Q, Sum
+    from inventory.models import Item
+    from patients.finance import next_period, revenue_expense_series
+    from patients.models import PatientBill
+
+    today = date.today()
+    current_month = today.replace(day=1)
+    month_end = next_period(current_month, 'month') - timedelta(days=1)
+    series = revenue_expense_series(current_month, month_end, 'month')
+
+    def compute_outstanding():
+        totals = PatientBill.objects.open().aggregate(
+            outstanding=Sum(F('amount') - F('paid_amount')),
+        )
+        return totals['outstanding'], PatientBill.objects.overdue(today).count()
+
+    def compute_appointments():
+        return Appointment.objects.aggregate(
+            today=Count('id', filter=Q(appointment_date=today)),
+            completed_this_month=Count('id', filter=Q(appointment_date__gte=current_month, status='completed')),
+        )
+
+    outstanding, overdue_count = cached_result('live:outstanding', [BILLS], compute_outstanding, params=[today])
+    appointments = cached_result('live:appointments', [APPOINTMENTS], compute_appointments, params=[today])
+
+    return {
+        'month': current_month.isoformat(),
+        'current_month_revenue': _money(series['revenue'][-1]),
+        'current_month_expenses': _money(series['expenses'][-1]),
+        'net_profit': _money(series['net'][-1]),
+        'outstanding': _money(outstanding),
+        'overdue_count': overdue_count,
+        'today_appointments': appointments['today'] or 0,
+        'completed_appointments': appointments['completed_this_month'] or 0,
+        'low_stock_count': Item.objects.filter(
+            is_active=True, quantity_in_stock__lte=F('minimum_quantity')
+        ).count(),
+    }
+
+
+def payment_created(payment):
+    publish('payment.created', {
+        'payment_id': payment.id,
+        'patient_id': payment.patient_id,
+        'amount': _money(payment.amount),
+        'payment_type': payment.payment_type,
+        'date': payment.payment_date.date().isoformat(),
+    })
+
+
+def payments_bulk_created(payments, settled_bills=()):
+    publish('payments.bulk_created', {
+        'count': len(payments),
+        'amount': _money(sum(payment.amount for payment in payments)),
+        'bill_payment_amount': _money(sum(
+            payment.amount for payment in payments if payment.payment_type == 'bill_payment'
+        )),
+        'settled_overdue_count': sum(1 for bill in settled_bills if _as_date(bill.due_date) < date.today()),
+        'date': date.today().isoformat(),
+    })
+
+
+def expense_created(expense):
+    publish('expense.created', {
+        'expense_id': expense.id,
+        'amount': _money(expense.amount),
+        'category': expense.category.name,
+        'date': _as_date(expense.expense_date).isoformat(),
+    })
+
+
+def bill_created(bill):
+    publish('bill.created', {
+        'bill_id': bill.id,
+        'amount': _money(bill.amount - bill.paid_amount),
+        'overdue': _is_overdue(bill),
+    })
+
+
+def bills_bulk_created(bills):
+    publish('bills.bulk_created', {
+        'count': len(bills),
+        'amount': _money(sum(bill.amount - bill.paid_amount for bill in bills)),
+        'overdue_count': sum(1 for bill in bills if _is_overdue(bill)),
+    })
+
+
+def bill_paid(bill):
+    publish('bill.paid', {
+        'bill_id': bill.id,
+        'bill_number': bill.bill_number,
+        'patient_id': bill.patient_id,
+        'amount': _money(bill.amount),
+        'was_overdue': _as_date(bill.due_date) < date.today(),
+    })
+
+
+def appointment_status_changed(appointment, old_status):
+    publish('appointment.status_changed', {
+        'appointment_id': appointment.id,
+        'doctor_id': appointment.doctor_id,
+        'date': _as_date(appointment.appointment_date).isoformat(),
+        'old_status': old_status,
+        'status': appointment.status,
+    })
+
+
+def inventory_low_stock(item):
+    publish('inventory.low_stock', {
+        'item_id': item.id,
+        'name': item.name,
+        'quantity': item.quantity_in_stock,
+        'minimum_quantity': item.minimum_quantity,
+    })
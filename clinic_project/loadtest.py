@@ -0,0 +1,67 @@
+"""
+Plain-asyncio HTTP/1.1 client pieces shared by the load-test commands.
+
+No third-party HTTP library is needed. Each simulated client keeps one
+keep-alive connection open and reads responses just far enough to reuse
+it, so a single process can drive a few hundred concurrent clients.
+"""
+import asyncio
+
+from django.conf import settings
+from django.contrib.auth import BACKEND_SESSION_KEY, HASH_SESSION_KEY, SESSION_KEY
+from django.contrib.sessions.backends.db import SessionStore
+
+
+def create_session(user):
+    """Session key for ``user`` with the same keys ``login()`` stores, without needing a request"""
+    session = SessionStore()
+    session[SESSION_KEY] = str(user.pk)
+    session[BACKEND_SESSION_KEY] = settings.AUTHENTICATION_BACKENDS[0]
+    session[HASH_SESSION_KEY] = user.get_session_auth_hash()
+    session.create()
+    return session.session_key
+
+
+def session_cookie(user):
+    return f'{settings.SESSION_COOKIE_NAME}={create_session(user)}'
+
+
+def build_request(host, path, cookie=''):
+    return (
+        f'GET {path} HTTP/1.1\r\nHost: {host}\r\nAccept: */*\r\n'
+        + (f'Cookie: {cookie}\r\n' if cookie else '')
+        + '\r\n'
+    ).encode()
+
+
+async def read_response(reader):
+    """Read one response; returns (status, whether the connection can be reused)"""
+    status_line = await reader.readline()
+    if not status_line:
+        raise asyncio.IncompleteReadError(b'', None)
+    status = int(status_line.split()[1])
+    headers = {}
+    while True:
+        line = await reader.readline()
+        if line in (b'\r\n', b'\n', b''):
+            break
+        name, _, value = line.decode('latin-1').partition(':')
+        headers[name.strip().lower()] = value.strip()
+
+    if 'content-length' in headers:
+        await reader.readexactly(int(headers['content-length']))
+    elif headers.get('transfer-encoding', '').lower() == 'chunked':
+        while True:
+            size = int((await reader.readline()).split(b';')[0], 16)
+            await reader.readexactly(size + 2)
+            if size == 0:
+                break
+    else:
+        await reader.read()
+        return status, False
+    return status, headers.get('connection', '').lower() != 'close'
+
+
+def percentile(ordered, p):
+    """``p`` (0-1) percentile of an already sorted list"""
+    return ordered[min(len(ordered) - 1, int(len(ordered) * p))]
@@ -0,0 +1,114 @@
+from django.core.management.base import BaseCommand
+from clinic_project.database import apply_sqlite_pragmas
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+
+
+class Command(BaseCommand):
+    help = 'Compare concurrent write throughput of default SQLite settings against the tuned profile'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--writers', type=int, default=8, help='Concurrent writer threads')
+        parser.add_argument('--transactions', type=int, default=200, help='Transactions per writer')
+        parser.add_argument('--rows', type=int, default=5, help='Rows inserted per transaction')
+        parser.add_argument(
+            '--timeout',
+            type=float,
+            default=5.0,
+            help='Lock wait (s) for the default profile, matching the sqlite3 driver default'
+        )
+        parser.add_argument(
+            '--immediate',
+            action='store_true',
+            help="Open transactions with BEGIN IMMEDIATE (what Django 5.1's transaction_mode option does) "
+                 "instead of the deferred BEGIN of this project's Django 5.0"
+        )
+
+    def handle(self, *args, **options):
+        profiles = [
+            ('default', self.default_connection(options['timeout'])),
+            ('tuned', self.tuned_connection),
+        ]
+        for name, connect in profiles:
+            with tempfile.TemporaryDirectory() as directory:
+                path = os.path.join(directory, 'bench.sqlite3')
+                result = self.run_profile(path, connect, options)
+            self.stdout.write(
+                f"{name:8} {result['committed']:6} tx committed  {result['locked']:5} locked errors  "
+                f"{result['elapsed']:6.2f}s  {result['committed'] / result['elapsed']:8,.0f} tx/s  "
+                f"reads during writes: {result['reads']}"
+            )
+
+    def default_connection(self, timeout):
+        def connect(path):
+            return sqlite3.connect(path, timeout=timeout, isolation_level=None, check_same_thread=False)
+        return connect
+
+    def tuned_connection(self, path):
+        # As Django opens it: driver defaults, then the pragmas (busy_timeout included)
+        connection = sqlite3.connect(path, isolation_level=None, check_same_thread=False)
+        apply_sqlite_pragmas(connection.cursor())
+        return connection
+
+    def run_profile(self, path, connect, options):
+        setup = connect(path)
+        setup.execute(
+            'CREATE TABLE bench (id INTEGER PRIMARY KEY, patient_id INTEGER, amount TEXT, created REAL)'
+        )
+        setup.close()
+
+        counts = {'committed': 0, 'locked': 0, 'reads': 0}
+        lock = threading.Lock()
+        writers_done = threading.Event()
+
+        def writer(number):
+            connection = connect(path)
+            for _ in range(options['transactions']):
+                try:
+                    # As Django 5.0's atomic() around a bill + payment write: a deferred
+                    # BEGIN, a read (the bill), then the writes
+                    connection.execute('BEGIN IMMEDIATE' if options['immediate'] else 'BEGIN')
+                    connection.execute('SELECT COUNT(*) FROM bench WHERE patient_id = ?', (number,)).fetchone()
+                    connection.executemany(
+                        'INSERT INTO bench (patient_id, amount, created) VALUES (?, ?, ?)',
+                        [(number, '10.00', time.time()) for _ in range(options['rows'])],
+                    )
+                    connection.execute('COMMIT')
+                    with lock:
+                        counts['committed'] += 1
+                except sqlite3.OperationalError as e:
+                    if connection.in_transaction:
+                        connection.execute('ROLLBACK')
+                    if 'locked' not in str(e):
+                        raise
+                    with lock:
+                        counts['locked'] += 1
+            connection.close()
+
+        def reader():
+            # A dashboard polling while billing writes
+            connection = connect(path)
+            while not writers_done.is_set():
+                try:
+                    connection.execute('SELECT COUNT(*), SUM(amount) FROM bench').fetchone()
+                    with lock:
+                        counts['reads'] += 1
+                except sqlite3.OperationalError:
+                    pass
+            connection.close()
+
+        threads = [threading.Thread(target=writer, args=(i,)) for i in range(options['writers'])]
+        reader_thread = threading.Thread(target=reader)
+        started = time.perf_counter()
+        reader_thread.start()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        counts['elapsed'] = time.perf_counter() - started
+        writers_done.set()
+        reader_thread.join()
+        return counts
@@ -0,0 +1,97 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.db.models import F, Sum
+from datetime import date, timedelta
+import re
+
+# SQLite reports "SCAN <table>" and PostgreSQL "Seq Scan on <table>" when every row is read.
+# The second group is the index walked instead of the table, if any.
+FULL_SCAN_PATTERNS = {
+    'sqlite': re.compile(r'\bSCAN (?!CONSTANT ROW)(\w+)(?: USING (?:COVERING )?INDEX (\w+))?'),
+    'postgresql': re.compile(r'Seq Scan on (\w+)()'),
+}
+
+
+def partial_index_names():
+    """Indexes with a condition; walking one end to end only visits the rows it was built for"""
+    from django.apps import apps
+    return {
+        index.name
+        for model in apps.get_models()
+        for index in model._meta.indexes
+        if index.condition is not None
+    }
+
+
+def key_queries():
+    """The hot view queries each index in the index pack exists for, by name"""
+    from appointments.models import Appointment
+    from emr.models import Alert, VitalSigns
+    from inventory.models import Item
+    from operation_theater.models import Surgery
+    from patients.models import Expense, PatientBill, PatientPayment
+
+    today = date.today()
+    month_start = today.replace(day=1)
+    week_end = today + timedelta(days=7)
+
+    return {
+        'doctor completed appointments (accounts_finance)': Appointment.objects.filter(
+            doctor_id=1, appointment_date__gte=month_start, status='completed'
+        ),
+        "today's appointments (dashboard)": Appointment.objects.filter(appointment_date=today),
+        'upcoming appointments (dashboard)': Appointment.objects.filter(
+            appointment_date__gte=today
+        ).order_by('appointment_date', 'appointment_time')[:2],
+        'month-to-date payments (revenue_details)': PatientPayment.objects.filter(
+            payment_date__gte=month_start
+        ).select_related('patient__user'),
+        'patient payments around a visit (doctor revenue)': PatientPayment.objects.filter(
+            patient_id=1, payment_date__gte=month_start, payment_date__lte=week_end
+        ),
+        'overdue bills (accounts_finance)': PatientBill.objects.overdue(today),
+        'open bills (aging report)': PatientBill.objects.filter(status__in=['unpaid', 'partially_paid']),
+        'expenses by category (expenses)': Expense.objects.filter(
+            expense_date__gte=month_start, expense_date__lte=today
+        ).values('category__name').annotate(total=Sum('amount')),
+        'theater schedule (ot_dashboard)': Surgery.objects.filter(
+            operation_theater_id=1, scheduled_date__range=[today, week_end]
+        ),
+        'surgery calendar (get_calendar_events)': Surgery.objects.filter(
+            scheduled_date__range=[month_start, week_end]
+        ).select_related('patient__user', 'surgeon__user', 'operation_theater', 'surgery_type'),
+        'latest vitals (get_patient_vitals)': VitalSigns.objects.filter(patient_id=1).order_by('-recorded_at')[:10],
+        'unacknowledged alerts': Alert.objects.filter(is_acknowledged=False).order_by('-created_at'),
+        'low stock items (inventory)': Item.objects.filter(
+            is_active=True, quantity_in_stock__lte=F('minimum_quantity')
+        ),
+    }
+
+
+class Command(BaseCommand):
+    help = 'Run EXPLAIN on the key view queries and fail if any of them falls back to a full table scan'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--verbose-plans', action='store_true', help='Print every query plan')
+
+    def handle(self, *args, **options):
+        pattern = FULL_SCAN_PATTERNS.get(connection.vendor)
+        if pattern is None:
+            raise CommandError(f'Query plan checks are not supported on {connection.vendor}')
+
+        partial = partial_index_names()
+        failures = []
+        for name, queryset in key_queries().items():
+            plan = queryset.explain()
+            scanned = sorted({table for table, index in pattern.findall(plan) if index not in partial})
+            if options['verbose_plans']:
+                self.stdout.write(f'{name}:\n{plan}\n')
+            if scanned:
+                failures.append(name)
+                self.stdout.write(self.style.ERROR(f"FULL SCAN  {name}: {', '.join(scanned)}"))
+            else:
+                self.stdout.write(self.style.SUCCESS(f'indexed    {name}'))
+
+        if failures:
+            raise CommandError(f'{len(failures)} key queries fall back to a full table scan')
+        self.stdout.write(self.style.SUCCESS('All key queries use an index'))
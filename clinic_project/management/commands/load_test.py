@@ -0,0 +1,213 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.contrib.auth import get_user_model
+from clinic_project.loadtest import build_request, percentile, read_response, session_cookie
+from datetime import date, datetime, timedelta
+from urllib.parse import urlsplit
+import asyncio
+import json
+import statistics
+import subprocess
+import time
+
+User = get_user_model()
+
+
+def default_routes():
+    """name -> path of the pages and APIs measured, all requested as a staff user"""
+    today = date.today()
+    month_start = today.replace(day=1)
+    month_end = (month_start + timedelta(days=32)).replace(day=1)
+    return {
+        'dashboard': '/dashboard/',
+        'patient_bills': '/billing/patient-bills/',
+        'accounts_finance': '/finance/accounts/',
+        # Front-desk booking form (lists every active patient)
+        'booking': '/appointments/create/',
+        'ot_calendar': f'/ot-management/api/calendar-events/?start={month_start}&end={month_end}',
+        'blood_compatibility': '/blood-bank/api/compatibility/?blood_type=O%2B',
+    }
+
+
+class Command(BaseCommand):
+    help = (
+        'Drive the key pages of a running server with concurrent keep-alive clients and report '
+        'throughput and latency percentiles per route (run seed_clinic first)'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--url', default='http://127.0.0.1:8000', help='Base URL of the running server')
+        parser.add_argument(
+            '--route',
+            action='append',
+            dest='routes',
+            choices=sorted(default_routes()),
+            help='Route to include (repeatable); defaults to all of them'
+        )
+        parser.add_argument('--clients', type=int, default=20, help='Concurrent clients')
+        parser.add_argument('--duration', type=float, default=30.0, help='Seconds to measure')
+        parser.add_argument('--warmup', type=float, default=3.0, help='Seconds to run before measuring')
+        parser.add_argument('--email', help='Staff user to log in as (default: the first staff user)')
+        parser.add_argument('--output', help='Write the results to this JSON file')
+        parser.add_argument('--compare', help='JSON results of an earlier run to compare against')
+
+    def handle(self, *args, **options):
+        url = urlsplit(options['url'])
+        if url.scheme != 'http':
+            raise CommandError('Only plain http:// servers are supported')
+
+        routes = default_routes()
+        cookie = session_cookie(self.find_user(options['email']))
+        requests = {
+            name: build_request(url.hostname, routes[name], cookie)
+            for name in (options['routes'] or routes)
+        }
+        results = asyncio.run(self.run(
+            url.hostname, url.port or 80, requests, options['clients'], options['warmup'], options['duration']
+        ))
+        summary = self.summarize(results, options['duration'], options['clients'])
+        self.report(summary)
+
+        if options['compare']:
+            try:
+                with open(options['compare'], encoding='utf-8') as handle:
+                    self.compare(summary, json.load(handle))
+            except (OSError, ValueError) as e:
+                raise CommandError(f"Could not read {options['compare']}: {e}")
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as handle:
+                json.dump(summary, handle, indent=2)
+            self.stdout.write(f"Results written to {options['output']}")
+
+    def find_user(self, email):
+        if email:
+            try:
+                return User.objects.get(email=email)
+            except User.DoesNotExist:
+                raise CommandError(f'User {email} not found')
+        user = User.objects.filter(is_staff=True).order_by('pk').first()
+        if user is None:
+            raise CommandError('No staff user to log in as; run seed_clinic or pass --email')
+        return user
+
+    async def run(self, host, port, requests, clients, warmup, duration):
+        names = list(requests)
+        results = {name: {'latencies': [], 'statuses': {}, 'errors': 0} for name in names}
+        measure_from = time.perf_counter() + warmup
+        deadline = measure_from + duration
+        # Every client cycles through all routes, starting at a different one
+        await asyncio.gather(*(
+            self.client(host, port, requests, names[i % len(names):] + names[:i % len(names)],
+                        measure_from, deadline, results)
+            for i in range(clients)
+        ))
+        return results
+
+    async def client(self, host, port, requests, order, measure_from, deadline, results):
+        reader = writer = None
+        turn = 0
+        while time.perf_counter() < deadline:
+            name = order[turn % len(order)]
+            turn += 1
+            try:
+                if writer is None:
+                    reader, writer = await asyncio.open_connection(host, port)
+                started = time.perf_counter()
+                writer.write(requests[name])
+                await writer.drain()
+                status, keep_alive = await read_response(reader)
+                if started >= measure_from:
+                    results[name]['latencies'].append(time.perf_counter() - started)
+                    results[name]['statuses'][status] = results[name]['statuses'].get(status, 0) + 1
+                if not keep_alive:
+                    writer.close()
+                    writer = None
+            except (OSError, asyncio.IncompleteReadError, ValueError):
+                if time.perf_counter() >= measure_from:
+                    results[name]['errors'] += 1
+                if writer is not None:
+                    writer.close()
+                writer = None
+                await asyncio.sleep(0.05)
+        if writer is not None:
+            writer.close()
+
+    def summarize(self, results, duration, clients):
+        routes = {}
+        for name, result in results.items():
+            latencies = sorted(result['latencies'])
+            routes[name] = {
+                'requests': len(latencies),
+                'rps': round(len(latencies) / duration, 1),
+                'errors': result['errors'],
+                'statuses': {str(status): count for status, count in sorted(result['statuses'].items())},
+                # A redirect is a failure too: it is usually the login page, which is fast and proves nothing
+                'failures': sum(count for status, count in result['statuses'].items() if not 200 <= status < 300),
+                'mean_ms': round(statistics.mean(latencies) * 1000, 1) if latencies else None,
+                'p50_ms': round(percentile(latencies, 0.50) * 1000, 1) if latencies else None,
+                'p95_ms': round(percentile(latencies, 0.95) * 1000, 1) if latencies else None,
+                'p99_ms': round(percentile(latencies, 0.99) * 1000, 1) if latencies else None,
+            }
+        return {
+            'commit': self.current_commit(),
+            'run_at': datetime.now().isoformat(timespec='seconds'),
+            'clients': clients,
+            'duration': duration,
+            'total_rps': round(sum(route['requests'] for route in routes.values()) / duration, 1),
+            'routes': routes,
+        }
+
+    def current_commit(self):
+        try:
+            return subprocess.run(
+                ['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True, timeout=5
+            ).stdout.strip() or None
+        except (OSError, subprocess.SubprocessError):
+            return None
+
+    def report(self, summary):
+        self.stdout.write(
+            f"Commit {summary['commit'] or '?'}  {summary['clients']} clients  "
+            f"{summary['duration']:.0f}s  {summary['total_rps']:,.1f} req/s total"
+        )
+        self.stdout.write(f"{'route':<22}{'req/s':>8}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}{'errors':>8}  statuses")
+        for name, route in summary['routes'].items():
+            if not route['requests']:
+                self.stdout.write(self.style.ERROR(f"{name:<22}  no successful requests ({route['errors']} errors)"))
+                continue
+            line = (
+                f"{name:<22}{route['rps']:>8.1f}{route['p50_ms']:>9.1f}{route['p95_ms']:>9.1f}"
+                f"{route['p99_ms']:>9.1f}{route['errors']:>8}  {route['statuses']}"
+            )
+            if route['errors'] == 0 and not route['failures']:
+                self.stdout.write(line)
+            else:
+                self.stdout.write(self.style.WARNING(f"{line}  {route['failures']} non-2xx responses"))
+
+    def compare(self, summary, baseline):
+        self.stdout.write(f"\nAgainst {baseline.get('commit') or 'baseline'} ({baseline.get('run_at', '?')}):")
+        for name, route in summary['routes'].items():
+            before = baseline.get('routes', {}).get(name)
+            if not before or not before.get('p95_ms') or not route['p95_ms']:
+                continue
+            # Older results have no 'failures'; work it out from their statuses
+            failures = [
+                run.get('failures', sum(count for status, count in run['statuses'].items() if not status.startswith('2')))
+                for run in (before, route)
+            ]
+            if any(failures):
+                self.stdout.write(self.style.WARNING(
+                    f"{name:<22} not compared: non-2xx responses (baseline {failures[0]}, this run {failures[1]})"
+                ))
+                continue
+            p95_change = (route['p95_ms'] - before['p95_ms']) / before['p95_ms'] * 100
+            rps_change = (route['rps'] - before['rps']) / before['rps'] * 100 if before['rps'] else 0
+            line = (
+                f"{name:<22} p95 {before['p95_ms']:>8.1f} -> {route['p95_ms']:>8.1f} ms ({p95_change:+.0f}%)  "
+                f'req/s {rps_change:+.0f}%'
+            )
+            if p95_change > 10:
+                self.stdout.write(self.style.ERROR(line))
+            elif p95_change < -10:
+                self.stdout.write(self.style.SUCCESS(line))
+            else:
+                self.stdout.write(line)
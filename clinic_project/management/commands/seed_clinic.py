@@ -0,0 +1,488 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.db import transaction
+from django.utils import timezone
+from contextlib import contextmanager
+from datetime import date, datetime, time as dtime, timedelta
+from decimal import Decimal
+import random
+import time
+
+User = get_user_model()
+
+# Every seeded user and donor gets an address on this domain, and every other
+# seeded row carries SEED_TAG, so --clear can remove exactly what was generated
+SEED_DOMAIN = 'seed.clinic.test'
+SEED_TAG = '[seed]'
+BATCH_SIZE = 1000
+
+FIRST_NAMES = [
+    'Aisha', 'Ahmed', 'Sara', 'Omar', 'Fatima', 'Ali', 'Zainab', 'Hassan', 'Maryam', 'Usman',
+    'Hina', 'Bilal', 'Ayesha', 'Imran', 'Sana', 'Tariq', 'Nadia', 'Kamran', 'Rabia', 'Faisal',
+    'John', 'Emma', 'Liam', 'Olivia', 'Noah', 'Sophia', 'James', 'Mia', 'Lucas', 'Amelia',
+]
+LAST_NAMES = [
+    'Khan', 'Ahmed', 'Malik', 'Hussain', 'Sheikh', 'Qureshi', 'Butt', 'Chaudhry', 'Siddiqui', 'Raza',
+    'Smith', 'Johnson', 'Brown', 'Williams', 'Jones', 'Garcia', 'Miller', 'Davis', 'Wilson', 'Taylor',
+]
+SPECIALIZATIONS = [
+    'General Medicine', 'Cardiology', 'Pediatrics', 'Orthopedics', 'Dermatology',
+    'Gynecology', 'ENT', 'Neurology', 'General Surgery', 'Ophthalmology',
+]
+SURGERY_TYPES = [
+    ('Appendectomy', 60), ('Cholecystectomy', 90), ('Hernia Repair', 75),
+    ('Cataract Surgery', 45), ('Knee Arthroscopy', 90), ('Caesarean Section', 60),
+]
+EXPENSE_CATEGORIES = {
+    'Rent': (150000, 150000),
+    'Salaries': (600000, 900000),
+    'Utilities': (2000, 15000),
+    'Medical Supplies': (5000, 60000),
+    'Maintenance': (1000, 20000),
+    'Marketing': (2000, 25000),
+}
+INVENTORY_CATEGORIES = ['Medicines', 'Surgical Supplies', 'Consumables', 'Lab Supplies', 'PPE']
+BLOOD_GROUPS = ['A+', 'A-', 'B+', 'B-', 'AB+', 'AB-', 'O+', 'O-']
+PAYMENT_METHODS = ['cash', 'card', 'bank_transfer', 'insurance']
+SLOTS = [dtime(hour, minute) for hour in range(9, 17) for minute in (0, 20, 40)]
+
+
+@contextmanager
+def backdated(model, *field_names):
+    """Let ``bulk_create`` keep explicit values for ``auto_now_add`` fields"""
+    fields = [model._meta.get_field(name) for name in field_names]
+    for field in fields:
+        field.auto_now_add = False
+    try:
+        yield
+    finally:
+        for field in fields:
+            field.auto_now_add = True
+
+
+class Command(BaseCommand):
+    help = 'Generate a realistic synthetic clinic with bulk inserts for performance testing'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--patients', type=int, default=2000)
+        parser.add_argument('--doctors', type=int, default=25)
+        parser.add_argument('--years', type=float, default=2, help='Years of history ending today')
+        parser.add_argument('--appointments-per-day', type=int, default=60)
+        parser.add_argument('--donors', type=int, default=500)
+        parser.add_argument('--items', type=int, default=300, help='Inventory items')
+        parser.add_argument('--theaters', type=int, default=3)
+        parser.add_argument('--seed', type=int, default=42, help='Random seed, so runs are reproducible')
+        parser.add_argument('--password', default='seedpass123', help='Password of every seeded user')
+        parser.add_argument('--clear', action='store_true', help='Remove previously seeded data first')
+
+    def handle(self, *args, **options):
+        self.rng = random.Random(options['seed'])
+        self.today = date.today()
+        self.start = self.today - timedelta(days=int(options['years'] * 365))
+        self.end = self.today + timedelta(days=30)
+        self.password = make_password(options['password'])
+
+        if options['clear']:
+            self.clear()
+        elif User.objects.filter(email__endswith=f'@{SEED_DOMAIN}').exists():
+            raise CommandError('Seeded data already exists; run with --clear to replace it')
+
+        started = time.perf_counter()
+        with transaction.atomic():
+            self.step('staff', self.seed_staff)
+            self.step('doctors', self.seed_doctors, options['doctors'])
+            self.step('patients', self.seed_patients, options['patients'])
+            self.step('appointments', self.seed_appointments, options['appointments_per_day'])
+            self.step('payments and bills', self.seed_billing)
+            self.step('expenses', self.seed_expenses)
+            self.step('surgeries', self.seed_surgeries, options['theaters'])
+            self.step('donors and transfers', self.seed_blood_bank, options['donors'])
+            self.step('inventory', self.seed_inventory, options['items'])
+            self.step('account summaries', self.finish)
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Seeded clinic in {time.perf_counter() - started:.1f}s. '
+            f'Log in as admin@{SEED_DOMAIN} / {options["password"]}'
+        ))
+
+    def step(self, label, seed, *args):
+        started = time.perf_counter()
+        created = seed(*args)
+        self.stdout.write(f'  {label:<22} {created:>8,} rows  {time.perf_counter() - started:6.2f}s')
+
+    def days(self, start=None, end=None):
+        day = start or self.start
+        while day <= (end or self.end):
+            yield day
+            day += timedelta(days=1)
+
+    def aware(self, day, at):
+        return timezone.make_aware(datetime.combine(day, at))
+
+    def clear(self):
+        from blood_bank.models import BloodTransfer, Donor
+        from inventory.models import Item, Supplier
+        from operation_theater.models import OperationTheater
+        from patients.models import Expense
+
+        with transaction.atomic():
+            # Patients, doctors and everything hanging off them go with the users
+            User.objects.filter(email__endswith=f'@{SEED_DOMAIN}').delete()
+            Expense.objects.filter(description__endswith=SEED_TAG).delete()
+            Donor.objects.filter(email__endswith=f'@{SEED_DOMAIN}').delete()
+            BloodTransfer.objects.filter(notes=SEED_TAG).delete()
+            Item.objects.filter(barcode__startswith='SEED-').delete()
+            Supplier.objects.filter(email__endswith=f'@{SEED_DOMAIN}').delete()
+            OperationTheater.objects.filter(description=SEED_TAG).delete()
+        self.stdout.write('Removed previously seeded data')
+
+    def make_users(self, prefix, count, user_type):
+        users = [
+            User(
+                email=f'{prefix}{n}@{SEED_DOMAIN}',
+                password=self.password,
+                first_name=self.rng.choice(FIRST_NAMES),
+                last_name=self.rng.choice(LAST_NAMES),
+                user_type=user_type,
+                phone=f'0300{self.rng.randrange(10 ** 7):07d}',
+            )
+            for n in range(count)
+        ]
+        return User.objects.bulk_create(users, batch_size=BATCH_SIZE)
+
+    def seed_staff(self):
+        self.admin = User.objects.create(
+            email=f'admin@{SEED_DOMAIN}', password=self.password, first_name='Seed', last_name='Admin',
+            user_type='admin', is_staff=True,
+        )
+        return 1
+
+    def seed_doctors(self, count):
+        from doctors.models import Doctor, DoctorSchedule, Specialization
+
+        specializations = [Specialization.objects.get_or_create(name=name)[0] for name in SPECIALIZATIONS]
+        users = self.make_users('doctor', count, 'doctor')
+        self.doctors = Doctor.objects.bulk_create([
+            Doctor(
+                user=user,
+                license_number=f'SEED-LIC-{n:05d}',
+                gender=self.rng.choice('MF'),
+                experience=self.rng.randint(2, 30),
+                consultation_fee=Decimal(self.rng.choice([1000, 1500, 2000, 2500, 3000, 5000])),
+            )
+            for n, user in enumerate(users)
+        ], batch_size=BATCH_SIZE)
+
+        Through = Doctor.specialization.through
+        links = Through.objects.bulk_create([
+            Through(doctor_id=doctor.pk, specialization_id=self.rng.choice(specializations).pk)
+            for doctor in self.doctors
+        ], batch_size=BATCH_SIZE)
+        schedules = DoctorSchedule.objects.bulk_create([
+            DoctorSchedule(doctor=doctor, day_of_week=day, start_time=dtime(9), end_time=dtime(17))
+            for doctor in self.doctors
+            for day in range(6)
+        ], batch_size=BATCH_SIZE)
+        return len(users) + len(self.doctors) + len(links) + len(schedules)
+
+    def seed_patients(self, count):
+        from patients.models import Patient
+
+        users = self.make_users('patient', count, 'patient')
+        self.patients = Patient.objects.bulk_create([
+            Patient(
+                user=user,
+                date_of_birth=self.today - timedelta(days=self.rng.randint(365, 90 * 365)),
+                gender=self.rng.choice('MF'),
+                blood_group=self.rng.choice(BLOOD_GROUPS),
+            )
+            for user in users
+        ], batch_size=BATCH_SIZE)
+        return len(users) * 2
+
+    def seed_appointments(self, per_day):
+        from appointments.models import Appointment
+
+        self.completed = []
+        appointments = []
+        slots = [(doctor, slot) for doctor in self.doctors for slot in SLOTS]
+        for day in self.days():
+            if day.weekday() == 6:
+                continue
+            for doctor, slot in self.rng.sample(slots, min(per_day, len(slots))):
+                if day < self.today:
+                    status = self.rng.choices(
+                        ['completed', 'cancelled', 'no_show'], weights=[85, 8, 7]
+                    )[0]
+                else:
+                    status = self.rng.choice(['scheduled', 'confirmed'])
+                appointment = Appointment(
+                    patient=self.rng.choice(self.patients),
+                    doctor=doctor,
+                    appointment_type=self.rng.choices(
+                        ['consultation', 'follow_up', 'routine_checkup', 'emergency'], weights=[55, 30, 10, 5]
+                    )[0],
+                    status=status,
+                    appointment_date=day,
+                    appointment_time=slot,
+                    end_time=(datetime.combine(day, slot) + timedelta(minutes=20)).time(),
+                    is_paid=status == 'completed',
+                    payment_amount=doctor.consultation_fee if status == 'completed' else 0,
+                )
+                appointments.append(appointment)
+                if status == 'completed':
+                    self.completed.append(appointment)
+        Appointment.objects.bulk_create(appointments, batch_size=BATCH_SIZE)
+        return len(appointments)
+
+    def seed_billing(self):
+        from patients.models import PatientBill, PatientPayment
+        from patients.sequences import BILL, PAYMENT, next_numbers
+
+        payments = []
+        bills = []
+        for appointment in self.completed:
+            doctor_name = appointment.doctor.user.get_full_name()
+            paid_at = self.aware(appointment.appointment_date, appointment.appointment_time)
+            payments.append(PatientPayment(
+                patient=appointment.patient,
+                payment_type='consultation',
+                amount=appointment.doctor.consultation_fee,
+                payment_method=self.rng.choice(PAYMENT_METHODS),
+                payment_date=paid_at,
+                notes=f'Consultation with Dr. {doctor_name}',
+            ))
+            if self.rng.random() >= 0.25:
+                continue
+
+            amount = Decimal(self.rng.randrange(20, 800) * 50)
+            due_date = appointment.appointment_date + timedelta(days=30)
+            settled = self.rng.random()
+            # Most bills past their due date have been settled, fewer of the recent ones
+            if settled < (0.7 if due_date < self.today else 0.3):
+                paid = amount
+            elif settled < 0.85:
+                paid = (amount * Decimal(self.rng.randint(1, 9)) / 10).quantize(Decimal('0.01'))
+            else:
+                paid = Decimal('0')
+            bill = PatientBill(
+                patient=appointment.patient,
+                description=self.rng.choice(['Lab tests', 'Procedure', 'Medication', 'Imaging', 'Dressing']),
+                amount=amount,
+                paid_amount=paid,
+                bill_date=paid_at,
+                due_date=due_date,
+                created_by=self.admin,
+            )
+            bill.update_status()
+            bills.append(bill)
+            if paid:
+                payments.append(PatientPayment(
+                    patient=appointment.patient,
+                    payment_type='bill_payment',
+                    amount=paid,
+                    payment_method=self.rng.choice(PAYMENT_METHODS),
+                    payment_date=paid_at + timedelta(days=self.rng.randint(0, 29)),
+                ))
+
+        for bill, number in zip(bills, next_numbers(BILL, len(bills)) if bills else []):
+            bill.bill_number = number
+        for payment, number in zip(payments, next_numbers(PAYMENT, len(payments)) if payments else []):
+            payment.payment_number = number
+        with backdated(PatientBill, 'bill_date'), backdated(PatientPayment, 'payment_date'):
+            PatientBill.objects.bulk_create(bills, batch_size=BATCH_SIZE)
+            PatientPayment.objects.bulk_create(payments, batch_size=BATCH_SIZE)
+        return len(bills) + len(payments)
+
+    def seed_expenses(self):
+        from patients.models import Expense, ExpenseCategory
+
+        categories = {name: ExpenseCategory.objects.get_or_create(name=name)[0] for name in EXPENSE_CATEGORIES}
+        expenses = []
+
+        def add(day, name):
+            low, high = EXPENSE_CATEGORIES[name]
+            expenses.append(Expense(
+                description=f'{name} {day:%b %Y} {SEED_TAG}',
+                amount=Decimal(self.rng.randint(low, high)),
+                category=categories[name],
+                payment_method=self.rng.choice(['cash', 'bank_transfer']),
+                expense_date=day,
+                created_by=self.admin,
+            ))
+
+        for day in self.days(end=self.today):
+            if day.day == 1:
+                add(day, 'Rent')
+                add(day, 'Salaries')
+            for _ in range(self.rng.randint(0, 3)):
+                add(day, self.rng.choice(['Utilities', 'Medical Supplies', 'Maintenance', 'Marketing']))
+        Expense.objects.bulk_create(expenses, batch_size=BATCH_SIZE)
+        return len(expenses)
+
+    def seed_surgeries(self, theater_count):
+        from operation_theater.models import OperationTheater, Surgery, SurgeryType
+
+        types = [
+            SurgeryType.objects.get_or_create(name=name, defaults={'duration': timedelta(minutes=minutes)})[0]
+            for name, minutes in SURGERY_TYPES
+        ]
+        theaters = OperationTheater.objects.bulk_create([
+            OperationTheater(name=f'Seed OT {n + 1}', location=f'Block {n + 1}', description=SEED_TAG)
+            for n in range(theater_count)
+        ])
+        surgeons = self.doctors[:max(1, len(self.doctors) // 4)]
+
+        surgeries = []
+        for day in self.days():
+            if day.weekday() >= 5:
+                continue
+            for theater in theaters:
+                for start in self.rng.sample([dtime(8), dtime(11), dtime(14)], self.rng.randint(0, 3)):
+                    surgery_type = self.rng.choice(types)
+                    if day < self.today:
+                        status = self.rng.choices(['completed', 'cancelled', 'postponed'], weights=[90, 6, 4])[0]
+                    else:
+                        status = 'scheduled'
+                    surgeries.append(Surgery(
+                        patient=self.rng.choice(self.patients),
+                        surgeon=self.rng.choice(surgeons),
+                        surgery_type=surgery_type,
+                        operation_theater=theater,
+                        scheduled_date=day,
+                        start_time=start,
+                        end_time=(datetime.combine(day, start) + surgery_type.duration).time(),
+                        status=status,
+                        created_by=self.admin,
+                    ))
+        Surgery.objects.bulk_create(surgeries, batch_size=BATCH_SIZE)
+        return len(theaters) + len(surgeries)
+
+    def seed_blood_bank(self, count):
+        from blood_bank.models import BloodTransfer, Donor
+
+        span = (self.today - self.start).days
+        donors = [
+            Donor(
+                full_name=f'{self.rng.choice(FIRST_NAMES)} {self.rng.choice(LAST_NAMES)}',
+                age=self.rng.randint(18, 60),
+                gender=self.rng.choice(['male', 'female']),
+                phone=f'0300{self.rng.randrange(10 ** 7):07d}',
+                email=f'donor{n}@{SEED_DOMAIN}',
+                blood_group=self.rng.choices(BLOOD_GROUPS, weights=[22, 3, 28, 3, 7, 1, 33, 3])[0],
+                weight=Decimal(self.rng.randint(50, 100)),
+                donation_count=self.rng.randint(1, 8),
+                donation_date=self.today - timedelta(days=self.rng.randint(0, span)),
+                donation_time=dtime(self.rng.randint(9, 16)),
+            )
+            for n in range(count)
+        ]
+        Donor.objects.bulk_create(donors, batch_size=BATCH_SIZE)
+
+        transfers = []
+        for day in self.days(end=self.today):
+            if self.rng.random() >= 0.5:
+                continue
+            patient = self.rng.choice(self.patients)
+            transfers.append(BloodTransfer(
+                patient_name=patient.user.get_full_name(),
+                patient_id=str(patient.pk),
+                blood_type=patient.blood_group,
+                units=self.rng.randint(1, 3),
+                transfer_date=day,
+                transfer_time=dtime(self.rng.randint(0, 23)),
+                doctor_name=self.rng.choice(self.doctors).user.get_full_name(),
+                is_emergency=self.rng.random() < 0.2,
+                notes=SEED_TAG,
+            ))
+        BloodTransfer.objects.bulk_create(transfers, batch_size=BATCH_SIZE)
+        return len(donors) + len(transfers)
+
+    def seed_inventory(self, count):
+        from inventory.models import Category, Item, ItemBatch, StockMovement, Supplier
+
+        categories = [Category.objects.get_or_create(name=name)[0] for name in INVENTORY_CATEGORIES]
+        suppliers = Supplier.objects.bulk_create([
+            Supplier(
+                name=f'{self.rng.choice(LAST_NAMES)} Medical Supplies {n + 1}',
+                contact_person=f'{self.rng.choice(FIRST_NAMES)} {self.rng.choice(LAST_NAMES)}',
+                email=f'supplier{n}@{SEED_DOMAIN}',
+                phone=f'042{self.rng.randrange(10 ** 7):07d}',
+                address='Industrial Area',
+            )
+            for n in range(10)
+        ])
+        items = Item.objects.bulk_create([
+            Item(
+                name=f'{self.rng.choice(INVENTORY_CATEGORIES)} item {n + 1}',
+                category=self.rng.choice(categories),
+                supplier=self.rng.choice(suppliers),
+                unit=self.rng.choice(['pcs', 'boxes', 'vials', 'packs']),
+                price_per_unit=Decimal(self.rng.randint(10, 5000)),
+                minimum_quantity=self.rng.choice([5, 10, 20, 50]),
+                location=f'Store {self.rng.randint(1, 4)}',
+                barcode=f'SEED-{n:06d}',
+            )
+            for n in range(count)
+        ], batch_size=BATCH_SIZE)
+
+        # Weekly usage with a restock whenever stock runs low, replayed so the
+        # final quantity_in_stock matches the sum of the movements. Every
+        # restock is a lot and usage draws from the earliest-expiring lot first.
+        batches = []
+        movements = []
+        for item in items:
+            lots = []
+            for day in self.days(end=self.today):
+                if day.weekday() != 0:
+                    continue
+                if sum(lot.quantity for lot in lots) <= item.minimum_quantity:
+                    restock = item.minimum_quantity * self.rng.randint(3, 6)
+                    lot = ItemBatch(
+                        item=item, lot_number=f'LOT-{day:%Y%m%d}', quantity=restock,
+                        expiry_date=day + timedelta(days=self.rng.randint(90, 720)),
+                        received_at=self.aware(day, dtime(10)),
+                    )
+                    batches.append(lot)
+                    lots.append(lot)
+                    lots.sort(key=lambda lot: lot.expiry_date)
+                    movements.append(StockMovement(
+                        item=item, batch=lot, movement_type='IN', quantity=restock, reference=f'PO {SEED_TAG}',
+                        created_by=self.admin, created_at=self.aware(day, dtime(10)),
+                    ))
+                used = min(
+                    sum(lot.quantity for lot in lots if lot.expiry_date >= day),
+                    self.rng.randint(0, item.minimum_quantity * 2),
+                )
+                for lot in lots:
+                    if not used:
+                        break
+                    if lot.expiry_date < day or not lot.quantity:
+                        continue
+                    take = min(used, lot.quantity)
+                    lot.quantity -= take
+                    used -= take
+                    movements.append(StockMovement(
+                        item=item, batch=lot, movement_type='OUT', quantity=-take, reference=f'Ward usage {SEED_TAG}',
+                        created_by=self.admin, created_at=self.aware(day, dtime(16)),
+                    ))
+            item.quantity_in_stock = sum(lot.quantity for lot in lots)
+            in_stock = [lot.expiry_date for lot in lots if lot.quantity]
+            item.expiry_date = min(in_stock) if in_stock else None
+
+        with backdated(ItemBatch, 'received_at'):
+            ItemBatch.objects.bulk_create(batches, batch_size=BATCH_SIZE)
+        with backdated(StockMovement, 'created_at'):
+            StockMovement.objects.bulk_create(movements, batch_size=BATCH_SIZE)
+        Item.objects.bulk_update(items, ['quantity_in_stock', 'expiry_date'], batch_size=BATCH_SIZE)
+        return len(suppliers) + len(items) + len(batches) + len(movements)
+
+    def finish(self):
+        from clinic_project.query_cache import GROUPS, bump
+        from patients.balances import refresh_account_summaries
+
+        written = refresh_account_summaries()
+        # bulk_create skips the signals that normally invalidate cached aggregates
+        transaction.on_commit(lambda: bump(*GROUPS))
+        return written
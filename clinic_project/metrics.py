@@ -0,0 +1,314 @@
+"""
+Per-route request metrics.
+
+``RequestMetricsMiddleware`` times every request and records, against the
+resolved view name (``doctors:list``, ``accounts_finance``, ...):
+
+- total latency
+- database time and query count
+- template render time (through ``TimedDjangoTemplates``)
+- response size
+
+Requests are kept in an in-process ring buffer of the last
+``METRICS_BUFFER_SIZE`` requests; p50/p95/p99 are computed from it. Since
+the process started, cumulative latency histograms are also kept per
+route for Prometheus. Every ``METRICS_FLUSH_INTERVAL`` seconds a
+background thread appends the new requests to ``METRICS_LOG_FILE`` as JSON
+lines (rotated at ``METRICS_LOG_MAX_BYTES``). Requests slower than
+``METRICS_SLOW_REQUEST_MS`` are also logged as warnings.
+
+The numbers are per worker process, like the query cache counters.
+"""
+import json
+import logging
+import threading
+import time
+from collections import defaultdict, deque
+from contextvars import ContextVar
+from logging.handlers import RotatingFileHandler
+from pathlib import Path
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.template.backends.django import DjangoTemplates, Template
+
+logger = logging.getLogger(__name__)
+
+# Upper bounds (seconds) of the Prometheus latency histogram buckets
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUANTILES = (0.5, 0.95, 0.99)
+
+UNRESOLVED = '<unresolved>'
+
+_current = ContextVar('request_metrics', default=None)
+
+
+class RequestTimer:
+    """Time spent in the database and in templates by the current request"""
+
+    __slots__ = ('db_time', 'queries', 'template_time')
+
+    def __init__(self):
+        self.db_time = 0.0
+        self.queries = 0
+        self.template_time = 0.0
+
+
+def _time_query(execute, sql, params, many, context):
+    timer = _current.get()
+    if timer is None:
+        return execute(sql, params, many, context)
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        timer.db_time += time.perf_counter() - started
+        timer.queries += 1
+
+
+def install_on_connect(sender, connection, **kwargs):
+    """``connection_created`` receiver timing every query run on ``connection``"""
+    if _time_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(_time_query)
+
+
+class TimedTemplate(Template):
+    def render(self, context=None, request=None):
+        timer = _current.get()
+        if timer is None:
+            return super().render(context, request)
+        started = time.perf_counter()
+        try:
+            return super().render(context, request)
+        finally:
+            timer.template_time += time.perf_counter() - started
+
+
+class TimedDjangoTemplates(DjangoTemplates):
+    """``DjangoTemplates`` that adds top-level render time to the request's metrics"""
+
+    def from_string(self, template_code):
+        return TimedTemplate(self.engine.from_string(template_code), self)
+
+    def get_template(self, template_name):
+        return TimedTemplate(super().get_template(template_name).template, self)
+
+
+def _percentile(ordered, q):
+    return ordered[min(len(ordered) - 1, int(len(ordered) * q))]
+
+
+class RequestMetrics:
+    def __init__(self, buffer_size, flush_interval):
+        self.flush_interval = flush_interval
+        self._lock = threading.Lock()
+        self._samples = deque(maxlen=buffer_size)
+        self._unflushed = []
+        self._routes = defaultdict(lambda: {
+            'count': 0,
+            'errors': 0,
+            'buckets': [0] * len(BUCKETS),
+            'duration': 0.0,
+            'db_time': 0.0,
+            'template_time': 0.0,
+            'bytes': 0,
+        })
+        self._thread = None
+        self._file_logger = None
+
+    def record(self, sample):
+        with self._lock:
+            self._samples.append(sample)
+            self._unflushed.append(sample)
+            totals = self._routes[sample['route']]
+            totals['count'] += 1
+            totals['errors'] += sample['status'] >= 500
+            duration = sample['duration_ms'] / 1000
+            for i, bound in enumerate(BUCKETS):
+                if duration <= bound:
+                    totals['buckets'][i] += 1
+            totals['duration'] += duration
+            totals['db_time'] += sample['db_ms'] / 1000
+            totals['template_time'] += sample['template_ms'] / 1000
+            totals['bytes'] += sample['bytes']
+            self._ensure_thread()
+
+    def route_summary(self):
+        """Latency percentiles and averages per route over the ring buffer, slowest p95 first"""
+        with self._lock:
+            samples = list(self._samples)
+
+        by_route = defaultdict(list)
+        for sample in samples:
+            by_route[sample['route']].append(sample)
+
+        summary = []
+        for route, route_samples in by_route.items():
+            durations = sorted(s['duration_ms'] for s in route_samples)
+            count = len(route_samples)
+            summary.append({
+                'route': route,
+                'count': count,
+                'p50_ms': round(_percentile(durations, 0.5), 1),
+                'p95_ms': round(_percentile(durations, 0.95), 1),
+                'p99_ms': round(_percentile(durations, 0.99), 1),
+                'max_ms': round(durations[-1], 1),
+                'avg_db_ms': round(sum(s['db_ms'] for s in route_samples) / count, 1),
+                'avg_queries': round(sum(s['queries'] for s in route_samples) / count, 1),
+                'avg_template_ms': round(sum(s['template_ms'] for s in route_samples) / count, 1),
+                'avg_bytes': round(sum(s['bytes'] for s in route_samples) / count),
+                'errors': sum(s['status'] >= 500 for s in route_samples),
+            })
+        summary.sort(key=lambda row: -row['p95_ms'])
+        return summary
+
+    def prometheus_text(self):
+        """Prometheus text exposition: cumulative histograms plus recent-window quantiles"""
+        with self._lock:
+            routes = {route: dict(totals, buckets=list(totals['buckets'])) for route, totals in self._routes.items()}
+
+        def label(route):
+            return route.replace('\\', '\\\\').replace('"', '\\"')
+
+        lines = [
+            '# HELP clinic_request_duration_seconds Request latency per route',
+            '# TYPE clinic_request_duration_seconds histogram',
+        ]
+        for route, totals in sorted(routes.items()):
+            for bound, count in zip(BUCKETS, totals['buckets']):
+                lines.append(f'clinic_request_duration_seconds_bucket{{route="{label(route)}",le="{bound}"}} {count}')
+            lines.append(f'clinic_request_duration_seconds_bucket{{route="{label(route)}",le="+Inf"}} {totals["count"]}')
+            lines.append(f'clinic_request_duration_seconds_sum{{route="{label(route)}"}} {totals["duration"]:.6f}')
+            lines.append(f'clinic_request_duration_seconds_count{{route="{label(route)}"}} {totals["count"]}')
+
+        counters = (
+            ('clinic_request_db_seconds_total', 'db_time', 'Time spent in database queries per route'),
+            ('clinic_request_template_seconds_total', 'template_time', 'Time spent rendering templates per route'),
+            ('clinic_response_bytes_total', 'bytes', 'Response bytes sent per route'),
+            ('clinic_request_errors_total', 'errors', 'Responses with a 5xx status per route'),
+        )
+        for name, key, help_text in counters:
+            lines.append(f'# HELP {name} {help_text}')
+            lines.append(f'# TYPE {name} counter')
+            for route, totals in sorted(routes.items()):
+                lines.append(f'{name}{{route="{label(route)}"}} {totals[key]}')
+
+        lines.append('# HELP clinic_request_latency_recent_seconds Latency quantiles over the last requests in the buffer')
+        lines.append('# TYPE clinic_request_latency_recent_seconds gauge')
+        for row in self.route_summary():
+            for q in QUANTILES:
+                value = row[f'p{round(q * 100)}_ms'] / 1000
+                lines.append(
+                    f'clinic_request_latency_recent_seconds{{route="{label(row["route"])}",quantile="{q}"}} {value}'
+                )
+        return '\n'.join(lines) + '\n'
+
+    def _ensure_thread(self):
+        if self._thread is None or not self._thread.is_alive():
+            self._thread = threading.Thread(target=self._run, name='request-metrics-flush', daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        while True:
+            time.sleep(self.flush_interval)
+            self.flush()
+
+    def _get_file_logger(self):
+        if self._file_logger is None:
+            path = Path(settings.METRICS_LOG_FILE)
+            path.parent.mkdir(parents=True, exist_ok=True)
+            handler = RotatingFileHandler(
+                path, maxBytes=settings.METRICS_LOG_MAX_BYTES, backupCount=settings.METRICS_LOG_BACKUPS
+            )
+            handler.setFormatter(logging.Formatter('%(message)s'))
+            file_logger = logging.getLogger('clinic_project.metrics.requests')
+            file_logger.addHandler(handler)
+            file_logger.setLevel(logging.INFO)
+            file_logger.propagate = False
+            self._file_logger = file_logger
+        return self._file_logger
+
+    def flush(self):
+        """Append requests recorded since the last flush to the JSONL log; returns how many"""
+        with self._lock:
+            pending, self._unflushed = self._unflushed, []
+        if not pending or not settings.METRICS_LOG_FILE:
+            return 0
+        try:
+            file_logger = self._get_file_logger()
+            for sample in pending:
+                file_logger.info(json.dumps(sample))
+        except OSError as e:
+            logger.error(f"Could not write request metrics: {str(e)}")
+            return 0
+        return len(pending)
+
+
+metrics = RequestMetrics(settings.METRICS_BUFFER_SIZE, settings.METRICS_FLUSH_INTERVAL)
+
+
+def _response_size(response):
+    if response.streaming:
+        return int(response.get('Content-Length') or 0)
+    return len(response.content)
+
+
+class RequestMetricsMiddleware:
+    """Record latency, DB time, template time and response size per route"""
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not settings.METRICS_ENABLED:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        timer = RequestTimer()
+        token = _current.set(timer)
+        started = time.perf_counter()
+        try:
+            response = self.get_response(request)
+        finally:
+            _current.reset(token)
+        self.finish(request, response, timer, time.perf_counter() - started)
+        return response
+
+    async def __acall__(self, request):
+        timer = RequestTimer()
+        token = _current.set(timer)
+        started = time.perf_counter()
+        try:
+            response = await self.get_response(request)
+        finally:
+            _current.reset(token)
+        self.finish(request, response, timer, time.perf_counter() - started)
+        return response
+
+    def finish(self, request, response, timer, elapsed):
+        match = getattr(request, 'resolver_match', None)
+        sample = {
+            'ts': round(time.time(), 3),
+            'route': match.view_name if match else UNRESOLVED,
+            'method': request.method,
+            'status': response.status_code,
+            'duration_ms': round(elapsed * 1000, 2),
+            'db_ms': round(timer.db_time * 1000, 2),
+            'queries': timer.queries,
+            'template_ms': round(timer.template_time * 1000, 2),
+            'bytes': _response_size(response),
+        }
+        metrics.record(sample)
+        if sample['duration_ms'] >= settings.METRICS_SLOW_REQUEST_MS:
+            logger.warning(
+                f"Slow request: {request.method} {request.path} ({sample['route']}) "
+                f"{sample['duration_ms']:.0f} ms, db {sample['db_ms']:.0f} ms in {sample['queries']} queries, "
+                f"templates {sample['template_ms']:.0f} ms"
+            )
@@ -0,0 +1,228 @@
+"""
+Opt-in profiling of individual production requests.
+
+With ``PROFILING_ENABLED`` (``DJANGO_PROFILING=1``) a request is profiled
+when:
+
+- a staff user adds ``?__profile=1`` (cProfile), ``?__profile=cprofile`` or
+  ``?__profile=stack`` (sampling profiler), or
+- its view name is in ``PROFILING_SAMPLE_RATES`` (``DJANGO_PROFILE_SAMPLE=
+  "accounts_finance=0.05,patient_bills=0.05"``) and it wins the draw.
+
+cProfile results are saved as pstats files (``.prof``, open with
+``python -m pstats`` or snakeviz). Sampler results are saved as collapsed
+stacks (``.folded``, for flamegraph.pl or speedscope). Both go under
+``MEDIA_ROOT/profiles/``, each with a ``.json`` file describing the
+request. They are listed for staff at ``/ops/profiles/``.
+
+When profiling is disabled the middleware removes itself at startup
+(``MiddlewareNotUsed``), so it costs nothing.
+
+Both profilers follow the thread handling the request. With daphne,
+``async def`` views run on the event loop thread, so their profile also
+contains whatever other requests the loop ran meanwhile.
+"""
+import cProfile
+import json
+import random
+import sys
+import threading
+import time
+import uuid
+from collections import Counter
+from pathlib import Path
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.urls import Resolver404, resolve
+
+CPROFILE = 'cprofile'
+STACK = 'stack'
+MODES = (CPROFILE, STACK)
+EXTENSIONS = {CPROFILE: '.prof', STACK: '.folded'}
+
+QUERY_PARAM = '__profile'
+
+
+def profiles_dir():
+    return Path(settings.MEDIA_ROOT) / 'profiles'
+
+
+class StackSampler:
+    """Samples one thread's Python stack at a fixed interval into collapsed-stack counts"""
+
+    def __init__(self, thread_id, interval):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks = Counter()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name='request-stack-sampler', daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            names = []
+            while frame is not None:
+                code = frame.f_code
+                names.append(f'{code.co_name} ({code.co_filename}:{code.co_firstlineno})')
+                frame = frame.f_back
+            if names:
+                self.stacks[';'.join(reversed(names))] += 1
+
+    def collapsed(self):
+        """flamegraph.pl "frame;frame;frame count" lines"""
+        return ''.join(f'{stack} {count}\n' for stack, count in self.stacks.most_common())
+
+
+def _prune(directory):
+    """Keep only the newest ``PROFILING_MAX_FILES`` profiles"""
+    metadata = sorted(directory.glob('*.json'), key=lambda path: path.stat().st_mtime, reverse=True)
+    for stale in metadata[settings.PROFILING_MAX_FILES:]:
+        for extension in EXTENSIONS.values():
+            stale.with_suffix(extension).unlink(missing_ok=True)
+        stale.unlink(missing_ok=True)
+
+
+def list_profiles():
+    """Metadata of stored profiles, newest first"""
+    directory = profiles_dir()
+    if not directory.is_dir():
+        return []
+    profiles = []
+    for path in directory.glob('*.json'):
+        try:
+            profiles.append(json.loads(path.read_text()))
+        except (OSError, ValueError):
+            continue
+    profiles.sort(key=lambda profile: profile['started_at'], reverse=True)
+    return profiles
+
+
+class ProfilingMiddleware:
+    """Run selected requests under cProfile or the stack sampler and store the result"""
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not settings.PROFILING_ENABLED:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        mode, view_name = self.selected_mode(request)
+        if mode is None:
+            return self.get_response(request)
+
+        started_at = time.time()
+        started = time.perf_counter()
+        profiler = self.start_profiler(mode)
+        try:
+            response = self.get_response(request)
+        finally:
+            self.stop_profiler(profiler)
+        return self.finish(request, response, mode, view_name, profiler, started_at, time.perf_counter() - started)
+
+    async def __acall__(self, request):
+        user = None
+        if request.GET.get(QUERY_PARAM) and hasattr(request, 'auser'):
+            # request.user would query the database from the event loop
+            user = await request.auser()
+        mode, view_name = self.selected_mode(request, user)
+        if mode is None:
+            return await self.get_response(request)
+
+        started_at = time.time()
+        started = time.perf_counter()
+        profiler = self.start_profiler(mode)
+        try:
+            response = await self.get_response(request)
+        finally:
+            self.stop_profiler(profiler)
+        # Writing the profile (and request.user in its metadata) blocks
+        return await sync_to_async(self.finish)(request, response, mode, view_name, profiler, started_at, time.perf_counter() - started)
+
+    def start_profiler(self, mode):
+        if mode == CPROFILE:
+            profiler = cProfile.Profile()
+            profiler.enable()
+        else:
+            profiler = StackSampler(threading.get_ident(), settings.PROFILING_SAMPLE_INTERVAL)
+            profiler.start()
+        return profiler
+
+    def stop_profiler(self, profiler):
+        if isinstance(profiler, cProfile.Profile):
+            profiler.disable()
+        else:
+            profiler.stop()
+
+    def finish(self, request, response, mode, view_name, profiler, started_at, duration):
+        name = self.save(request, response, mode, view_name, profiler, started_at, duration)
+        response['X-Profile'] = name
+        return response
+
+    def selected_mode(self, request, user=None):
+        """(mode, view name) if this request should be profiled, else (None, None)"""
+        requested = request.GET.get(QUERY_PARAM)
+        if requested:
+            user = user if user is not None else getattr(request, 'user', None)
+            if user is not None and user.is_authenticated and (
+                user.is_staff or getattr(user, 'user_type', '') == 'admin'
+            ):
+                mode = requested if requested in MODES else settings.PROFILING_DEFAULT_MODE
+                return mode, self.view_name(request)
+
+        if settings.PROFILING_SAMPLE_RATES:
+            view_name = self.view_name(request)
+            rate = settings.PROFILING_SAMPLE_RATES.get(view_name)
+            if rate and random.random() < rate:
+                return settings.PROFILING_DEFAULT_MODE, view_name
+        return None, None
+
+    def view_name(self, request):
+        try:
+            return resolve(request.path_info).view_name
+        except Resolver404:
+            return None
+
+    def save(self, request, response, mode, view_name, profiler, started_at, duration):
+        directory = profiles_dir()
+        directory.mkdir(parents=True, exist_ok=True)
+        stamp = time.strftime('%Y%m%d-%H%M%S', time.gmtime(started_at))
+        safe_view = (view_name or 'unresolved').replace(':', '-')
+        name = f'{stamp}-{safe_view}-{uuid.uuid4().hex[:8]}'
+
+        if mode == CPROFILE:
+            profiler.dump_stats(directory / f'{name}{EXTENSIONS[CPROFILE]}')
+        else:
+            (directory / f'{name}{EXTENSIONS[STACK]}').write_text(profiler.collapsed())
+
+        user = getattr(request, 'user', None)
+        (directory / f'{name}.json').write_text(json.dumps({
+            'name': name,
+            'file': f'{name}{EXTENSIONS[mode]}',
+            'mode': mode,
+            'view': view_name,
+            'method': request.method,
+            'path': request.get_full_path(),
+            'user': user.email if user is not None and user.is_authenticated else None,
+            'status': response.status_code,
+            'duration_ms': round(duration * 1000, 1),
+            'started_at': started_at,
+        }))
+        _prune(directory)
+        return name
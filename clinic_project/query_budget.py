@@ -0,0 +1,238 @@
+"""
+Per-request query budgets and N+1 detection.
+
+``QueryBudgetMiddleware`` (development and staging only, see
+``QUERY_BUDGET_ENABLED``) records every query a request runs:
+
+- The count and total database time go out as a ``Server-Timing`` header,
+  so they show up in the browser's network panel next to each request.
+- Queries are grouped by *shape* (the SQL with parameters and ``IN`` lists
+  collapsed). A shape that runs ``QUERY_BUDGET_REPEAT_THRESHOLD`` times or
+  more in one request is almost always a loop doing one query per row, and
+  is logged with the stack of project code that issued it.
+- A request running more queries than its view's budget
+  (``QUERY_BUDGETS[view_name]``, else ``QUERY_BUDGET_DEFAULT``) is logged.
+
+Tests use the same recorder to fail when a view goes over budget::
+
+    class DashboardTests(QueryBudgetTestMixin, TestCase):
+        def test_dashboard_budget(self):
+            self.client.force_login(self.admin)
+            self.assertViewWithinBudget(reverse('dashboard'))
+
+        def test_bulk_payment(self):
+            with self.assertMaxQueries(5):
+                record_bulk_payment(...)
+"""
+import logging
+import re
+import sys
+import time
+import traceback
+from contextlib import contextmanager
+from contextvars import ContextVar
+from pathlib import Path
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+from django.urls import resolve
+
+logger = logging.getLogger(__name__)
+
+_current_log = ContextVar('query_budget_log', default=None)
+
+_IN_LIST = re.compile(r'\bIN \((?:%s, )*%s\)')
+_STRING = re.compile(r"'(?:[^']|'')*'")
+_NUMBER = re.compile(r'(?<![\w."])-?\d+(?:\.\d+)?\b')
+
+_THIS_FILE = str(Path(__file__).resolve())
+
+
+def sql_shape(sql):
+    """``sql`` with literals and ``IN`` lists collapsed, so per-row variants compare equal"""
+    sql = _IN_LIST.sub('IN (...)', sql)
+    sql = _STRING.sub('?', sql)
+    return _NUMBER.sub('?', sql)
+
+
+def _project_stack():
+    """Frames of project code (not Django, not third-party) currently on the stack, outermost first"""
+    root = str(settings.BASE_DIR)
+    frames = []
+    frame = sys._getframe(2)
+    while frame is not None:
+        filename = frame.f_code.co_filename
+        if filename.startswith(root) and 'site-packages' not in filename and filename != _THIS_FILE:
+            frames.append(frame)
+        frame = frame.f_back
+    return traceback.StackSummary.extract(
+        ((f, f.f_lineno) for f in reversed(frames)), capture_locals=False
+    )
+
+
+class QueryLog:
+    """Queries run inside one ``record_queries()`` block"""
+
+    def __init__(self):
+        self.count = 0
+        self.duration = 0.0
+        self.shapes = {}
+
+    def add(self, sql, duration):
+        self.count += 1
+        self.duration += duration
+        shape = sql_shape(sql)
+        entry = self.shapes.get(shape)
+        if entry is None:
+            self.shapes[shape] = entry = {'count': 0, 'duration': 0.0, 'sql': sql, 'stack': None}
+        entry['count'] += 1
+        entry['duration'] += duration
+        # Walking the stack is the expensive part, so only do it once a shape repeats
+        if entry['count'] == 2:
+            entry['stack'] = _project_stack()
+
+    def repeated(self, threshold):
+        """Shapes that ran at least ``threshold`` times, most frequent first"""
+        return sorted(
+            (
+                {'shape': shape, **entry}
+                for shape, entry in self.shapes.items()
+                if entry['count'] >= threshold
+            ),
+            key=lambda entry: -entry['count']
+        )
+
+    def report(self, threshold):
+        lines = [f'{self.count} queries in {self.duration * 1000:.1f} ms']
+        for entry in self.repeated(threshold):
+            lines.append(f"  {entry['count']}x ({entry['duration'] * 1000:.1f} ms): {entry['sql'][:300]}")
+            if entry['stack']:
+                lines.extend('    ' + line.rstrip() for line in entry['stack'].format())
+        return '\n'.join(lines)
+
+
+def _record(execute, sql, params, many, context):
+    log = _current_log.get()
+    if log is None:
+        return execute(sql, params, many, context)
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        log.add(sql, time.perf_counter() - started)
+
+
+def install(connection):
+    """Route ``connection``'s queries through the recorder (idempotent)"""
+    if _record not in connection.execute_wrappers:
+        connection.execute_wrappers.append(_record)
+
+
+def install_on_connect(sender, connection, **kwargs):
+    """``connection_created`` receiver; covers the per-thread connections async views use"""
+    install(connection)
+
+
+@contextmanager
+def record_queries():
+    """Collect every query run in this context (including ``sync_to_async`` threads) into a ``QueryLog``"""
+    for connection in connections.all(initialized_only=True):
+        install(connection)
+    log = QueryLog()
+    token = _current_log.set(log)
+    try:
+        yield log
+    finally:
+        _current_log.reset(token)
+
+
+def budget_for(view_name):
+    return settings.QUERY_BUDGETS.get(view_name, settings.QUERY_BUDGET_DEFAULT)
+
+
+class QueryBudgetExceeded(AssertionError):
+    pass
+
+
+@contextmanager
+def query_budget(max_queries, repeat_threshold=None):
+    """Raise ``QueryBudgetExceeded`` if the block runs more than ``max_queries`` queries or has an N+1 loop"""
+    threshold = repeat_threshold or settings.QUERY_BUDGET_REPEAT_THRESHOLD
+    with record_queries() as log:
+        yield log
+    if log.count > max_queries or log.repeated(threshold):
+        raise QueryBudgetExceeded(
+            f'Query budget of {max_queries} exceeded or repeated queries found:\n{log.report(threshold)}'
+        )
+
+
+class QueryBudgetTestMixin:
+    """``TestCase`` mixin asserting query budgets"""
+
+    def assertMaxQueries(self, max_queries, repeat_threshold=None):
+        return query_budget(max_queries, repeat_threshold)
+
+    def assertViewWithinBudget(self, url, max_queries=None, method='get', **kwargs):
+        """Request ``url`` with ``self.client`` and check it against its view's ``QUERY_BUDGETS`` entry"""
+        if max_queries is None:
+            max_queries = budget_for(resolve(url.split('?')[0]).view_name)
+        with query_budget(max_queries):
+            response = getattr(self.client, method)(url, **kwargs)
+        self.assertLess(response.status_code, 500)
+        return response
+
+
+class QueryBudgetMiddleware:
+    """Count queries per request, flag N+1 loops and add a ``Server-Timing`` header"""
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not settings.QUERY_BUDGET_ENABLED:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        started = time.perf_counter()
+        with record_queries() as log:
+            response = self.get_response(request)
+        self.finish(request, response, log, time.perf_counter() - started)
+        return response
+
+    async def __acall__(self, request):
+        started = time.perf_counter()
+        with record_queries() as log:
+            response = await self.get_response(request)
+        self.finish(request, response, log, time.perf_counter() - started)
+        return response
+
+    def finish(self, request, response, log, elapsed):
+        timing = (
+            f'db;dur={log.duration * 1000:.1f};desc="{log.count} queries", '
+            f'total;dur={elapsed * 1000:.1f}'
+        )
+        existing = response.get('Server-Timing')
+        response['Server-Timing'] = f'{existing}, {timing}' if existing else timing
+
+        match = getattr(request, 'resolver_match', None)
+        view_name = match.view_name if match else request.path
+        budget = budget_for(view_name)
+        threshold = settings.QUERY_BUDGET_REPEAT_THRESHOLD
+        repeated = log.repeated(threshold)
+        if log.count > budget or repeated:
+            problems = []
+            if log.count > budget:
+                problems.append(f'{log.count} queries over a budget of {budget}')
+            if repeated:
+                problems.append(f'{len(repeated)} repeated query shapes (possible N+1)')
+            logger.warning(
+                f"{request.method} {request.path} ({view_name}): {'; '.join(problems)}\n{log.report(threshold)}"
+            )
@@ -0,0 +1,104 @@
+"""
+Versioned caching of query results.
+
+Cached aggregates are keyed on the current *generation* of every model
+group they read from (payments, bills, expenses, appointments, inventory). Saving or
+deleting a row in a group bumps its generation, so the next read misses
+and recomputes. Nothing has to be deleted explicitly.
+
+Generations live in the default cache, so invalidation only reaches the
+processes that share it. With the default file cache (or the db cache) a
+write in any worker or management command is seen by every process, and a
+page is never served data older than the last committed write. With
+locmem each process only sees its own writes; use it only when a single
+process serves the site.
+
+Usage::
+
+    stats = cached_result('dashboard:stats', [PAYMENTS, APPOINTMENTS], compute_stats, params=[today])
+"""
+import threading
+import time
+from collections import defaultdict
+
+from django.core.cache import cache
+
+PAYMENTS = 'payments'
+BILLS = 'bills'
+EXPENSES = 'expenses'
+APPOINTMENTS = 'appointments'
+INVENTORY = 'inventory'
+# Not cached results: moving it tells each process to drop its scanned-code LRU (inventory.scanning)
+BARCODES = 'barcodes'
+# Likewise for the compiled alert rules (emr.alerting)
+ALERT_RULES = 'alert_rules'
+
+GROUPS = (PAYMENTS, BILLS, EXPENSES, APPOINTMENTS, INVENTORY, BARCODES, ALERT_RULES)
+
+DEFAULT_TIMEOUT = 60 * 60
+
+_MISSING = object()
+_stats_lock = threading.Lock()
+_stats = defaultdict(lambda: {'hits': 0, 'misses': 0})
+
+
+def _generation_key(group):
+    return f'querycache:generation:{group}'
+
+
+def _fresh_generation():
+    # Start from the clock rather than 1 so a generation that was evicted (or
+    # lost on restart) never comes back with a value an old entry was keyed on
+    return time.time_ns() // 1000
+
+
+def generations(groups):
+    """Current generation of each group, in order"""
+    keys = [_generation_key(group) for group in groups]
+    values = cache.get_many(keys)
+    for key in keys:
+        if key not in values:
+            cache.add(key, _fresh_generation(), None)
+            values[key] = cache.get(key)
+    return [values[key] for key in keys]
+
+
+def bump(*groups):
+    """Invalidate every cached result that depends on ``groups``"""
+    for group in groups:
+        if group not in GROUPS:
+            raise ValueError(f'Unknown cache group: {group}')
+        try:
+            cache.incr(_generation_key(group))
+        except ValueError:
+            cache.set(_generation_key(group), _fresh_generation(), None)
+
+
+def cached_result(name, groups, compute, params=(), timeout=DEFAULT_TIMEOUT):
+    """Return ``compute()`` memoized under ``name``/``params`` until ``groups`` change"""
+    versions = '.'.join(str(value) for value in generations(groups))
+    suffix = ':'.join(str(param) for param in params)
+    key = f'querycache:{name}:{versions}:{suffix}'
+
+    value = cache.get(key, _MISSING)
+    with _stats_lock:
+        _stats[name]['hits' if value is not _MISSING else 'misses'] += 1
+    if value is _MISSING:
+        value = compute()
+        cache.set(key, value, timeout)
+    return value
+
+
+def cache_stats():
+    """Hit/miss counters per cached result name for this process"""
+    with _stats_lock:
+        snapshot = {name: dict(counts) for name, counts in _stats.items()}
+    for counts in snapshot.values():
+        total = counts['hits'] + counts['misses']
+        counts['hit_ratio'] = round(counts['hits'] / total, 3) if total else None
+    return snapshot
+
+
+def reset_cache_stats():
+    with _stats_lock:
+        _stats.clear()
@@ -49,6 +49,7 @@ INSTALLED_APPS = [
     'channels',  # Add Django Channels
     
     # Local apps
+    'clinic_project.apps.ClinicProjectConfig',
     'accounts.apps.AccountsConfig',
     'appointments.apps.AppointmentsConfig',
     'patients.apps.PatientsConfig',
@@ -63,21 +64,80 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
-    'whitenoise.middleware.WhiteNoiseMiddleware',
+    # WhiteNoise, made async-capable so async views are not pushed through a thread under daphne
+    'clinic_project.static.AsyncWhiteNoiseMiddleware',
+    'clinic_project.metrics.RequestMetricsMiddleware',
+    'clinic_project.query_budget.QueryBudgetMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'corsheaders.middleware.CorsMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'clinic_project.profiling.ProfilingMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
 
+# Query budgets (development/staging): per-request query counts and DB time in a
+# Server-Timing header, with N+1 loops and over-budget views logged.
+# Budgets are keyed on the resolved view name.
+QUERY_BUDGET_ENABLED = os.environ.get('DJANGO_QUERY_BUDGET', str(DEBUG)).lower() in ('1', 'true', 'yes', 'on')
+QUERY_BUDGET_DEFAULT = 30
+QUERY_BUDGET_REPEAT_THRESHOLD = 5
+QUERY_BUDGETS = {
+    # Polled JSON endpoints: session + user + the query itself
+    'emr:api_patient_vitals': 4,
+    'emr:api_equipment_status': 4,
+    'blood_bank:blood_inventory_api': 4,
+    'operation_theater:calendar_events': 4,
+    'dashboard': 15,
+    'operation_theater:dashboard': 10,
+}
+
+# Opt-in request metrics: latency, DB time, template time and response size per
+# route, kept in a per-process ring buffer and appended to a rotating JSONL file.
+# Served at /ops/metrics/ (staff) and /ops/metrics/prometheus/ (staff or
+# "Authorization: Bearer $DJANGO_METRICS_TOKEN"). The middleware and its flush
+# thread are removed entirely when off.
+METRICS_ENABLED = os.environ.get('DJANGO_METRICS', 'False').lower() in ('1', 'true', 'yes', 'on')
+METRICS_BUFFER_SIZE = int(os.environ.get('DJANGO_METRICS_BUFFER_SIZE', '5000'))
+METRICS_FLUSH_INTERVAL = 10  # seconds
+METRICS_LOG_FILE = os.environ.get('DJANGO_METRICS_LOG_FILE', str(BASE_DIR / 'logs' / 'requests.jsonl'))
+METRICS_LOG_MAX_BYTES = 10 * 1024 * 1024
+METRICS_LOG_BACKUPS = 5
+METRICS_SLOW_REQUEST_MS = int(os.environ.get('DJANGO_SLOW_REQUEST_MS', '1000'))
+METRICS_TOKEN = os.environ.get('DJANGO_METRICS_TOKEN', '')
+
+# Opt-in request profiling: staff add ?__profile=1 (or =stack), or sample a
+# fraction of requests per view name. Results go to MEDIA_ROOT/profiles/ and
+# are listed at /ops/profiles/. The middleware is removed entirely when off.
+PROFILING_ENABLED = os.environ.get('DJANGO_PROFILING', 'False').lower() in ('1', 'true', 'yes', 'on')
+PROFILING_SAMPLE_RATES = {
+    name.strip(): float(rate)
+    for name, _, rate in (
+        entry.partition('=') for entry in os.environ.get('DJANGO_PROFILE_SAMPLE', '').split(',') if entry.strip()
+    )
+}
+PROFILING_DEFAULT_MODE = 'cprofile'  # or 'stack'
+PROFILING_SAMPLE_INTERVAL = 0.005  # seconds between stack samples
+PROFILING_MAX_FILES = 200
+
+# Inventory reorder forecasts, rebuilt nightly by
+# `python manage.py refresh_reorder_forecasts` and read by /inventory/reorder/.
+INVENTORY_FORECAST_WINDOW_DAYS = 90  # days of stock-out history used
+INVENTORY_FORECAST_COVER_DAYS = 30  # usage a suggested order should cover beyond the lead time
+INVENTORY_FORECAST_SERVICE_LEVEL_Z = 1.65  # safety stock for ~95% of lead times without a stock-out
+
+# Scanned barcode/RFID -> item or equipment resolutions kept per process
+# (inventory.scanning), dropped whenever an item or equipment is saved.
+SCAN_CACHE_SIZE = 20000
+
 ROOT_URLCONF = 'clinic_project.urls'
 
 TEMPLATES = [
     {
-        'BACKEND': 'django.template.backends.django.DjangoTemplates',
+        # DjangoTemplates that reports render time to the request metrics
+        'BACKEND': 'clinic_project.metrics.TimedDjangoTemplates',
         'DIRS': [os.path.join(BASE_DIR, 'templates')],
         'APP_DIRS': True,
         'OPTIONS': {
@@ -102,10 +162,43 @@ ASGI_APPLICATION = 'clinic_project.asgi.application'
 # Database
 # https://docs.djangoproject.com/en/5.0/ref/settings/#databases
 
+# SQLite (tuned per connection, see clinic_project/database.py) unless
+# DATABASE_URL / DJANGO_DB_ENGINE select PostgreSQL.
+
+from clinic_project.database import database_settings
+
 DATABASES = {
+    'default': database_settings(BASE_DIR),
+}
+
+
+# Cache
+# https://docs.djangoproject.com/en/5.0/topics/cache/
+# Shared file cache by default, so that a write in one worker (or a management
+# command) invalidates the query cache of every other process. DJANGO_CACHE_BACKEND=db
+# also shares it (needs `python manage.py createcachetable`); locmem is only
+# correct when a single process serves the site.
+
+CACHE_BACKENDS = {
+    'locmem': 'django.core.cache.backends.locmem.LocMemCache',
+    'file': 'django.core.cache.backends.filebased.FileBasedCache',
+    'db': 'django.core.cache.backends.db.DatabaseCache',
+}
+CACHE_BACKEND = os.environ.get('DJANGO_CACHE_BACKEND', 'file')
+CACHE_LOCATIONS = {
+    'locmem': 'clinic-default',
+    'file': str(BASE_DIR / 'cache'),
+    'db': 'django_cache',
+}
+
+CACHES = {
     'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'db.sqlite3',
+        'BACKEND': CACHE_BACKENDS[CACHE_BACKEND],
+        'LOCATION': os.environ.get('DJANGO_CACHE_LOCATION', CACHE_LOCATIONS[CACHE_BACKEND]),
+        'TIMEOUT': 60 * 60,
+        'OPTIONS': {
+            'MAX_ENTRIES': 5000,
+        },
     }
 }
 
@@ -143,11 +236,46 @@ MEDIA_URL = '/media/'
 MEDIA_ROOT = BASE_DIR / 'media'
 
 # Django Channels
-CHANNEL_LAYERS = {
-    'default': {
-        'BACKEND': 'channels.layers.InMemoryChannelLayer',  # For development only
-    },
-}
+# DJANGO_CHANNEL_LAYER picks the layer shared by the daphne workers:
+#   memory - single process only (default)
+#   redis  - channels_redis, for several workers or hosts (pip install channels-redis)
+#   sqlite - SQLite file shared by the workers of one host, for tests and
+#            multi-process development without a broker; every socket polls it
+# `capacity` bounds each consumer's queue so a slow socket cannot back up broadcasts.
+CHANNEL_LAYER = os.environ.get('DJANGO_CHANNEL_LAYER', 'memory')
+CHANNEL_LAYER_CAPACITY = int(os.environ.get('DJANGO_CHANNEL_LAYER_CAPACITY', '100'))
+
+if CHANNEL_LAYER == 'redis':
+    CHANNEL_LAYERS = {
+        'default': {
+            'BACKEND': 'channels_redis.core.RedisChannelLayer',
+            'CONFIG': {
+                'hosts': [os.environ.get('REDIS_URL', 'redis://127.0.0.1:6379/0')],
+                'capacity': CHANNEL_LAYER_CAPACITY,
+                'expiry': 60,
+            },
+        },
+    }
+elif CHANNEL_LAYER == 'sqlite':
+    CHANNEL_LAYERS = {
+        'default': {
+            'BACKEND': 'clinic_project.channel_layers.SQLiteChannelLayer',
+            'CONFIG': {
+                'path': os.environ.get('DJANGO_CHANNEL_LAYER_PATH', str(BASE_DIR / 'channels.sqlite3')),
+                'capacity': CHANNEL_LAYER_CAPACITY,
+                'expiry': 60,
+            },
+        },
+    }
+else:
+    CHANNEL_LAYERS = {
+        'default': {
+            'BACKEND': 'channels.layers.InMemoryChannelLayer',  # For development only
+            'CONFIG': {
+                'capacity': CHANNEL_LAYER_CAPACITY,
+            },
+        },
+    }
 
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.0/ref/settings/#default-auto-field
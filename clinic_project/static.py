@@ -0,0 +1,54 @@
+"""
+Static files under ASGI.
+
+``whitenoise.middleware.WhiteNoiseMiddleware`` is sync-only. Under daphne,
+Django therefore wraps the rest of the chain in ``async_to_sync`` for it,
+and every request, including those to ``async def`` views, goes through a
+worker thread. ``AsyncWhiteNoiseMiddleware`` is the same middleware made
+sync- and async-capable. In async mode requests that are not for a static
+file are awaited straight through on the event loop. Static files are
+looked up in WhiteNoise's in-memory table and read in a worker thread,
+which is the only blocking part.
+"""
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.http import HttpResponse
+from whitenoise.middleware import WhiteNoiseMiddleware
+
+
+class AsyncWhiteNoiseMiddleware(WhiteNoiseMiddleware):
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response=None, *args, **kwargs):
+        super().__init__(get_response, *args, **kwargs)
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        return super().__call__(request)
+
+    async def __acall__(self, request):
+        if self.autorefresh:
+            # Development only: finding a file stats the disk
+            static_file = await sync_to_async(self.find_file, thread_sensitive=False)(request.path_info)
+        else:
+            static_file = self.files.get(request.path_info)
+        if static_file is None:
+            return await self.get_response(request)
+        # No database access, so any worker thread will do
+        return await sync_to_async(self.serve_buffered, thread_sensitive=False)(static_file, request)
+
+    def serve_buffered(self, static_file, request):
+        """``serve()`` with the file read here, so the response holds no sync iterator for the event loop"""
+        response = self.serve(static_file, request)
+        try:
+            buffered = HttpResponse(b''.join(response), status=response.status_code)
+        finally:
+            response.close()
+        del buffered['Content-Type']
+        for header, value in response.items():
+            buffered[header] = value
+        return buffered
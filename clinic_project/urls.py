@@ -18,7 +18,7 @@ from django.contrib import admin
 from django.urls import path, include
 from django.conf import settings
 from django.conf.urls.static import static
-from . import views
+from . import views, views_ops
 
 # Customize Django Admin Site
 admin.site.site_header = "Clinic Management System - Admin"
@@ -33,6 +33,11 @@ urlpatterns = [
     path('contact/', views.contact, name='contact'),
     path('dashboard/', views.dashboard, name='dashboard'),
     path('dashboard/revenue-details/', views.revenue_details, name='revenue_details'),
+    path('ops/cache/', views_ops.query_cache_stats, name='ops_query_cache_stats'),
+    path('ops/metrics/', views_ops.request_metrics, name='ops_metrics'),
+    path('ops/metrics/prometheus/', views_ops.request_metrics_prometheus, name='ops_metrics_prometheus'),
+    path('ops/profiles/', views_ops.profile_list, name='ops_profiles'),
+    path('ops/profiles/<str:name>/', views_ops.profile_detail, name='ops_profile_detail'),
     
     # Admin
     path('admin/', admin.site.urls),
@@ -56,10 +61,13 @@ urlpatterns = [
     # Billing & Finance
     path('billing/patient-bills/', views.patient_bills, name='patient_bills'),
     path('billing/export-patient-bills/', views.export_patient_bills, name='export_patient_bills'),
+    path('billing/overdue-aging/', views.export_overdue_aging, name='export_overdue_aging'),
     path('billing/patient-payments/<int:patient_id>/', views.patient_payments, name='patient_payments'),
+    path('billing/top-debtors/', views.top_debtors, name='top_debtors'),
     path('billing/create-bill/', views.create_bill, name='create_bill'),
     path('billing/get-patients/', views.get_patients, name='get_patients'),
     path('billing/pay-bill/<int:bill_id>/', views.pay_bill, name='pay_bill'),
+    path('billing/bulk/', views.bulk_billing, name='bulk_billing'),
     path('billing/consultation-fees/', views.consultation_fees, name='consultation_fees'),
     path('api/create-appointment/', views.create_appointment_api, name='create_appointment_api'),
     path('finance/accounts/', views.accounts_finance, name='accounts_finance'),
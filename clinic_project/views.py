@@ -78,7 +78,7 @@ def dashboard(request):
         from appointments.models import Appointment
         from patients.models import PatientPayment
         from datetime import date
-        from django.db.models import Sum
+        from django.db.models import Count, Q, Sum
         
         User = get_user_model()
         
@@ -123,32 +123,34 @@ def dashboard(request):
         from decimal import Decimal
         current_month = today.replace(day=1)
         
-        # Calculate monthly revenue with proper handling
-        monthly_revenue = Decimal('0')
-        for payment in PatientPayment.objects.filter(payment_date__gte=current_month):
-            monthly_revenue += payment.amount
-        
-        # Calculate total revenue with proper handling  
-        total_revenue = Decimal('0')
-        for payment in PatientPayment.objects.all():
-            total_revenue += payment.amount
-        
-        # Get recent payments count (last 7 days)
+        # Revenue and appointment figures are cached until payments or appointments change
+        from clinic_project.query_cache import APPOINTMENTS, PAYMENTS, cached_result
         from datetime import timedelta
         week_ago = today - timedelta(days=7)
-        recent_payments_count = PatientPayment.objects.filter(
-            payment_date__gte=week_ago
-        ).count()
+        
+        def compute_revenue_stats():
+            return PatientPayment.objects.aggregate(
+                monthly_revenue=Sum('amount', filter=Q(payment_date__gte=current_month)),
+                total_revenue=Sum('amount'),
+                recent_payments_count=Count('id', filter=Q(payment_date__gte=week_ago)),
+            )
+        
+        revenue_stats = cached_result('dashboard:revenue', [PAYMENTS], compute_revenue_stats, params=[today])
+        today_appointments = cached_result(
+            'dashboard:today_appointments',
+            [APPOINTMENTS],
+            lambda: Appointment.objects.filter(appointment_date=today).count(),
+            params=[today],
+        )
+        recent_payments_count = revenue_stats['recent_payments_count']
         
         # Prepare stats with fresh database queries
         stats = {
             'patients_count': Patient.objects.filter(is_active=True).count(),
             'doctors_count': doctors.count(),
-            'today_appointments': Appointment.objects.filter(
-                appointment_date=today
-            ).count(),
-            'monthly_revenue': monthly_revenue,
-            'total_revenue': total_revenue,
+            'today_appointments': today_appointments,
+            'monthly_revenue': revenue_stats['monthly_revenue'] or Decimal('0'),
+            'total_revenue': revenue_stats['total_revenue'] or Decimal('0'),
         }
         
         # Get recent patients with user data (up to 2 for dashboard preview)
@@ -313,6 +315,7 @@ def patient_bills(request):
     """Patient Billing Management"""
     from patients.models import PatientPayment, PatientBill
     from decimal import Decimal
+    from datetime import date
     from django.core.paginator import Paginator
     from django.db.models import Q
     
@@ -320,7 +323,7 @@ def patient_bills(request):
     search_query = request.GET.get('search', '').strip()
     
     # Get all bills and payments with search filtering
-    bills_queryset = PatientBill.objects.select_related('patient__user').order_by('-bill_date')
+    bills_queryset = PatientBill.objects.select_related('patient__user').with_overdue().order_by('-bill_date')
     payments_queryset = PatientPayment.objects.select_related('patient__user').order_by('-payment_date')
     
     # Apply search filter if query exists
@@ -334,6 +337,7 @@ def patient_bills(request):
             Q(notes__icontains=search_query)
         )
         payments_queryset = payments_queryset.filter(
+            Q(payment_number__icontains=search_query) |
             Q(patient__user__first_name__icontains=search_query) |
             Q(patient__user__last_name__icontains=search_query) |
             Q(patient__user__email__icontains=search_query) |
@@ -343,6 +347,7 @@ def patient_bills(request):
     
     # Combine bills and payments into a unified list
     all_records = []
+    today = date.today()
     
     # Add actual bills
     for bill in bills_queryset:
@@ -355,13 +360,13 @@ def patient_bills(request):
             'due_date': bill.due_date,
             'total_amount': bill.amount,
             'paid_amount': bill.paid_amount,
-            'remaining_amount': bill.remaining_amount,
+            'remaining_amount': bill.balance_due,
             'status': bill.status,
             'payment_type': bill.description,
             'payment_method': 'N/A',
             'notes': bill.notes,
-            'is_overdue': bill.is_overdue,
-            'days_overdue': bill.days_overdue,
+            'is_overdue': bill.overdue,
+            'days_overdue': (today - bill.due_date).days if bill.overdue else 0,
             'original_object': bill
         }
         all_records.append(record)
@@ -371,7 +376,7 @@ def patient_bills(request):
         record = {
             'id': f'payment_{payment.id}',
             'type': 'payment',
-            'bill_number': f'PAY-{payment.id:06d}',
+            'bill_number': payment.payment_number,
             'patient': payment.patient,
             'bill_date': payment.payment_date,
             'due_date': payment.payment_date,
@@ -396,19 +401,25 @@ def patient_bills(request):
     page_number = request.GET.get('page')
     page_obj = paginator.get_page(page_number)
     
-    # Calculate summary statistics
-    total_bills = bills_queryset.count()
+    # Calculate summary statistics in SQL
+    bill_totals = bills_queryset.order_by().aggregate(
+        count=Count('id'),
+        paid=Sum('paid_amount'),
+        pending=Sum('balance_due', filter=~Q(status='paid')),
+        overdue=Sum('balance_due', filter=PatientBill.objects.overdue_q(today)),
+    )
     
     # Calculate total paid: only count non-bill payments + bill payments separately to avoid double counting
-    non_bill_payments = sum(payment.amount for payment in payments_queryset if payment.payment_type != 'bill_payment')
-    bill_payments = sum(bill.paid_amount for bill in bills_queryset)
-    total_paid = non_bill_payments + bill_payments
+    non_bill_payments = payments_queryset.exclude(payment_type='bill_payment').aggregate(
+        total=Sum('amount')
+    )['total'] or Decimal('0')
+    total_paid = non_bill_payments + (bill_totals['paid'] or Decimal('0'))
     
-    total_pending = sum(bill.remaining_amount for bill in bills_queryset if bill.status in ['unpaid', 'partially_paid'])
-    total_overdue = sum(bill.remaining_amount for bill in bills_queryset if bill.is_overdue)
+    total_pending = bill_totals['pending'] or Decimal('0')
+    total_overdue = bill_totals['overdue'] or Decimal('0')
     
     summary = {
-        'total_bills': total_bills + payments_queryset.count(),
+        'total_bills': bill_totals['count'] + payments_queryset.count(),
         'total_paid': total_paid,
         'total_pending': total_pending,
         'total_overdue': total_overdue
@@ -475,7 +486,7 @@ def export_patient_bills(request):
     payments = PatientPayment.objects.select_related('patient__user').all()
     for payment in payments:
         all_records.append({
-            'id': f'PAY-{payment.id:06d}',
+            'id': payment.payment_number,
             'type': 'Payment',
             'patient_name': payment.patient.user.get_full_name() if payment.patient.user else 'N/A',
             'patient_phone': payment.patient.phone or 'N/A',
@@ -507,6 +518,33 @@ def export_patient_bills(request):
     
     return response
 
+@login_required
+def export_overdue_aging(request):
+    """Export the overdue aging report (0-30, 31-60, 61-90, 90+ days) to CSV"""
+    if not (request.user.is_staff or getattr(request.user, 'user_type', '') == 'admin'):
+        return JsonResponse({'error': 'Permission denied'}, status=403)
+    
+    import csv
+    from patients.models import PatientBill
+    from datetime import date
+    
+    today = date.today()
+    response = HttpResponse(content_type='text/csv')
+    response['Content-Disposition'] = f'attachment; filename="overdue_aging_{today.strftime("%Y%m%d")}.csv"'
+    
+    writer = csv.writer(response)
+    writer.writerow(['Days Overdue', 'Bills', 'Patients', 'Outstanding'])
+    
+    total_bills = 0
+    total_outstanding = 0
+    for row in PatientBill.objects.aging_report(today):
+        writer.writerow([row['bucket'], row['bill_count'], row['patient_count'], f"{row['outstanding']:.2f}"])
+        total_bills += row['bill_count']
+        total_outstanding += row['outstanding']
+    writer.writerow(['Total', total_bills, '', f"{total_outstanding:.2f}"])
+    
+    return response
+
 @login_required
 def consultation_fees(request):
     """Consultation Fees Management with Appointments"""
@@ -620,15 +658,14 @@ def accounts_finance(request):
     last_month = (current_month - timedelta(days=1)).replace(day=1)
     last_month_end = current_month - timedelta(days=1)
     
-    # Calculate Revenue (from PatientPayments)
-    current_month_revenue = PatientPayment.objects.filter(
-        payment_date__gte=current_month
-    ).aggregate(total=Sum('amount'))['total'] or Decimal('0')
+    # Monthly revenue/expense series for the last 6 months (one grouped query per table)
+    from patients.finance import revenue_expense_series, shift_periods, next_period
+    month_end = next_period(current_month, 'month') - timedelta(days=1)
+    series = revenue_expense_series(shift_periods(today, 'month', 5), month_end, 'month')
     
-    last_month_revenue = PatientPayment.objects.filter(
-        payment_date__gte=last_month,
-        payment_date__lte=last_month_end
-    ).aggregate(total=Sum('amount'))['total'] or Decimal('0')
+    # Calculate Revenue (from PatientPayments)
+    current_month_revenue = series['revenue'][-1]
+    last_month_revenue = series['revenue'][-2]
     
     # Calculate revenue change percentage
     if last_month_revenue > 0:
@@ -637,14 +674,8 @@ def accounts_finance(request):
         revenue_change = 100 if current_month_revenue > 0 else 0
     
     # Calculate Expenses
-    current_month_expenses = Expense.objects.filter(
-        expense_date__gte=current_month
-    ).aggregate(total=Sum('amount'))['total'] or Decimal('0')
-    
-    last_month_expenses = Expense.objects.filter(
-        expense_date__gte=last_month,
-        expense_date__lte=last_month_end
-    ).aggregate(total=Sum('amount'))['total'] or Decimal('0')
+    current_month_expenses = series['expenses'][-1]
+    last_month_expenses = series['expenses'][-2]
     
     # Calculate expense change percentage
     if last_month_expenses > 0:
@@ -662,78 +693,75 @@ def accounts_finance(request):
     else:
         net_profit_change = 100 if net_profit > 0 else -100 if net_profit < 0 else 0
     
-    # Calculate Outstanding (unpaid and partially paid bills)
-    from django.db.models import F
-    outstanding_bills_data = PatientBill.objects.filter(
-        status__in=['unpaid', 'partially_paid']
-    ).aggregate(
-        total_amount=Sum('amount'),
-        total_paid=Sum('paid_amount')
-    )
+    # Calculate Outstanding (unpaid and partially paid bills), cached until bills change
+    from clinic_project.query_cache import BILLS, EXPENSES, PAYMENTS, cached_result
     
-    total_amount = outstanding_bills_data['total_amount'] or Decimal('0')
-    total_paid = outstanding_bills_data['total_paid'] or Decimal('0')
-    outstanding_bills = total_amount - total_paid
-    
-    # Count overdue payments
-    overdue_count = PatientBill.objects.filter(
-        status__in=['unpaid', 'partially_paid'],
-        due_date__lt=today
-    ).count()
-    
-    # Revenue vs Expenses for last 6 months
-    revenue_vs_expenses = []
-    labels_6_months = []
+    def compute_outstanding():
+        outstanding_bills_data = PatientBill.objects.filter(
+            status__in=['unpaid', 'partially_paid']
+        ).aggregate(
+            total_amount=Sum('amount'),
+            total_paid=Sum('paid_amount')
+        )
+        total_amount = outstanding_bills_data['total_amount'] or Decimal('0')
+        total_paid = outstanding_bills_data['total_paid'] or Decimal('0')
+        # Count overdue payments
+        overdue_count = PatientBill.objects.overdue(today).count()
+        return total_amount - total_paid, overdue_count
+    
+    outstanding_bills, overdue_count = cached_result(
+        'finance:outstanding', [BILLS], compute_outstanding, params=[today]
+    )
     
-    for i in range(5, -1, -1):
-        month_start = (current_month - timedelta(days=32*i)).replace(day=1)
-        month_end = (month_start.replace(month=month_start.month % 12 + 1) if month_start.month < 12 
-                    else month_start.replace(year=month_start.year + 1, month=1)) - timedelta(days=1)
+    # Recent Transactions (mix of payments and expenses)
+    def compute_recent_transactions():
+        # Ids only: patient and category names are joined below, as editing them bumps no group
+        recent_payments = PatientPayment.objects.order_by('-payment_date')[:10]
+        recent_expenses = Expense.objects.order_by('-expense_date')[:10]
         
-        month_revenue = PatientPayment.objects.filter(
-            payment_date__gte=month_start,
-            payment_date__lte=month_end
-        ).aggregate(total=Sum('amount'))['total'] or Decimal('0')
+        # Combine and sort recent transactions
+        recent_transactions = []
         
-        month_expenses = Expense.objects.filter(
-            expense_date__gte=month_start,
-            expense_date__lte=month_end
-        ).aggregate(total=Sum('amount'))['total'] or Decimal('0')
+        for payment in recent_payments:
+            recent_transactions.append({
+                'date': payment.payment_date.date() if hasattr(payment.payment_date, 'date') else payment.payment_date,
+                'patient_id': payment.patient_id,
+                'category': payment.get_payment_type_display(),
+                'amount': payment.amount,
+                'type': 'revenue'
+            })
         
-        revenue_vs_expenses.append({
-            'revenue': float(month_revenue),
-            'expenses': float(month_expenses)
-        })
-        labels_6_months.append(month_name[month_start.month][:3])
-    
-    # Recent Transactions (mix of payments and expenses)
-    recent_payments = PatientPayment.objects.select_related('patient__user').order_by('-payment_date')[:10]
-    recent_expenses = Expense.objects.select_related('category').order_by('-expense_date')[:10]
+        for expense in recent_expenses:
+            recent_transactions.append({
+                'date': expense.expense_date,
+                'description': expense.description,
+                'category_id': expense.category_id,
+                'amount': -expense.amount,  # Negative for expenses
+                'type': 'expense'
+            })
+        
+        # Sort by date (newest first) and take top 10
+        recent_transactions.sort(key=lambda x: x['date'], reverse=True)
+        return recent_transactions[:10]
     
-    # Combine and sort recent transactions
+    cached_transactions = cached_result(
+        'finance:recent_transaction_rows', [PAYMENTS, EXPENSES], compute_recent_transactions
+    )
+    payment_patients = Patient.objects.select_related('user').in_bulk(
+        {row['patient_id'] for row in cached_transactions if row['type'] == 'revenue'}
+    )
+    expense_categories_by_id = ExpenseCategory.objects.in_bulk(
+        {row['category_id'] for row in cached_transactions if row['type'] == 'expense'}
+    )
     recent_transactions = []
-    
-    for payment in recent_payments:
-        recent_transactions.append({
-            'date': payment.payment_date.date() if hasattr(payment.payment_date, 'date') else payment.payment_date,
-            'description': f"Payment from {payment.patient.user.get_full_name() if payment.patient.user else 'Unknown'}",
-            'category': payment.get_payment_type_display(),
-            'amount': payment.amount,
-            'type': 'revenue'
-        })
-    
-    for expense in recent_expenses:
-        recent_transactions.append({
-            'date': expense.expense_date,
-            'description': expense.description,
-            'category': expense.category.name,
-            'amount': -expense.amount,  # Negative for expenses
-            'type': 'expense'
-        })
-    
-    # Sort by date (newest first) and take top 10
-    recent_transactions.sort(key=lambda x: x['date'], reverse=True)
-    recent_transactions = recent_transactions[:10]
+    for row in cached_transactions:
+        if row['type'] == 'revenue':
+            patient = payment_patients.get(row['patient_id'])
+            name = patient.user.get_full_name() if patient and patient.user else 'Unknown'
+            recent_transactions.append(dict(row, description=f"Payment from {name}"))
+        else:
+            category = expense_categories_by_id.get(row['category_id'])
+            recent_transactions.append(dict(row, category=category.name if category else ''))
     
     # Doctor revenue analysis
     from appointments.models import Appointment
@@ -865,9 +893,9 @@ def accounts_finance(request):
     # Prepare chart data
     chart_data = {
         'revenue_vs_expenses': {
-            'labels': labels_6_months,
-            'revenue_data': [item['revenue'] for item in revenue_vs_expenses],
-            'expense_data': [item['expenses'] for item in revenue_vs_expenses]
+            'labels': series['labels'],
+            'revenue_data': [float(value) for value in series['revenue']],
+            'expense_data': [float(value) for value in series['expenses']]
         }
     }
     
@@ -963,16 +991,16 @@ def expenses(request):
     current_month = today.replace(day=1)
     last_month = (current_month - timedelta(days=1)).replace(day=1)
     
+    # Monthly expense series for the last 12 months (one grouped query per table)
+    from patients.finance import revenue_expense_series, expenses_by_category, shift_periods, next_period
+    month_end = next_period(current_month, 'month') - timedelta(days=1)
+    series = revenue_expense_series(shift_periods(today, 'month', 11), month_end, 'month')
+    
     # Total expenses this month
-    total_expenses = Expense.objects.filter(
-        expense_date__gte=current_month
-    ).aggregate(total=Sum('amount'))['total'] or Decimal('0')
+    total_expenses = series['expenses'][-1]
     
     # Last month expenses for comparison
-    last_month_expenses = Expense.objects.filter(
-        expense_date__gte=last_month,
-        expense_date__lt=current_month
-    ).aggregate(total=Sum('amount'))['total'] or Decimal('0')
+    last_month_expenses = series['expenses'][-2]
     
     # Calculate percentage change
     if last_month_expenses > 0:
@@ -984,9 +1012,12 @@ def expenses(request):
     categories_count = ExpenseCategory.objects.filter(is_active=True).count()
     
     # Recurring expenses
-    recurring_expenses = Expense.objects.filter(
-        is_recurring=True
-    ).aggregate(total=Sum('amount'))['total'] or Decimal('0')
+    from clinic_project.query_cache import EXPENSES, cached_result
+    recurring_expenses = cached_result(
+        'finance:recurring_expenses',
+        [EXPENSES],
+        lambda: Expense.objects.filter(is_recurring=True).aggregate(total=Sum('amount'))['total'] or Decimal('0'),
+    )
     
     # Average daily spend
     days_in_month = today.day
@@ -1001,28 +1032,11 @@ def expenses(request):
     from calendar import month_name
     
     # Expenses over time (last 12 months)
-    expenses_over_time = []
-    labels_over_time = []
-    
-    for i in range(11, -1, -1):
-        month_start = (current_month - timedelta(days=32*i)).replace(day=1)
-        month_end = (month_start.replace(month=month_start.month % 12 + 1) if month_start.month < 12 
-                    else month_start.replace(year=month_start.year + 1, month=1)) - timedelta(days=1)
-        
-        month_total = Expense.objects.filter(
-            expense_date__gte=month_start,
-            expense_date__lte=month_end
-        ).aggregate(total=Sum('amount'))['total'] or Decimal('0')
-        
-        expenses_over_time.append(float(month_total))
-        labels_over_time.append(month_name[month_start.month][:3])
+    expenses_over_time = [float(value) for value in series['expenses']]
+    labels_over_time = series['labels']
     
     # Expenses by category (current month)
-    category_expenses = Expense.objects.filter(
-        expense_date__gte=current_month
-    ).values('category__name').annotate(
-        total=Sum('amount')
-    ).order_by('-total')
+    category_expenses = expenses_by_category(current_month, month_end)
     
     category_labels = []
     category_data = []
@@ -1039,9 +1053,9 @@ def expenses(request):
         'rgba(168, 85, 247, 0.8)'
     ]
     
-    for i, category in enumerate(category_expenses):
-        category_labels.append(category['category__name'])
-        category_data.append(float(category['total']))
+    for category_name, total in category_expenses:
+        category_labels.append(category_name)
+        category_data.append(float(total))
     
     # Serialize chart data as JSON
     chart_data_json = json.dumps({
@@ -1194,15 +1208,12 @@ def refresh_financial_data(request):
             today = date.today()
             current_month = today.replace(day=1)
             
-            # Calculate current month revenue
-            current_month_revenue = PatientPayment.objects.filter(
-                payment_date__gte=current_month
-            ).aggregate(total=Sum('amount'))['total'] or Decimal('0')
-            
-            # Calculate current month expenses
-            current_month_expenses = Expense.objects.filter(
-                expense_date__gte=current_month
-            ).aggregate(total=Sum('amount'))['total'] or Decimal('0')
+            # Current month revenue and expenses from the memoized monthly series
+            from patients.finance import revenue_expense_series, next_period
+            month_end = next_period(current_month, 'month') - timedelta(days=1)
+            series = revenue_expense_series(current_month, month_end, 'month')
+            current_month_revenue = series['revenue'][-1]
+            current_month_expenses = series['expenses'][-1]
             
             # Calculate net profit
             net_profit = current_month_revenue - current_month_expenses
@@ -1359,29 +1370,39 @@ def revenue_details(request):
     today = timezone.now().date()
     current_month = today.replace(day=1)
     
-    monthly_payments = PatientPayment.objects.filter(
-        payment_date__gte=current_month
-    ).select_related('patient__user').order_by('-payment_date')
-    
-    # Calculate total
-    total_revenue = Decimal('0')
-    for payment in monthly_payments:
-        total_revenue += payment.amount
-    
-    # Prepare payment data
-    payments_data = []
-    for payment in monthly_payments:
-        payments_data.append({
-            'id': payment.id,
-            'patient_name': payment.patient.full_name,
-            'amount': str(payment.amount),
-            'payment_type': payment.payment_type,
-            'payment_type_display': payment.get_payment_type_display(),
-            'payment_method': payment.payment_method,
-            'payment_method_display': payment.get_payment_method_display(),
-            'payment_date': payment.payment_date.strftime('%b %d, %Y at %I:%M %p'),
-            'notes': payment.notes or ''
-        })
+    def compute_monthly_payments():
+        monthly_payments = PatientPayment.objects.filter(
+            payment_date__gte=current_month
+        ).order_by('-payment_date')
+        
+        # Prepare payment data
+        payments_data = []
+        total_revenue = Decimal('0')
+        for payment in monthly_payments:
+            total_revenue += payment.amount
+            payments_data.append({
+                'id': payment.id,
+                'patient_id': payment.patient_id,
+                'amount': str(payment.amount),
+                'payment_type': payment.payment_type,
+                'payment_type_display': payment.get_payment_type_display(),
+                'payment_method': payment.payment_method,
+                'payment_method_display': payment.get_payment_method_display(),
+                'payment_date': payment.payment_date.strftime('%b %d, %Y at %I:%M %p'),
+                'notes': payment.notes or ''
+            })
+        return payments_data, total_revenue
+    
+    # Cached until the next payment is recorded; names are joined per request, so patient edits show at once
+    from clinic_project.query_cache import PAYMENTS, cached_result
+    payments_data, total_revenue = cached_result(
+        'dashboard:revenue_detail_rows', [PAYMENTS], compute_monthly_payments, params=[current_month]
+    )
+    patients = Patient.objects.select_related('user').in_bulk({row['patient_id'] for row in payments_data})
+    payments_data = [
+        dict(row, patient_name=patients[row['patient_id']].full_name if row['patient_id'] in patients else '')
+        for row in payments_data
+    ]
     
     return JsonResponse({
         'payments': payments_data,
@@ -1397,7 +1418,6 @@ def patient_payments(request, patient_id):
         return JsonResponse({'error': 'Permission denied'}, status=403)
     
     from patients.models import PatientPayment, PatientBill, Patient
-    from decimal import Decimal
     
     # Get the patient
     try:
@@ -1415,18 +1435,9 @@ def patient_payments(request, patient_id):
         patient=patient
     ).order_by('-bill_date')
     
-    # Calculate totals
-    total_paid = Decimal('0')
-    total_due = Decimal('0')
-    
-    # Only count non-bill payments to avoid double counting
-    for payment in patient_payments:
-        if payment.payment_type != 'bill_payment':
-            total_paid += payment.amount
-    
-    for bill in patient_bills:
-        total_paid += bill.paid_amount
-        total_due += bill.remaining_amount
+    # Totals come from the denormalized account summary instead of re-summing every record
+    from patients.balances import get_account_summary
+    summary = get_account_summary(patient)
     
     # Prepare combined data
     records_data = []
@@ -1445,7 +1456,7 @@ def patient_payments(request, patient_id):
             'payment_method_display': payment.get_payment_method_display(),
             'date': payment.payment_date.strftime('%b %d, %Y at %I:%M %p'),
             'notes': payment.notes or '',
-            'bill_number': f'PAY-{payment.id:06d}'
+            'bill_number': payment.payment_number
         })
     
     # Add bills
@@ -1474,12 +1485,41 @@ def patient_payments(request, patient_id):
     
     return JsonResponse({
         'records': records_data,
-        'total_paid': str(total_paid),
-        'total_due': str(total_due),
+        'total_paid': str(summary.total_paid),
+        'total_due': str(summary.outstanding),
+        'total_billed': str(summary.total_billed),
+        'oldest_unpaid_due_date': summary.oldest_unpaid_due_date.strftime('%b %d, %Y') if summary.oldest_unpaid_due_date else None,
         'count': len(records_data),
         'patient_name': patient.full_name
     })
 
+@login_required
+def top_debtors(request):
+    """API endpoint listing patients with the largest outstanding balances"""
+    if not (request.user.is_staff or getattr(request.user, 'user_type', '') == 'admin'):
+        return JsonResponse({'error': 'Permission denied'}, status=403)
+    
+    from patients.balances import top_debtors as get_top_debtors
+    
+    try:
+        limit = min(max(int(request.GET.get('limit', 100)), 1), 1000)
+    except ValueError:
+        limit = 100
+    
+    debtors = []
+    for summary in get_top_debtors(limit):
+        debtors.append({
+            'patient_id': summary.patient_id,
+            'patient_name': summary.patient.full_name,
+            'total_billed': str(summary.total_billed),
+            'total_paid': str(summary.total_paid),
+            'outstanding': str(summary.outstanding),
+            'oldest_unpaid_due_date': summary.oldest_unpaid_due_date.isoformat() if summary.oldest_unpaid_due_date else None,
+            'is_overdue': summary.is_overdue,
+        })
+    
+    return JsonResponse({'debtors': debtors, 'count': len(debtors)})
+
 @login_required
 def create_bill(request):
     """Create a new bill for a patient"""
@@ -1617,3 +1657,41 @@ def pay_bill(request, bill_id):
             messages.error(request, f'Error processing payment: {str(e)}')
     
     return redirect('patient_bills')
+
+@login_required
+def bulk_billing(request):
+    """API endpoint to create many bills and/or payments in one request"""
+    if not (request.user.is_staff or getattr(request.user, 'user_type', '') == 'admin'):
+        return JsonResponse({'success': False, 'error': 'Permission denied'}, status=403)
+    
+    if request.method != 'POST':
+        return JsonResponse({'success': False, 'error': 'Invalid request method'}, status=405)
+    
+    import json
+    from patients.billing import bulk_create_bills, bulk_record_payments
+    
+    try:
+        data = json.loads(request.body)
+    except (ValueError, TypeError):
+        return JsonResponse({'success': False, 'error': 'Request body must be valid JSON'}, status=400)
+    if not isinstance(data, dict):
+        return JsonResponse({'success': False, 'error': 'Request body must be a JSON object'}, status=400)
+    
+    bills = data.get('bills') or []
+    payments = data.get('payments') or []
+    if not isinstance(bills, list) or not isinstance(payments, list):
+        return JsonResponse({'success': False, 'error': 'bills and payments must be lists'}, status=400)
+    if not all(isinstance(row, dict) for row in bills + payments):
+        return JsonResponse({'success': False, 'error': 'Each bill and payment must be an object'}, status=400)
+    
+    # Bills first so a batch can pay bills it created by bill_number
+    bill_results = bulk_create_bills(bills, created_by=request.user) if bills else []
+    payment_results = bulk_record_payments(payments) if payments else []
+    
+    return JsonResponse({
+        'success': True,
+        'bills': bill_results,
+        'payments': payment_results,
+        'bills_created': sum(1 for result in bill_results if result['success']),
+        'payments_created': sum(1 for result in payment_results if result['success']),
+    })
@@ -0,0 +1,99 @@
+from django.contrib.auth.decorators import login_required
+from django.conf import settings
+from django.http import FileResponse, Http404, HttpResponse, JsonResponse
+from django.shortcuts import render
+from django.utils.crypto import constant_time_compare
+from inventory.scanning import code_cache
+
+from .metrics import metrics
+from .profiling import CPROFILE, list_profiles, profiles_dir
+from .query_cache import GROUPS, cache_stats, generations
+
+
+def _is_staff(user):
+    return user.is_staff or getattr(user, 'user_type', '') == 'admin'
+
+
+@login_required
+def query_cache_stats(request):
+    """Hit/miss counters of the query result cache for this worker process"""
+    if not _is_staff(request.user):
+        return JsonResponse({'error': 'Permission denied'}, status=403)
+    
+    stats = cache_stats()
+    hits = sum(counts['hits'] for counts in stats.values())
+    misses = sum(counts['misses'] for counts in stats.values())
+    return JsonResponse({
+        'backend': settings.CACHES['default']['BACKEND'],
+        'generations': dict(zip(GROUPS, generations(GROUPS))),
+        'hits': hits,
+        'misses': misses,
+        'hit_ratio': round(hits / (hits + misses), 3) if hits + misses else None,
+        'results': stats,
+        'scan_codes': code_cache.stats(),
+    })
+
+
+@login_required
+def request_metrics(request):
+    """Per-route latency percentiles, DB/template time and response size for this worker process"""
+    if not _is_staff(request.user):
+        return JsonResponse({'error': 'Permission denied'}, status=403)
+    
+    routes = metrics.route_summary()
+    if request.GET.get('format') == 'json':
+        return JsonResponse({'routes': routes})
+    return render(request, 'ops/metrics.html', {
+        'routes': routes,
+        'metrics_enabled': settings.METRICS_ENABLED,
+        'slow_request_ms': settings.METRICS_SLOW_REQUEST_MS,
+    })
+
+
+def request_metrics_prometheus(request):
+    """Prometheus text format; for staff, or scrapers sending the METRICS_TOKEN bearer token"""
+    authorization = request.headers.get('Authorization', '')
+    token_ok = bool(settings.METRICS_TOKEN) and constant_time_compare(
+        authorization, f'Bearer {settings.METRICS_TOKEN}'
+    )
+    if not token_ok and not (request.user.is_authenticated and _is_staff(request.user)):
+        return HttpResponse('Forbidden\n', status=403, content_type='text/plain')
+    return HttpResponse(metrics.prometheus_text(), content_type='text/plain; version=0.0.4; charset=utf-8')
+
+
+@login_required
+def profile_list(request):
+    """Stored request profiles, newest first"""
+    if not _is_staff(request.user):
+        return JsonResponse({'error': 'Permission denied'}, status=403)
+    
+    return render(request, 'ops/profiles.html', {
+        'profiles': list_profiles(),
+        'profiling_enabled': settings.PROFILING_ENABLED,
+        'sample_rates': settings.PROFILING_SAMPLE_RATES,
+    })
+
+
+@login_required
+def profile_detail(request, name):
+    """Download a stored profile, or ``?format=stats`` for the top functions of a cProfile run"""
+    if not _is_staff(request.user):
+        return JsonResponse({'error': 'Permission denied'}, status=403)
+    
+    profile = next((p for p in list_profiles() if p['name'] == name), None)
+    if profile is None:
+        raise Http404('Profile not found')
+    path = profiles_dir() / profile['file']
+    if not path.is_file():
+        raise Http404('Profile not found')
+    
+    if request.GET.get('format') == 'stats' and profile['mode'] == CPROFILE:
+        import io
+        import pstats
+        
+        output = io.StringIO()
+        stats = pstats.Stats(str(path), stream=output)
+        sort = request.GET.get('sort')
+        stats.sort_stats(sort if sort in ('cumulative', 'tottime', 'calls') else 'cumulative').print_stats(60)
+        return HttpResponse(output.getvalue(), content_type='text/plain; charset=utf-8')
+    return FileResponse(path.open('rb'), as_attachment=True, filename=profile['file'])
@@ -0,0 +1,391 @@
+"""
+Alert rule engine.
+
+``AlertRule.condition`` is JSON, for example::
+
+    {"field": "heart_rate", "op": ">", "value": 120}
+    {"field": "oxygen_saturation", "op": "<", "value": 92}
+    {"field": "temperature", "op": "outside", "value": [35.5, 38.0]}
+    {"all": [{...}, {...}]}, {"any": [{...}, {...}]}, {"not": {...}}
+
+Comparison ops are ``>``, ``>=``, ``<``, ``<=``, ``==`` and ``!=``, plus
+``between`` and ``outside`` over a ``[low, high]`` pair. Equipment rules
+(``equipment_due``) take ``{"days_before": 7}`` and optionally
+``"equipment_type"``.
+
+Vital rules are compiled once into *column* predicates. A predicate takes
+``{field: [values]}`` for a batch of rows and returns one bool per row,
+built from ``map()`` over ``operator`` functions. Each rule therefore runs
+one C-level loop per comparison for the whole batch, instead of walking the
+JSON for every row. A single recorded ``VitalSigns`` is simply a batch of
+one; imports pass their whole batch to ``evaluate_vitals()``.
+
+Each process keeps the compiled rules and recompiles only the rules whose
+``updated_at`` changed. It reloads them when the ``alert_rules``
+query-cache generation moves, which rule saves bump, so a change made in
+the same process applies at once. The generation only reaches processes
+that share the cache backend. Every process therefore also checks a
+marker of the rules table: the latest ``updated_at`` and the number of
+rules and active rules. It does this at most every
+``RULE_CHECK_INTERVAL`` seconds, so an edit, disable or delete made
+anywhere applies everywhere within that time. Recording vitals costs at
+most that one small query per interval.
+
+Alerts of a batch are bulk-created and sent to the dashboards' WebSocket
+group as one ``alerts.created`` message once the transaction commits.
+"""
+import logging
+import operator
+import string
+import threading
+import time
+from collections import namedtuple
+from datetime import timedelta
+from decimal import Decimal
+from itertools import compress, repeat
+
+from django.db.models import Count, Max, Q
+from django.utils import timezone
+
+from clinic_project.broadcast import broadcast
+from clinic_project.live import GROUP
+from clinic_project.query_cache import ALERT_RULES, generations
+
+logger = logging.getLogger(__name__)
+
+VITAL_FIELDS = (
+    'temperature', 'blood_pressure_systolic', 'blood_pressure_diastolic', 'heart_rate',
+    'respiratory_rate', 'oxygen_saturation', 'weight', 'height',
+)
+VITAL_ALERT_TYPES = ('vital_high', 'vital_low')
+EQUIPMENT_ALERT_TYPE = 'equipment_due'
+
+OPERATORS = {
+    '>': operator.gt,
+    '>=': operator.ge,
+    '<': operator.lt,
+    '<=': operator.le,
+    '==': operator.eq,
+    '!=': operator.ne,
+}
+RANGE_OPERATORS = ('between', 'outside')
+NAN = float('nan')
+
+# Alerts listed in one WebSocket message; the count is always complete
+MAX_PUSHED_ALERTS = 50
+# Seconds between each process's checks of the rules table for changes made elsewhere
+RULE_CHECK_INTERVAL = 5
+
+CompiledRule = namedtuple('CompiledRule', ['rule', 'updated_at', 'fields', 'mask'])
+
+
+class InvalidCondition(ValueError):
+    """An ``AlertRule.condition`` that cannot be compiled"""
+
+
+class InvalidTemplate(ValueError):
+    """An ``AlertRule.message_template`` that cannot be rendered"""
+
+
+def _and(masks):
+    result = masks[0]
+    for mask in masks[1:]:
+        result = list(map(operator.and_, result, mask))
+    return result
+
+
+def _or(masks):
+    result = masks[0]
+    for mask in masks[1:]:
+        result = list(map(operator.or_, result, mask))
+    return result
+
+
+def _number(value):
+    if isinstance(value, bool) or not isinstance(value, (int, float)):
+        raise InvalidCondition(f'Expected a number, got {value!r}')
+    return float(value)
+
+
+def compile_condition(condition):
+    """``(fields, mask)`` for a vital condition; ``mask(columns)`` returns one bool per row"""
+    if not isinstance(condition, dict):
+        raise InvalidCondition('A condition must be a JSON object')
+
+    for key, combine in (('all', _and), ('any', _or)):
+        if key in condition:
+            parts = condition[key]
+            if not isinstance(parts, list) or not parts:
+                raise InvalidCondition(f'"{key}" needs a non-empty list of conditions')
+            compiled = [compile_condition(part) for part in parts]
+            fields = frozenset().union(*(part_fields for part_fields, _ in compiled))
+            masks = [mask for _, mask in compiled]
+            return fields, lambda columns: combine([mask(columns) for mask in masks])
+
+    if 'not' in condition:
+        fields, inner = compile_condition(condition['not'])
+        return fields, lambda columns: list(map(operator.not_, inner(columns)))
+
+    field = condition.get('field')
+    op = condition.get('op')
+    if field not in VITAL_FIELDS:
+        raise InvalidCondition(f'Unknown vital sign field: {field!r}')
+
+    if op in OPERATORS:
+        compare, value = OPERATORS[op], _number(condition.get('value'))
+        return frozenset([field]), lambda columns: list(map(compare, columns[field], repeat(value)))
+
+    if op in RANGE_OPERATORS:
+        bounds = condition.get('value')
+        if not isinstance(bounds, list) or len(bounds) != 2:
+            raise InvalidCondition(f'"{op}" needs a [low, high] pair')
+        low, high = _number(bounds[0]), _number(bounds[1])
+
+        def inside(columns):
+            column = columns[field]
+            return list(map(operator.and_, map(operator.ge, column, repeat(low)), map(operator.le, column, repeat(high))))
+
+        def outside(columns):
+            # Not "not inside", so that a missing (NaN) value is neither
+            column = columns[field]
+            return list(map(operator.or_, map(operator.lt, column, repeat(low)), map(operator.gt, column, repeat(high))))
+
+        return frozenset([field]), inside if op == 'between' else outside
+
+    raise InvalidCondition(f'Unknown operator: {op!r}')
+
+
+def validate_condition(alert_type, condition):
+    """Raise ``InvalidCondition`` if a rule of ``alert_type`` could not be evaluated"""
+    if alert_type in VITAL_ALERT_TYPES:
+        compile_condition(condition)
+    elif alert_type == EQUIPMENT_ALERT_TYPE:
+        if not isinstance(condition, dict):
+            raise InvalidCondition('A condition must be a JSON object')
+        days = condition.get('days_before', 0)
+        if isinstance(days, bool) or not isinstance(days, int) or days < 0:
+            raise InvalidCondition('"days_before" must be a whole number of days')
+
+
+class RuleCache:
+    """Compiled active vital rules of this process, reloaded when the rule generation or table marker moves"""
+
+    def __init__(self, check_interval=RULE_CHECK_INTERVAL):
+        self.check_interval = check_interval
+        self._generation = None
+        self._marker = None
+        self._checked_at = None
+        self._rules = []
+        self._compiled = {}
+        self._lock = threading.Lock()
+
+    def _table_marker(self):
+        from .models import AlertRule
+
+        marker = AlertRule.objects.aggregate(
+            updated=Max('updated_at'), rules=Count('pk'), active=Count('pk', filter=Q(is_active=True))
+        )
+        return marker['updated'], marker['rules'], marker['active']
+
+    def vital_rules(self):
+        from .models import AlertRule
+
+        generation = generations([ALERT_RULES])[0]
+        with self._lock:
+            marker = self._marker
+            now = time.monotonic()
+            if self._checked_at is None or now - self._checked_at >= self.check_interval:
+                marker = self._table_marker()
+                self._checked_at = now
+            if generation == self._generation and marker == self._marker:
+                return self._rules
+
+            compiled = {}
+            for rule in AlertRule.objects.filter(is_active=True, alert_type__in=VITAL_ALERT_TYPES).order_by('pk'):
+                previous = self._compiled.get(rule.pk)
+                if previous is not None and previous.updated_at == rule.updated_at:
+                    compiled[rule.pk] = previous._replace(rule=rule)
+                    continue
+                try:
+                    fields, mask = compile_condition(rule.condition)
+                except InvalidCondition as e:
+                    logger.error(f"Alert rule {rule.pk} ({rule.name}) is not evaluated: {str(e)}")
+                    continue
+                compiled[rule.pk] = CompiledRule(rule, rule.updated_at, fields, mask)
+
+            self._compiled = compiled
+            self._rules = list(compiled.values())
+            self._generation = generation
+            self._marker = marker
+            return self._rules
+
+
+rule_cache = RuleCache()
+
+
+class _Placeholders(dict):
+    def __missing__(self, key):
+        return '{' + key + '}'
+
+
+class _Missing:
+    """A value the row does not have (a monitor reading's weight); renders as n/a whatever the format spec"""
+
+    def __format__(self, spec):
+        return 'n/a'
+
+
+MISSING = _Missing()
+
+# Placeholders each kind of rule can use, with sample values for validating templates
+EQUIPMENT_TEMPLATE_VALUES = {
+    'rule': 'rule', 'name': 'name', 'location': 'location', 'next_maintenance': '2000-01-01', 'days_left': 1,
+}
+
+
+def _vital_template_values():
+    from .models import VitalSigns
+
+    values = {
+        field: Decimal('1.0') if VitalSigns._meta.get_field(field).get_internal_type() == 'DecimalField' else 1
+        for field in VITAL_FIELDS
+    }
+    values['rule'] = 'rule'
+    return values
+
+
+def render_message(template, values):
+    """``message_template`` with ``{field}`` placeholders filled; unknown ones are left as they are.
+
+    A template that still fails to render is returned as it is, so a bad
+    template never stops the alert from being raised.
+    """
+    values = {key: MISSING if value is None else value for key, value in values.items()}
+    try:
+        return template.format_map(_Placeholders(values))
+    except (ValueError, IndexError, AttributeError, TypeError, KeyError):
+        return template
+
+
+def validate_template(alert_type, template):
+    """Raise ``InvalidTemplate`` if ``template`` uses unknown placeholders or does not render"""
+    if alert_type in VITAL_ALERT_TYPES:
+        values = _vital_template_values()
+    elif alert_type == EQUIPMENT_ALERT_TYPE:
+        values = EQUIPMENT_TEMPLATE_VALUES
+    else:
+        return
+    try:
+        names = {name for _, name, _, _ in string.Formatter().parse(template) if name is not None}
+        unknown = sorted(name for name in names if name.split('.')[0].split('[')[0] not in values)
+        if unknown:
+            raise InvalidTemplate(f"Unknown placeholders: {', '.join(unknown)}. Available: {', '.join(values)}")
+        # Rendered strictly with sample values, and with every value missing as monitor rows may be
+        template.format_map(values)
+        template.format_map({key: MISSING for key in values})
+    except InvalidTemplate:
+        raise
+    except (ValueError, IndexError, AttributeError, TypeError, KeyError) as e:
+        raise InvalidTemplate(f'The message template cannot be rendered: {e}')
+
+
+def match_vitals(rows):
+    """Unsaved ``Alert``s for every (rule, row) pair whose condition holds"""
+    from .models import Alert
+
+    rules = rule_cache.vital_rules()
+    rows = list(rows)
+    if not rules or not rows:
+        return []
+
+    fields = frozenset().union(*(compiled.fields for compiled in rules))
+    # Missing values (weight and height from monitors) become NaN, which no comparison matches
+    columns = {
+        field: [NAN if value is None else float(value) for value in (getattr(row, field) for row in rows)]
+        for field in fields
+    }
+
+    alerts = []
+    for compiled in rules:
+        rule = compiled.rule
+        for row in compress(rows, compiled.mask(columns)):
+            values = {field: getattr(row, field) for field in VITAL_FIELDS}
+            values['rule'] = rule.name
+            alerts.append(Alert(
+                rule=rule,
+                patient_id=row.patient_id,
+                message=render_message(rule.message_template, values),
+            ))
+    return alerts
+
+
+def evaluate_vitals(rows):
+    """Create (and push) the alerts raised by newly recorded ``VitalSigns`` rows"""
+    from .models import Alert
+
+    alerts = match_vitals(rows)
+    if not alerts:
+        return []
+    created = Alert.objects.bulk_create(alerts, batch_size=1000)
+    publish_alerts(created)
+    return created
+
+
+def evaluate_equipment(today=None):
+    """Alert on active equipment whose maintenance is due, once per rule until acknowledged"""
+    from .models import Alert, AlertRule, Equipment
+
+    today = today or timezone.localdate()
+    alerts = []
+    for rule in AlertRule.objects.filter(is_active=True, alert_type=EQUIPMENT_ALERT_TYPE).order_by('pk'):
+        try:
+            validate_condition(rule.alert_type, rule.condition)
+        except InvalidCondition as e:
+            logger.error(f"Alert rule {rule.pk} ({rule.name}) is not evaluated: {str(e)}")
+            continue
+
+        due = Equipment.objects.filter(
+            is_active=True,
+            next_maintenance__lte=today + timedelta(days=rule.condition.get('days_before', 0)),
+        ).exclude(
+            # Still waiting on the last alert for this rule
+            pk__in=Alert.objects.filter(rule=rule, is_acknowledged=False, equipment__isnull=False).values('equipment_id')
+        )
+        if rule.condition.get('equipment_type'):
+            due = due.filter(equipment_type=rule.condition['equipment_type'])
+
+        for equipment in due.order_by('next_maintenance'):
+            values = {
+                'rule': rule.name,
+                'name': equipment.name,
+                'location': equipment.location or '',
+                'next_maintenance': equipment.next_maintenance.isoformat(),
+                'days_left': (equipment.next_maintenance - today).days,
+            }
+            alerts.append(Alert(rule=rule, equipment=equipment, message=render_message(rule.message_template, values)))
+
+    created = Alert.objects.bulk_create(alerts)
+    publish_alerts(created)
+    return created
+
+
+def publish_alerts(alerts):
+    """Push a batch of new alerts to the dashboards as one message, after the commit"""
+    if not alerts:
+        return
+    broadcast(GROUP, {
+        'type': 'alerts.created',
+        'count': len(alerts),
+        'alerts': [
+            {
+                'id': alert.pk,
+                'rule': alert.rule.name,
+                'alert_type': alert.rule.alert_type,
+                'severity': alert.rule.severity,
+                'patient_id': alert.patient_id,
+                'equipment_id': alert.equipment_id,
+                'message': alert.message,
+            }
+            for alert in alerts[:MAX_PUSHED_ALERTS]
+        ],
+    })
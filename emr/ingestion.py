@@ -0,0 +1,195 @@
+"""
+Batch ingestion of vital signs from bedside monitors.
+
+Monitors send readings in batches: a JSON array, or NDJSON (one reading per
+line) that is parsed line by line, so a large upload is never decoded as a
+whole. A reading looks like::
+
+    {"patient_id": 12, "recorded_at": "2026-10-19T08:15:00Z", "device": "ICU-3",
+     "temperature": 37.2, "blood_pressure_systolic": 128, "blood_pressure_diastolic": 82,
+     "heart_rate": 88, "respiratory_rate": 16, "oxygen_saturation": 97}
+
+``weight`` and ``height`` are optional, and ``recorded_at`` defaults to the
+time of the upload.
+
+Every field goes through the model field's own ``clean()``, so a reading
+gets the same type, range and length checks as the ``VitalSigns`` form.
+There is no per-row ``full_clean()`` and no per-row patient lookup: the
+patient ids of a chunk are checked with one query. Valid readings are saved
+with one ``bulk_create`` per chunk of ``INGEST_CHUNK_SIZE``, and the same
+rows go to ``alerting.evaluate_vitals()`` in that transaction. Bulk creates
+send no ``post_save``, so alerts are raised once per chunk, not per reading.
+
+Invalid readings are reported by their position in the batch, and the
+others are still saved. A monitor only resends the ones it has fixed.
+"""
+import json
+from collections import namedtuple
+
+from django.core.exceptions import ValidationError
+from django.db import transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from patients.models import Patient
+
+from . import alerting
+from .models import VitalSigns
+
+INGEST_CHUNK_SIZE = 1000
+# Largest primary key the database can hold; larger ids cannot even be queried
+MAX_ID = 2 ** 63 - 1
+# Rejected readings listed in one response; the count is always complete
+MAX_REPORTED_ERRORS = 100
+
+READING_FIELDS = alerting.VITAL_FIELDS
+_FIELDS = {name: VitalSigns._meta.get_field(name) for name in READING_FIELDS}
+_NOTES_FIELD = VitalSigns._meta.get_field('notes')
+
+IngestResult = namedtuple('IngestResult', ['accepted', 'rejected', 'errors', 'alerts'])
+
+
+class InvalidReading(ValueError):
+    """A reading that cannot be stored; ``errors`` maps field names to messages"""
+
+    def __init__(self, errors):
+        super().__init__(errors)
+        self.errors = errors
+
+
+def _recorded_at(value, now):
+    if value in (None, ''):
+        return now
+    if not isinstance(value, str):
+        raise ValidationError('Expected an ISO 8601 date and time.')
+    try:
+        moment = parse_datetime(value)
+    except ValueError:
+        moment = None
+    if moment is None:
+        raise ValidationError('Expected an ISO 8601 date and time.')
+    if timezone.is_naive(moment):
+        # Monitors without a zone report the clinic's local time
+        moment = timezone.make_aware(moment)
+    return moment
+
+
+def clean_reading(raw, now=None):
+    """Field values of a reading, checked by the model fields; raises ``InvalidReading``"""
+    if not isinstance(raw, dict):
+        raise InvalidReading({'__all__': ['Expected a JSON object.']})
+
+    values = {}
+    errors = {}
+    patient_id = raw.get('patient_id', raw.get('patient'))
+    if (isinstance(patient_id, bool) or not isinstance(patient_id, (int, str)) or not str(patient_id).isdecimal()
+            or not 0 < int(patient_id) <= MAX_ID):
+        errors['patient_id'] = ['Expected a patient id.']
+    else:
+        values['patient_id'] = int(patient_id)
+
+    for name, field in _FIELDS.items():
+        value = raw.get(name)
+        if value is None and field.null:
+            values[name] = None
+            continue
+        if isinstance(value, float):
+            # Decimal(str()) keeps 37.2 as 37.2 rather than its binary expansion
+            value = str(value)
+        try:
+            values[name] = field.clean(value, None)
+        except ValidationError as e:
+            errors[name] = e.messages
+
+    try:
+        values['recorded_at'] = _recorded_at(raw.get('recorded_at'), now or timezone.now())
+    except ValidationError as e:
+        errors['recorded_at'] = e.messages
+
+    notes = raw.get('notes') or ''
+    if raw.get('device'):
+        notes = f"Monitor {raw['device']}" + (f': {notes}' if notes else '')
+    if notes:
+        try:
+            values['notes'] = _NOTES_FIELD.clean(str(notes), None)
+        except ValidationError as e:
+            errors['notes'] = e.messages
+
+    if errors:
+        raise InvalidReading(errors)
+    return values
+
+
+def parse_json_readings(body):
+    """Readings of a JSON array or ``{"readings": [...]}`` body; ValueError if it is neither"""
+    payload = json.loads(body)
+    if isinstance(payload, dict):
+        payload = payload.get('readings')
+    if not isinstance(payload, list):
+        raise ValueError('Expected a JSON array of readings or an object with a "readings" list')
+    return payload
+
+
+def parse_ndjson_readings(lines):
+    """Readings of an NDJSON stream; a line that is not JSON is yielded as its ``InvalidReading``"""
+    for line in lines:
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            yield json.loads(line)
+        except ValueError:
+            yield InvalidReading({'__all__': ['Invalid JSON.']})
+
+
+def _store(chunk, user):
+    """Save the cleaned readings of ``chunk`` (index, values) and raise their alerts; returns rejections"""
+    rejected = []
+    known = set(
+        Patient.objects.filter(pk__in={values['patient_id'] for _, values in chunk}).values_list('pk', flat=True)
+    )
+    rows = []
+    for index, values in chunk:
+        if values['patient_id'] not in known:
+            rejected.append({'index': index, 'errors': {'patient_id': ['Unknown patient.']}})
+            continue
+        rows.append(VitalSigns(recorded_by=user, **values))
+
+    alerts = []
+    if rows:
+        with transaction.atomic():
+            created = VitalSigns.objects.bulk_create(rows)
+            alerts = alerting.evaluate_vitals(created)
+    return len(rows), rejected, len(alerts)
+
+
+def ingest_readings(readings, user=None, chunk_size=INGEST_CHUNK_SIZE):
+    """Validate, store and evaluate an iterable of raw readings, chunk by chunk"""
+    now = timezone.now()
+    accepted = 0
+    alerts = 0
+    rejected = []
+    chunk = []
+
+    def flush():
+        nonlocal accepted, alerts
+        stored, refused, raised = _store(chunk, user)
+        accepted += stored
+        alerts += raised
+        rejected.extend(refused)
+        chunk.clear()
+
+    for index, raw in enumerate(readings):
+        try:
+            if isinstance(raw, InvalidReading):
+                raise raw
+            chunk.append((index, clean_reading(raw, now)))
+        except InvalidReading as e:
+            rejected.append({'index': index, 'errors': e.errors})
+        if len(chunk) >= chunk_size:
+            flush()
+    if chunk:
+        flush()
+
+    rejected.sort(key=lambda rejection: rejection['index'])
+    return IngestResult(accepted, len(rejected), rejected[:MAX_REPORTED_ERRORS], alerts)
@@ -0,0 +1,52 @@
+from django.core.management.base import BaseCommand, CommandError
+from emr.alerting import evaluate_equipment, match_vitals, rule_cache
+from emr.models import VitalSigns
+import time
+
+
+class Command(BaseCommand):
+    help = (
+        'Raise alerts for equipment whose maintenance is due (run daily from cron), '
+        'or measure how fast the vital-sign rules evaluate'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--benchmark',
+            type=int,
+            metavar='ROWS',
+            help='Evaluate the latest ROWS vital-sign rows against the active rules without saving alerts'
+        )
+        parser.add_argument('--batch-size', type=int, default=1000, help='Rows per evaluated batch (benchmark)')
+
+    def handle(self, *args, **options):
+        if options['benchmark'] is not None:
+            self.benchmark(options['benchmark'], options['batch_size'])
+            return
+
+        created = evaluate_equipment()
+        for alert in created:
+            self.stdout.write(self.style.WARNING(f'{alert.equipment.name}: {alert.message}'))
+        self.stdout.write(f'{len(created)} equipment maintenance alerts raised')
+
+    def benchmark(self, limit, batch_size):
+        if limit <= 0 or batch_size <= 0:
+            raise CommandError('--benchmark and --batch-size must be positive')
+        rules = rule_cache.vital_rules()
+        if not rules:
+            raise CommandError('There are no active vital-sign alert rules to evaluate')
+
+        rows = list(VitalSigns.objects.order_by('-recorded_at')[:limit])
+        if not rows:
+            raise CommandError('There are no vital signs to evaluate')
+
+        started = time.perf_counter()
+        matches = 0
+        for offset in range(0, len(rows), batch_size):
+            matches += len(match_vitals(rows[offset:offset + batch_size]))
+        elapsed = time.perf_counter() - started
+
+        self.stdout.write(
+            f'{len(rows):,} rows x {len(rules)} rules in {elapsed * 1000:.1f} ms: '
+            f'{len(rows) / elapsed:,.0f} rows/s, {matches:,} alerts would be raised'
+        )
@@ -0,0 +1,100 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.contrib.auth import get_user_model
+from clinic_project.loadtest import build_request, percentile, read_response, session_cookie
+from urllib.parse import urlsplit
+import asyncio
+import statistics
+import time
+
+User = get_user_model()
+
+DEFAULT_PATHS = [
+    '/emr/api/equipment/status/',
+    '/blood-bank/api/inventory/',
+    '/ot-management/api/calendar-events/?start=2024-01-01&end=2024-12-31',
+]
+
+
+class Command(BaseCommand):
+    help = 'Load-test polling endpoints on a running server with many concurrent keep-alive clients'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--url', default='http://127.0.0.1:8000', help='Base URL of the running server')
+        parser.add_argument(
+            '--path',
+            action='append',
+            dest='paths',
+            help='Endpoint to poll (repeatable); defaults to the equipment, blood inventory and calendar APIs'
+        )
+        parser.add_argument('--clients', type=int, default=200, help='Number of concurrent pollers')
+        parser.add_argument('--duration', type=float, default=10.0, help='Seconds to run')
+        parser.add_argument('--email', help='Poll as this user (a session is created for it)')
+
+    def handle(self, *args, **options):
+        url = urlsplit(options['url'])
+        if url.scheme != 'http':
+            raise CommandError('Only plain http:// servers are supported')
+
+        cookie = ''
+        if options['email']:
+            try:
+                user = User.objects.get(email=options['email'])
+            except User.DoesNotExist:
+                raise CommandError(f"User {options['email']} not found")
+            cookie = session_cookie(user)
+
+        paths = options['paths'] or DEFAULT_PATHS
+        results = asyncio.run(self.run(
+            url.hostname, url.port or 80, paths, cookie, options['clients'], options['duration']
+        ))
+        self.report(results, options['duration'], options['clients'])
+
+    async def run(self, host, port, paths, cookie, clients, duration):
+        deadline = time.perf_counter() + duration
+        results = {'latencies': [], 'statuses': {}, 'errors': 0}
+        await asyncio.gather(*(
+            self.poller(host, port, paths[i % len(paths)], cookie, deadline, results)
+            for i in range(clients)
+        ))
+        return results
+
+    async def poller(self, host, port, path, cookie, deadline, results):
+        request = build_request(host, path, cookie)
+        reader = writer = None
+        while time.perf_counter() < deadline:
+            try:
+                if writer is None:
+                    reader, writer = await asyncio.open_connection(host, port)
+                started = time.perf_counter()
+                writer.write(request)
+                await writer.drain()
+                status, keep_alive = await read_response(reader)
+                results['latencies'].append(time.perf_counter() - started)
+                results['statuses'][status] = results['statuses'].get(status, 0) + 1
+                if not keep_alive:
+                    writer.close()
+                    writer = None
+            except (OSError, asyncio.IncompleteReadError, ValueError):
+                results['errors'] += 1
+                if writer is not None:
+                    writer.close()
+                writer = None
+                await asyncio.sleep(0.05)
+        if writer is not None:
+            writer.close()
+
+    def report(self, results, duration, clients):
+        latencies = sorted(results['latencies'])
+        if not latencies:
+            self.stdout.write(self.style.ERROR(f"No successful requests ({results['errors']} errors)"))
+            return
+
+        self.stdout.write(f'Clients:     {clients}')
+        self.stdout.write(f'Requests:    {len(latencies)} ({len(latencies) / duration:,.0f} req/s)')
+        self.stdout.write(f"Errors:      {results['errors']}")
+        self.stdout.write(f"Statuses:    {dict(sorted(results['statuses'].items()))}")
+        self.stdout.write(
+            f'Latency ms:  mean {statistics.mean(latencies) * 1000:.1f}  '
+            f'p50 {percentile(latencies, 0.50) * 1000:.1f}  p95 {percentile(latencies, 0.95) * 1000:.1f}  '
+            f'p99 {percentile(latencies, 0.99) * 1000:.1f}'
+        )
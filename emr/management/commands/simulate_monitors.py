@@ -0,0 +1,145 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Q
+from django.utils import timezone
+from emr.ingestion import INGEST_CHUNK_SIZE, ingest_readings
+from patients.models import Patient
+from accounts.models import CustomUser
+from datetime import timedelta
+from urllib.parse import urlsplit
+import http.client
+import json
+import random
+import time
+
+
+class Command(BaseCommand):
+    help = (
+        'Simulate bedside monitors sending vital signs in batches, through the ingestion code '
+        'in this process or to a running server with --url, and report readings per second'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--monitors', type=int, default=50, help='Monitors, one patient each')
+        parser.add_argument('--minutes', type=int, default=60, help='Minutes of readings per monitor (one a minute)')
+        parser.add_argument('--batch-size', type=int, default=INGEST_CHUNK_SIZE, help='Readings per upload')
+        parser.add_argument('--abnormal-rate', type=float, default=0.02, help='Share of readings with an abnormal value')
+        parser.add_argument('--invalid-rate', type=float, default=0.0, help='Share of readings that fail validation')
+        parser.add_argument(
+            '--url',
+            help='Ingestion endpoint of a running server, e.g. http://localhost:8000/emr/api/vitals/ingest/'
+        )
+        parser.add_argument('--email', help='User the readings are recorded by (default: the first admin)')
+        parser.add_argument('--seed', type=int, help='Random seed, for a repeatable feed')
+
+    def handle(self, *args, **options):
+        if options['monitors'] <= 0 or options['minutes'] <= 0 or options['batch_size'] <= 0:
+            raise CommandError('--monitors, --minutes and --batch-size must be positive')
+        rng = random.Random(options['seed'])
+
+        user = self.recording_user(options['email'])
+        patient_ids = list(Patient.objects.order_by('pk').values_list('pk', flat=True)[:options['monitors']])
+        if not patient_ids:
+            raise CommandError('There are no patients to monitor')
+
+        readings = list(self.feed(rng, patient_ids, options['minutes'], options['abnormal_rate'], options['invalid_rate']))
+        batches = [readings[i:i + options['batch_size']] for i in range(0, len(readings), options['batch_size'])]
+        send = self.post_batch(options['url'], user) if options['url'] else lambda batch: self.ingest_batch(batch, user)
+
+        accepted = rejected = alerts = 0
+        started = time.perf_counter()
+        for batch in batches:
+            result = send(batch)
+            accepted += result['accepted']
+            rejected += result['rejected']
+            alerts += result['alerts']
+        elapsed = time.perf_counter() - started
+
+        self.stdout.write(
+            f'{len(readings):,} readings from {len(patient_ids)} monitors in {len(batches)} batches, '
+            f'{elapsed:.2f} s: {len(readings) / elapsed:,.0f} readings/s'
+        )
+        self.stdout.write(f'{accepted:,} accepted, {rejected:,} rejected, {alerts:,} alerts raised')
+
+    def recording_user(self, email):
+        if email:
+            try:
+                return CustomUser.objects.get(email=email)
+            except CustomUser.DoesNotExist:
+                raise CommandError(f'No user with email {email}')
+        user = CustomUser.objects.filter(Q(is_superuser=True) | Q(user_type='admin')).order_by('pk').first()
+        if user is None:
+            raise CommandError('There is no admin to record the readings; pass --email')
+        return user
+
+    def feed(self, rng, patient_ids, minutes, abnormal_rate, invalid_rate):
+        """One reading a minute per monitor over the last ``minutes``, interleaved like a live feed"""
+        start = timezone.now() - timedelta(minutes=minutes)
+        baselines = {
+            patient_id: {
+                'temperature': rng.uniform(36.4, 37.2),
+                'blood_pressure_systolic': rng.randint(105, 135),
+                'blood_pressure_diastolic': rng.randint(65, 85),
+                'heart_rate': rng.randint(60, 90),
+                'respiratory_rate': rng.randint(12, 18),
+                'oxygen_saturation': rng.randint(95, 99),
+            }
+            for patient_id in patient_ids
+        }
+        for minute in range(minutes):
+            recorded_at = (start + timedelta(minutes=minute)).isoformat()
+            for patient_id in patient_ids:
+                base = baselines[patient_id]
+                reading = {
+                    'patient_id': patient_id,
+                    'device': f'SIM-{patient_id:04d}',
+                    'recorded_at': recorded_at,
+                    'temperature': round(base['temperature'] + rng.gauss(0, 0.1), 1),
+                    'blood_pressure_systolic': base['blood_pressure_systolic'] + rng.randint(-5, 5),
+                    'blood_pressure_diastolic': base['blood_pressure_diastolic'] + rng.randint(-4, 4),
+                    'heart_rate': base['heart_rate'] + rng.randint(-4, 4),
+                    'respiratory_rate': base['respiratory_rate'] + rng.randint(-1, 1),
+                    'oxygen_saturation': min(100, base['oxygen_saturation'] + rng.randint(-1, 1)),
+                }
+                if rng.random() < abnormal_rate:
+                    reading.update(rng.choice([
+                        {'heart_rate': rng.randint(125, 160)},
+                        {'oxygen_saturation': rng.randint(82, 90)},
+                        {'temperature': round(rng.uniform(38.5, 40.0), 1)},
+                        {'blood_pressure_systolic': rng.randint(170, 200)},
+                    ]))
+                if rng.random() < invalid_rate:
+                    reading.update(rng.choice([
+                        {'oxygen_saturation': 140},
+                        {'heart_rate': 'n/a'},
+                        {'patient_id': None},
+                    ]))
+                yield reading
+
+    def ingest_batch(self, batch, user):
+        result = ingest_readings(batch, user=user)
+        return {'accepted': result.accepted, 'rejected': result.rejected, 'alerts': result.alerts}
+
+    def post_batch(self, url, user):
+        """Sender posting each batch as NDJSON to ``url`` with the user's API token"""
+        from rest_framework.authtoken.models import Token
+
+        parts = urlsplit(url)
+        if parts.scheme not in ('http', 'https') or not parts.hostname:
+            raise CommandError('--url must be an http(s) URL')
+        token, _ = Token.objects.get_or_create(user=user)
+        connection_class = http.client.HTTPSConnection if parts.scheme == 'https' else http.client.HTTPConnection
+        connection = connection_class(parts.hostname, parts.port, timeout=60)
+        path = parts.path + (f'?{parts.query}' if parts.query else '')
+
+        def send(batch):
+            body = ''.join(json.dumps(reading) + '\n' for reading in batch).encode()
+            connection.request('POST', path, body=body, headers={
+                'Content-Type': 'application/x-ndjson',
+                'Authorization': f'Token {token.key}',
+            })
+            response = connection.getresponse()
+            payload = response.read()
+            if response.status not in (200, 400):
+                raise CommandError(f'{url} answered {response.status}: {payload[:200]!r}')
+            return json.loads(payload)
+        return send
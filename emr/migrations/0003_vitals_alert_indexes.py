@@ -0,0 +1,21 @@
+# Generated by Django 5.0.14 on 2026-10-19 08:01
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('emr', '0002_medicalhistoryrecord_patientallergy_and_more'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='alert',
+            index=models.Index(condition=models.Q(('is_acknowledged', False)), fields=['created_at'], name='emr_alert_unack_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='vitalsigns',
+            index=models.Index(fields=['patient', 'recorded_at'], name='emr_vitals_patient_time_idx'),
+        ),
+    ]
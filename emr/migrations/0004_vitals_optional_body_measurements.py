@@ -0,0 +1,23 @@
+# Generated by Django 5.0.14 on 2026-10-19 08:34
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('emr', '0003_vitals_alert_indexes'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='vitalsigns',
+            name='height',
+            field=models.DecimalField(decimal_places=2, help_text='Height in cm', max_digits=5, null=True),
+        ),
+        migrations.AlterField(
+            model_name='vitalsigns',
+            name='weight',
+            field=models.DecimalField(decimal_places=2, help_text='Weight in kg', max_digits=5, null=True),
+        ),
+    ]
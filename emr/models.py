@@ -1,6 +1,7 @@
 from django.db import models
 from django.conf import settings
 from django.utils.translation import gettext_lazy as _
+from django.core.exceptions import ValidationError
 from django.core.validators import MinValueValidator, MaxValueValidator
 from django.utils import timezone
 
@@ -48,14 +49,19 @@ class VitalSigns(models.Model):
         validators=[MinValueValidator(0), MaxValueValidator(100)],
         help_text="SpO2 (%)"
     )
-    weight = models.DecimalField(max_digits=5, decimal_places=2, help_text="Weight in kg")
-    height = models.DecimalField(max_digits=5, decimal_places=2, help_text="Height in cm")
+    # Not measured by bedside monitors, so empty for readings they send
+    weight = models.DecimalField(max_digits=5, decimal_places=2, null=True, help_text="Weight in kg")
+    height = models.DecimalField(max_digits=5, decimal_places=2, null=True, help_text="Height in cm")
     notes = models.TextField(blank=True, null=True)
     recorded_at = models.DateTimeField(default=timezone.now)
 
     class Meta:
         verbose_name_plural = "Vital Signs"
         ordering = ['-recorded_at']
+        indexes = [
+            # Latest vitals per patient
+            models.Index(fields=['patient', 'recorded_at'], name='emr_vitals_patient_time_idx'),
+        ]
 
     def __str__(self):
         return f"Vitals for {self.patient} at {self.recorded_at}"
@@ -209,6 +215,20 @@ class AlertRule(models.Model):
     def __str__(self):
         return f"{self.get_alert_type_display()}: {self.name}"
 
+    def clean(self):
+        from .alerting import InvalidCondition, InvalidTemplate, validate_condition, validate_template
+        errors = {}
+        try:
+            validate_condition(self.alert_type, self.condition)
+        except InvalidCondition as e:
+            errors['condition'] = str(e)
+        try:
+            validate_template(self.alert_type, self.message_template)
+        except InvalidTemplate as e:
+            errors['message_template'] = str(e)
+        if errors:
+            raise ValidationError(errors)
+
 class Alert(models.Model):
     """Generated alerts based on rules"""
     rule = models.ForeignKey(AlertRule, on_delete=models.CASCADE, related_name='alerts')
@@ -240,6 +260,14 @@ class Alert(models.Model):
 
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            # Unacknowledged alert lists, newest first. Partial, because boolean filters
+            # compile to a bare column test that a composite index cannot serve
+            models.Index(
+                fields=['created_at'], condition=models.Q(is_acknowledged=False),
+                name='emr_alert_unack_created_idx'
+            ),
+        ]
 
     def __str__(self):
         return f"{self.rule.name} - {self.message[:50]}..."
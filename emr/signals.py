@@ -0,0 +1,27 @@
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from clinic_project.query_cache import ALERT_RULES, BARCODES, bump
+from .models import AlertRule, Equipment, VitalSigns
+
+
+@receiver(post_save, sender=Equipment)
+@receiver(post_delete, sender=Equipment)
+def bump_barcode_cache(sender, instance, **kwargs):
+    """A barcode or RFID tag may have changed, so scanners resolve codes afresh after the commit"""
+    transaction.on_commit(lambda: bump(BARCODES))
+
+
+@receiver(post_save, sender=AlertRule)
+@receiver(post_delete, sender=AlertRule)
+def bump_alert_rules(sender, instance, **kwargs):
+    """Every process reloads its compiled rules once the change commits"""
+    transaction.on_commit(lambda: bump(ALERT_RULES))
+
+
+@receiver(post_save, sender=VitalSigns)
+def evaluate_vital_signs(sender, instance, created, **kwargs):
+    """Check newly recorded vitals against the alert rules (bulk imports call evaluate_vitals themselves)"""
+    if created:
+        from .alerting import evaluate_vitals
+        evaluate_vitals([instance])
@@ -0,0 +1,94 @@
+"""
+Downsampled vital-sign series.
+
+Bedside monitors can record a reading a minute, so a week of one patient is
+about 10,000 rows. ``vital_series()`` does not send them all. It splits the
+requested range into at most ``points`` equal buckets, and the database
+returns one row per non-empty bucket with the min, max and average of each
+requested field. This is a single ``GROUP BY`` over the ``(patient,
+recorded_at)`` index range, and it never builds model instances. A chart
+over days or weeks therefore always gets a bounded number of points.
+
+The result is columnar. There is one array of bucket start times (Unix
+seconds) and reading counts, and one ``min``/``max``/``avg`` array per field.
+Charting libraries take this directly, and it is a fraction of the size of
+a list of per-reading objects.
+"""
+import math
+
+from django.db.models import Avg, BigIntegerField, Count, ExpressionWrapper, F, Func, Max, Min, Value
+
+from .alerting import VITAL_FIELDS
+from .models import VitalSigns
+
+DEFAULT_POINTS = 500
+MAX_POINTS = 2000
+
+
+class Epoch(Func):
+    """Unix seconds of a datetime column"""
+    template = 'CAST(EXTRACT(EPOCH FROM %(expressions)s) AS BIGINT)'
+    output_field = BigIntegerField()
+
+    def as_sqlite(self, compiler, connection, **extra_context):
+        # SQLite stores UTC datetimes as text; '%%%%s' survives both the template and the placeholder rewrite
+        return self.as_sql(compiler, connection, template="CAST(strftime('%%%%s', %(expressions)s) AS INTEGER)")
+
+
+def bucket_seconds(start, end, points):
+    """Width of each bucket so that ``start``..``end`` fits in ``points`` buckets"""
+    span = max(1, math.ceil((end - start).total_seconds()))
+    return max(1, math.ceil(span / points))
+
+
+def vital_series_queryset(patient_id, start, end, fields, width):
+    """One row per non-empty bucket: ``bucket``, ``n`` and ``<field>_min/_max/_avg``"""
+    start_epoch = int(start.timestamp())
+    bucket = ExpressionWrapper(
+        (Epoch('recorded_at') - Value(start_epoch)) / Value(width), output_field=BigIntegerField()
+    )
+    aggregates = {'n': Count('id')}
+    for field in fields:
+        aggregates[f'{field}_min'] = Min(field)
+        aggregates[f'{field}_max'] = Max(field)
+        aggregates[f'{field}_avg'] = Avg(field)
+    return (
+        VitalSigns.objects.filter(patient_id=patient_id, recorded_at__gte=start, recorded_at__lt=end)
+        .annotate(bucket=bucket)
+        .values('bucket')
+        .annotate(**aggregates)
+        .order_by('bucket')
+    )
+
+
+def _number(value):
+    if value is None:
+        return None
+    value = float(value)
+    return int(value) if value.is_integer() else round(value, 2)
+
+
+def columnar(rows, fields, start, width):
+    """Columnar JSON-ready series from the rows of ``vital_series_queryset``"""
+    start_epoch = int(start.timestamp())
+    series = {
+        't': [start_epoch + row['bucket'] * width for row in rows],
+        'n': [row['n'] for row in rows],
+    }
+    for field in fields:
+        series[field] = {
+            stat: [_number(row[f'{field}_{stat}']) for row in rows]
+            for stat in ('min', 'max', 'avg')
+        }
+    return series
+
+
+def parse_fields(value):
+    """Requested field names (comma-separated, default all); ValueError for unknown ones"""
+    if not value:
+        return list(VITAL_FIELDS)
+    fields = [field.strip() for field in value.split(',') if field.strip()]
+    unknown = [field for field in fields if field not in VITAL_FIELDS]
+    if unknown or not fields:
+        raise ValueError(f"Unknown vital sign fields: {', '.join(unknown) or value}")
+    return fields
@@ -71,6 +71,12 @@ urlpatterns = [
     path('api/patient/<int:patient_id>/vitals/', 
          views.get_patient_vitals, 
          name='api_patient_vitals'),
+    path('api/patient/<int:patient_id>/vitals/series/', 
+         views.get_patient_vital_series, 
+         name='api_patient_vital_series'),
+    path('api/vitals/ingest/', 
+         views.ingest_vital_signs, 
+         name='api_ingest_vital_signs'),
     path('api/equipment/status/', 
          views.get_equipment_status, 
          name='api_equipment_status'),
@@ -10,6 +10,7 @@ from django.contrib.auth.mixins import LoginRequiredMixin, UserPassesTestMixin
 from django.core.paginator import Paginator, EmptyPage, PageNotAnInteger
 from django.db.models import Q, Count
 from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
 from datetime import datetime, timedelta
 
 from .models import (
@@ -18,6 +19,9 @@ from .models import (
     MedicalHistoryRecord, PatientAllergy, PatientMedication
 )
 from patients.models import Patient
+from rest_framework.decorators import api_view
+from clinic_project.async_api import authenticated_user, fetch_json
+from . import ingestion, timeseries
 from accounts.models import CustomUser
 
 # Helper function to check if user is staff
@@ -210,24 +214,25 @@ class ReportListView(LoginRequiredMixin, ListView):
         return GeneratedReport.objects.all()
 
 # API Views
-def get_patient_vitals(request, patient_id):
-    if not request.user.is_authenticated:
+async def get_patient_vitals(request, patient_id):
+    user = await authenticated_user(request)
+    if user is None:
         return JsonResponse({'error': 'Authentication required'}, status=401)
     
     try:
-        patient = Patient.objects.get(pk=patient_id)
-        if request.user.user_type == 'patient' and patient.user != request.user:
+        patient = await Patient.objects.aget(pk=patient_id)
+        if user.user_type == 'patient' and patient.user_id != user.id:
             return JsonResponse({'error': 'Not authorized'}, status=403)
             
         vitals = VitalSigns.objects.filter(patient=patient).order_by('-recorded_at')[:10]
-        data = [{
+        data = await fetch_json(vitals, lambda v: {
             'date': v.recorded_at.strftime('%Y-%m-%d %H:%M'),
             'temperature': float(v.temperature) if v.temperature else None,
             'systolic': v.blood_pressure_systolic,
             'diastolic': v.blood_pressure_diastolic,
             'heart_rate': v.heart_rate,
             'oxygen': v.oxygen_saturation,
-        } for v in vitals]
+        })
         
         return JsonResponse({'vitals': data})
     except Patient.DoesNotExist:
@@ -235,12 +240,91 @@ def get_patient_vitals(request, patient_id):
     except Exception as e:
         return JsonResponse({'error': str(e)}, status=500)
 
-def get_equipment_status(request):
-    if not request.user.is_authenticated or request.user.user_type not in ['admin', 'staff']:
+async def get_patient_vital_series(request, patient_id):
+    """Vitals over ?start=&end= (ISO dates or datetimes, default the last 24 hours), downsampled to
+    at most ?points= buckets with min/max/avg per ?fields=, as columnar arrays"""
+    user = await authenticated_user(request)
+    if user is None:
+        return JsonResponse({'error': 'Authentication required'}, status=401)
+    
+    try:
+        patient = await Patient.objects.aget(pk=patient_id)
+    except Patient.DoesNotExist:
+        return JsonResponse({'error': 'Patient not found'}, status=404)
+    if user.user_type == 'patient' and patient.user_id != user.id:
+        return JsonResponse({'error': 'Not authorized'}, status=403)
+    
+    try:
+        end = _parse_moment(request.GET.get('end')) or timezone.now()
+        start = _parse_moment(request.GET.get('start')) or end - timedelta(days=1)
+        points = int(request.GET.get('points', timeseries.DEFAULT_POINTS))
+        fields = timeseries.parse_fields(request.GET.get('fields'))
+    except ValueError as e:
+        return JsonResponse({'error': str(e)}, status=400)
+    if start >= end:
+        return JsonResponse({'error': 'start must be before end'}, status=400)
+    points = max(1, min(points, timeseries.MAX_POINTS))
+    
+    width = timeseries.bucket_seconds(start, end, points)
+    rows = [row async for row in timeseries.vital_series_queryset(patient.pk, start, end, fields, width)]
+    return JsonResponse({
+        'patient_id': patient.pk,
+        'start': start.isoformat(),
+        'end': end.isoformat(),
+        'bucket_seconds': width,
+        'fields': fields,
+        'series': timeseries.columnar(rows, fields, start, width),
+    })
+
+def _parse_moment(value):
+    """An ISO date or datetime query parameter as an aware datetime, or None"""
+    if not value:
+        return None
+    moment = parse_datetime(value)
+    if moment is None:
+        day = parse_date(value)
+        if day is None:
+            raise ValueError(f'Invalid date or datetime: {value}')
+        moment = datetime.combine(day, datetime.min.time())
+    return timezone.make_aware(moment) if timezone.is_naive(moment) else moment
+
+@api_view(['POST'])
+def ingest_vital_signs(request):
+    """Store a batch of monitor readings and raise their alerts.
+    
+    Body: a JSON array of readings (or {"readings": [...]}), or NDJSON with
+    Content-Type application/x-ndjson. Monitors authenticate with
+    "Authorization: Token <key>". Valid readings are stored even if others
+    are rejected; rejections are listed by their index in the batch.
+    """
+    user = request.user
+    if not (user.is_staff or getattr(user, 'user_type', None) in ['admin', 'doctor', 'nurse']):
+        return JsonResponse({'error': 'Permission denied'}, status=403)
+    
+    if request.content_type == 'application/x-ndjson':
+        # Read line by line; request.stream is None for an empty body
+        readings = ingestion.parse_ndjson_readings(request.stream or [])
+    else:
+        try:
+            readings = ingestion.parse_json_readings(request.body)
+        except ValueError as e:
+            return JsonResponse({'error': str(e)}, status=400)
+    
+    result = ingestion.ingest_readings(readings, user=user)
+    return JsonResponse({
+        'accepted': result.accepted,
+        'rejected': result.rejected,
+        'errors': result.errors,
+        'alerts': result.alerts,
+    }, status=200 if result.accepted or not result.rejected else 400)
+
+async def get_equipment_status(request):
+    user = await authenticated_user(request)
+    if user is None or user.user_type not in ['admin', 'staff']:
         return JsonResponse({'error': 'Not authorized'}, status=403)
     
-    equipment = Equipment.objects.all()
-    data = [{
+    today = timezone.now().date()
+    data = await fetch_json(Equipment.objects.all(), lambda e: {
         'id': e.id,
         'name': e.name,
         'type': e.get_equipment_type_display(),
@@ -248,8 +332,8 @@ def get_equipment_status(request):
         'location': e.location or 'N/A',
         'last_maintenance': e.last_maintenance.strftime('%Y-%m-%d') if e.last_maintenance else 'N/A',
         'next_maintenance': e.next_maintenance.strftime('%Y-%m-%d') if e.next_maintenance else 'N/A',
-        'is_overdue': e.next_maintenance and e.next_maintenance < timezone.now().date()
-    } for e in equipment]
+        'is_overdue': e.next_maintenance and e.next_maintenance < today
+    })
     
     return JsonResponse({'equipment': data})
 
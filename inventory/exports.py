@@ -0,0 +1,271 @@
+"""
+Streamed inventory exports and the stock-movement history.
+
+Exports are async generators fed by ``QuerySet.aiterator()``, so under
+daphne the rows go out as the database returns them. A multi-year ledger
+is never held in memory, and the worker is not blocked while it streams.
+They are written as CSV, JSON Lines (one object per line) or, for items,
+the original single-JSON-document format.
+
+Every movement row carries ``balance``, the item's stock just after it.
+This is a window function, ``SUM(quantity) OVER (PARTITION BY item ORDER BY
+created_at, id)``, plus the item's balance before the export's start date,
+which one grouped query provides. ``ADJUST`` rows store their change, so the
+ledger sums to the stock.
+
+The history of one item is paged with a keyset cursor on ``(created_at,
+id)`` rather than ``OFFSET``, newest first. Paged rows get their balance
+without the window. The first page sums the item's movements once to get
+the current balance, and each row's balance comes from subtracting the
+newer rows on the page. The cursor carries the balance where the page
+stopped, so every later page is one index range read of ``limit`` rows,
+however deep it is.
+"""
+import base64
+import csv
+import json
+from datetime import datetime, time, timedelta
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import F, Q, Sum, Window
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+
+from .models import Item, StockMovement
+
+FORMATS = ('csv', 'jsonl', 'json')
+CONTENT_TYPES = {
+    'csv': 'text/csv',
+    'jsonl': 'application/x-ndjson',
+    'json': 'application/json',
+}
+
+ITEM_COLUMNS = [
+    'id', 'name', 'category', 'supplier', 'unit', 'price_per_unit', 'quantity_in_stock',
+    'minimum_quantity', 'location', 'barcode', 'expiry_date', 'total_value', 'needs_restock',
+]
+MOVEMENT_COLUMNS = [
+    'id', 'created_at', 'item_id', 'item', 'category', 'movement_type', 'quantity', 'balance',
+    'lot_number', 'reference', 'notes', 'created_by',
+]
+
+CHUNK_SIZE = 2000
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 500
+# Largest id a (64-bit) primary key column holds
+MAX_ID = 2 ** 63 - 1
+
+
+def running_balance():
+    """Window giving each movement's item stock just after it (from the start of the selection)"""
+    return Window(
+        Sum('quantity'),
+        partition_by=[F('item_id')],
+        order_by=[F('created_at').asc(), F('id').asc()],
+    )
+
+
+def parse_day(value, name):
+    """``YYYY-MM-DD`` query parameter as a date, or None; ValueError names the parameter"""
+    if not value:
+        return None
+    try:
+        day = parse_date(value)
+    except ValueError:
+        day = None
+    if day is None:
+        raise ValueError(f'{name} must be a date (YYYY-MM-DD)')
+    return day
+
+
+def parse_id(value, name):
+    """An optional id from the query string; ValueError for anything a primary key cannot hold"""
+    if not value:
+        return None
+    if not value.isdecimal() or not 0 < int(value) <= MAX_ID:
+        raise ValueError(f'{name} must be an id')
+    return int(value)
+
+
+def _day_start(day):
+    start = datetime.combine(day, time.min)
+    return timezone.make_aware(start) if settings.USE_TZ else start
+
+
+def export_filters(params):
+    """``(start, end, category_id, item_id)`` from the query string; ``end`` is inclusive"""
+    start = parse_day(params.get('start'), 'start')
+    end = parse_day(params.get('end'), 'end')
+    return start, end, parse_id(params.get('category'), 'category'), parse_id(params.get('item'), 'item')
+
+
+def items_queryset(category_id=None):
+    items = Item.objects.filter(is_active=True).order_by('name', 'pk')
+    if category_id:
+        items = items.filter(category_id=category_id)
+    return items.values(
+        'id', 'name', 'category__name', 'supplier__name', 'unit', 'price_per_unit', 'quantity_in_stock',
+        'minimum_quantity', 'location', 'barcode', 'expiry_date',
+    )
+
+
+def item_row(row):
+    return {
+        'id': row['id'],
+        'name': row['name'],
+        'category': row['category__name'] or '',
+        'supplier': row['supplier__name'] or '',
+        'unit': row['unit'],
+        'price_per_unit': float(row['price_per_unit']),
+        'quantity_in_stock': row['quantity_in_stock'],
+        'minimum_quantity': row['minimum_quantity'],
+        'location': row['location'],
+        'barcode': row['barcode'] or '',
+        'expiry_date': row['expiry_date'].isoformat() if row['expiry_date'] else None,
+        'total_value': float(row['quantity_in_stock'] * row['price_per_unit']),
+        'needs_restock': row['quantity_in_stock'] <= row['minimum_quantity'],
+    }
+
+
+def movements_queryset(start=None, end=None, category_id=None, item_id=None):
+    movements = StockMovement.objects.all()
+    if category_id:
+        movements = movements.filter(item__category_id=category_id)
+    if item_id:
+        movements = movements.filter(item_id=item_id)
+    if start:
+        movements = movements.filter(created_at__gte=_day_start(start))
+    if end:
+        movements = movements.filter(created_at__lt=_day_start(end + timedelta(days=1)))
+    return movements
+
+
+MOVEMENT_VALUES = (
+    'id', 'created_at', 'item_id', 'item__name', 'item__category__name', 'movement_type', 'quantity',
+    'batch__lot_number', 'reference', 'notes', 'created_by__email',
+)
+
+
+def _movement_values(movements):
+    return movements.annotate(balance=running_balance()).values(*MOVEMENT_VALUES, 'balance')
+
+
+def movement_row(row, opening=0):
+    return {
+        'id': row['id'],
+        'created_at': row['created_at'],
+        'item_id': row['item_id'],
+        'item': row['item__name'],
+        'category': row['item__category__name'] or '',
+        'movement_type': row['movement_type'],
+        'quantity': row['quantity'],
+        'balance': opening + row['balance'],
+        'lot_number': row['batch__lot_number'] or '',
+        'reference': row['reference'] or '',
+        'notes': row['notes'] or '',
+        'created_by': row['created_by__email'] or '',
+    }
+
+
+async def opening_balances(start, category_id=None, item_id=None):
+    """item id -> stock just before ``start`` (the sum of its earlier movements)"""
+    if start is None:
+        return {}
+    earlier = movements_queryset(category_id=category_id, item_id=item_id).filter(created_at__lt=_day_start(start))
+    return {
+        row['item_id']: row['total']
+        async for row in earlier.values('item_id').annotate(total=Sum('quantity')).order_by()
+    }
+
+
+async def item_rows(category_id=None):
+    async for row in items_queryset(category_id).aiterator(chunk_size=CHUNK_SIZE):
+        yield item_row(row)
+
+
+async def movement_rows(start=None, end=None, category_id=None, item_id=None):
+    """Movements in the date range, item by item and oldest first, each with its running balance"""
+    openings = await opening_balances(start, category_id, item_id)
+    movements = _movement_values(movements_queryset(start, end, category_id, item_id)).order_by(
+        'item_id', 'created_at', 'id'
+    )
+    async for row in movements.aiterator(chunk_size=CHUNK_SIZE):
+        yield movement_row(row, openings.get(row['item_id'], 0))
+
+
+class _Echo:
+    """File-like object whose ``write`` hands the formatted line back to ``csv.writer``"""
+
+    def write(self, value):
+        return value
+
+
+async def stream_csv(columns, rows):
+    writer = csv.writer(_Echo())
+    yield writer.writerow(columns)
+    async for row in rows:
+        yield writer.writerow([row[column] for column in columns])
+
+
+async def stream_jsonl(rows):
+    async for row in rows:
+        yield json.dumps(row, cls=DjangoJSONEncoder) + '\n'
+
+
+async def stream_json_document(header, key, rows):
+    """``{...header, key: [rows]}`` written out row by row"""
+    opening = json.dumps(header, cls=DjangoJSONEncoder)[:-1]
+    yield f'{opening}, "{key}": ['
+    first = True
+    async for row in rows:
+        yield ('' if first else ', ') + json.dumps(row, cls=DjangoJSONEncoder)
+        first = False
+    yield ']}'
+
+
+def encode_cursor(created_at, pk, balance):
+    """Cursor after the row ``(created_at, pk)``; ``balance`` is the stock just before that row"""
+    raw = f'{created_at.isoformat()}|{pk}|{balance}'.encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    """``(created_at, id, balance)`` of a cursor from ``encode_cursor``; ValueError if it was tampered with.
+
+    ``balance`` is None for cursors handed out before it was carried.
+    """
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)).decode()
+        created_at, pk, *balance = raw.split('|')
+        if len(balance) > 1:
+            raise ValueError
+        return datetime.fromisoformat(created_at), int(pk), int(balance[0]) if balance else None
+    except (ValueError, UnicodeDecodeError):
+        raise ValueError('Invalid cursor')
+
+
+def movement_page(item, cursor=None, limit=DEFAULT_PAGE_SIZE):
+    """One page of an item's movements, newest first, and the cursor of the next (older) page or None"""
+    limit = max(1, min(int(limit), MAX_PAGE_SIZE))
+    movements = StockMovement.objects.filter(item=item)
+    balance = None
+    if cursor:
+        created_at, pk, balance = decode_cursor(cursor)
+        movements = movements.filter(Q(created_at__lt=created_at) | Q(created_at=created_at, pk__lt=pk))
+    if balance is None:
+        # First page: the item's balance is the sum of its whole history
+        balance = movements.aggregate(total=Sum('quantity'))['total'] or 0
+    rows = list(movements.values(*MOVEMENT_VALUES).order_by('-created_at', '-id')[:limit + 1])
+
+    page = []
+    for row in rows[:limit]:
+        row['balance'] = balance
+        balance -= row['quantity']
+        page.append(movement_row(row))
+
+    next_cursor = None
+    if len(rows) > limit:
+        last = page[-1]
+        next_cursor = encode_cursor(last['created_at'], last['id'], balance)
+    return page, next_cursor
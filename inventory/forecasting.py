@@ -0,0 +1,113 @@
+"""
+Consumption-based reorder forecasting.
+
+``refresh_forecasts()`` rebuilds ``ReorderForecast`` for every active item
+from its stock-out history. It is meant to run nightly
+(``python manage.py refresh_reorder_forecasts`` from cron), so the reorder
+report only reads the stored rows.
+
+The database does the heavy part: one ``GROUP BY item, day`` query turns the
+movement history into daily usage per item. A single pass over those rows
+then accumulates the sum and the sum of squares of each item's series.
+Days without usage count as zeros, so no per-day rows are materialised in
+Python. For each item:
+
+- daily usage is the mean over the window (or over the item's life, if that
+  is shorter);
+- safety stock is ``z * stddev * sqrt(lead time)``;
+- the reorder point is usage over the supplier's lead time plus safety stock,
+  and never below the item's ``minimum_quantity``;
+- once usable (unexpired) stock is at or below the reorder point, the
+  suggested quantity tops stock up to the reorder point plus
+  ``INVENTORY_FORECAST_COVER_DAYS`` of usage.
+"""
+import math
+from collections import defaultdict
+from datetime import timedelta
+from decimal import Decimal
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Min, Sum
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from .models import Item, ItemBatch, ReorderForecast, StockMovement
+
+DEFAULT_LEAD_TIME_DAYS = 7
+
+
+def usage_totals(since):
+    """item id -> (sum, sum of squares) of its daily stock-out totals since ``since``"""
+    totals = defaultdict(lambda: [0, 0])
+    daily = (
+        StockMovement.objects.filter(movement_type='OUT', created_at__gte=since)
+        .annotate(day=TruncDate('created_at'))
+        .values('item_id', 'day')
+        .annotate(used=Sum('quantity'))
+        .order_by()
+        .values_list('item_id', 'used')
+    )
+    for item_id, used in daily.iterator(chunk_size=5000):
+        totals[item_id][0] += -used
+        totals[item_id][1] += used * used
+    return totals
+
+
+def forecast_item(item, total, total_squares, days, usable, lead_time, today):
+    """Unsaved ``ReorderForecast`` for one item's usage series of ``days`` days"""
+    mean = total / days
+    stddev = math.sqrt(max(0.0, total_squares / days - mean * mean))
+    safety_stock = settings.INVENTORY_FORECAST_SERVICE_LEVEL_Z * stddev * math.sqrt(lead_time)
+    reorder_point = max(item.minimum_quantity, math.ceil(mean * lead_time + safety_stock))
+
+    suggested = 0
+    if usable <= reorder_point:
+        target = reorder_point + mean * settings.INVENTORY_FORECAST_COVER_DAYS
+        suggested = max(0, math.ceil(target - usable))
+
+    days_until_stockout = usable / mean if mean > 0 else None
+    return ReorderForecast(
+        item=item,
+        daily_usage=Decimal(f'{mean:.3f}'),
+        usage_stddev=Decimal(f'{stddev:.3f}'),
+        usable_stock=usable,
+        days_until_stockout=Decimal(f'{days_until_stockout:.1f}') if days_until_stockout is not None else None,
+        stockout_date=today + timedelta(days=int(days_until_stockout)) if days_until_stockout is not None else None,
+        lead_time_days=lead_time,
+        reorder_point=reorder_point,
+        suggested_quantity=suggested,
+        computed_at=timezone.now(),
+    )
+
+
+def refresh_forecasts(window_days=None):
+    """Recompute and replace every item's forecast; returns the number of forecasts written"""
+    window_days = window_days or settings.INVENTORY_FORECAST_WINDOW_DAYS
+    today = timezone.localdate()
+    since = timezone.now() - timedelta(days=window_days)
+
+    totals = usage_totals(since)
+    first_movement = dict(
+        StockMovement.objects.values('item_id').annotate(first=Min('created_at')).order_by()
+        .values_list('item_id', 'first')
+    )
+    expired = ItemBatch.objects.expired_totals(today)
+
+    forecasts = []
+    for item in Item.objects.filter(is_active=True).select_related('supplier').iterator(chunk_size=2000):
+        total, total_squares = totals.get(item.pk, (0, 0))
+        # A series only starts when the item does, so new items are not diluted by empty days
+        started = first_movement.get(item.pk)
+        days = window_days
+        if started is not None:
+            days = max(1, min(window_days, (today - timezone.localdate(started)).days + 1))
+        lead_time = item.supplier.lead_time_days if item.supplier else DEFAULT_LEAD_TIME_DAYS
+        usable = max(0, item.quantity_in_stock - expired.get(item.pk, 0))
+        forecasts.append(forecast_item(item, total, total_squares, days, usable, lead_time, today))
+
+    # Replaced in one transaction so the report never sees a half-built table
+    with transaction.atomic():
+        ReorderForecast.objects.all().delete()
+        ReorderForecast.objects.bulk_create(forecasts, batch_size=1000)
+    return len(forecasts)
@@ -0,0 +1,367 @@
+"""
+Atomic stock ledger.
+
+``StockMovement`` rows are the history of every change to
+``Item.quantity_in_stock``, and the functions here are the only place that
+changes it. A batch of movements is applied in one transaction:
+
+- one conditional ``UPDATE ... SET quantity_in_stock = quantity_in_stock + delta``
+  for all the items it touches, whose ``WHERE`` clause refuses any item
+  that would go below zero;
+- receipts with a ``lot_number`` added to that ``ItemBatch``, and stock-outs
+  drawn from the item's lots first-expiry-first-out (``_assign_batches``),
+  the lots locked for the length of the transaction;
+- one ``bulk_create`` of the movement rows, one per lot a stock-out drew from.
+
+Two terminals taking stock out at the same moment can therefore neither
+lose an update nor oversell. If any item is short the whole batch is
+rolled back and ``InsufficientStock`` says which items and by how much.
+
+``reconcile()`` recomputes stock from the movement history and reports (or
+fixes) items whose recorded quantity has drifted from it.
+
+``UPDATE`` does not send ``post_save``, so both invalidate the cached
+inventory statistics themselves once they commit.
+"""
+from collections import defaultdict
+
+from django.db import transaction
+from django.db.models import Case, Count, F, IntegerField, OuterRef, Q, Subquery, Sum, Value, When
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from clinic_project.query_cache import INVENTORY, bump
+
+from .models import Item, ItemBatch, StockMovement
+
+# Sign applied to the (positive) quantity of each movement type; ADJUST
+# quantities are the counted stock level rather than a change
+SIGNS = {
+    'IN': 1,
+    'OUT': -1,
+    'RETURN': -1,
+}
+ADJUST = 'ADJUST'
+
+
+class InsufficientStock(ValueError):
+    """A movement would take stock below zero; ``shortages`` maps item id -> (requested, available)"""
+
+    def __init__(self, shortages):
+        self.shortages = shortages
+        details = ', '.join(
+            f'item {item_id}: {requested} requested, {available} available'
+            for item_id, (requested, available) in shortages.items()
+        )
+        super().__init__(f'Insufficient stock ({details})')
+
+
+def _item_id(item):
+    return item.pk if isinstance(item, Item) else int(item)
+
+
+def record_movement(item, movement_type, quantity, reference='', notes='', user=None,
+                    lot_number='', expiry_date=None):
+    """Apply a single movement and return its ``StockMovement`` rows.
+
+    ``quantity`` is a positive count for IN/OUT/RETURN and the counted stock
+    level for ADJUST. A stock-out that spans several lots gives one row per lot.
+    """
+    return apply_movements([{
+        'item': item,
+        'movement_type': movement_type,
+        'quantity': quantity,
+        'reference': reference,
+        'notes': notes,
+        'lot_number': lot_number,
+        'expiry_date': expiry_date,
+    }], user=user)
+
+
+def apply_movements(movements, user=None):
+    """Apply many movements in one transaction; returns the created ``StockMovement`` rows.
+
+    Each movement is a dict with ``item`` (an ``Item`` or its id),
+    ``movement_type``, ``quantity`` and optionally ``reference`` and
+    ``notes``. Receipts may name a ``lot_number`` (and its ``expiry_date``).
+    Movements of the same item are netted, and the batch is refused as a
+    whole if any item's net change exceeds its stock.
+    """
+    movements = list(movements)
+    for movement in movements:
+        movement_type = movement['movement_type']
+        if movement_type != ADJUST and movement_type not in SIGNS:
+            raise ValueError(f'Unknown movement type: {movement_type}')
+        quantity = int(movement['quantity'])
+        if quantity < 0 or (quantity == 0 and movement_type != ADJUST):
+            raise ValueError('Movement quantities must be positive')
+    if not movements:
+        return []
+
+    with transaction.atomic():
+        # Adjustments set an absolute level, so their items are locked and read first
+        adjusted_ids = {_item_id(m['item']) for m in movements if m['movement_type'] == ADJUST}
+        running = {}
+        if adjusted_ids:
+            running = dict(
+                Item.objects.select_for_update().filter(pk__in=adjusted_ids).values_list('pk', 'quantity_in_stock')
+            )
+
+        deltas = defaultdict(int)
+        pending = []
+        for movement in movements:
+            item_id = _item_id(movement['item'])
+            if movement['movement_type'] == ADJUST:
+                if item_id not in running:
+                    raise Item.DoesNotExist(f'Item {item_id} not found')
+                delta = int(movement['quantity']) - running[item_id]
+            else:
+                delta = SIGNS[movement['movement_type']] * int(movement['quantity'])
+            if item_id in running:
+                running[item_id] += delta
+            deltas[item_id] += delta
+            pending.append((StockMovement(
+                item_id=item_id,
+                movement_type=movement['movement_type'],
+                quantity=delta,
+                reference=movement.get('reference', ''),
+                notes=movement.get('notes', ''),
+                created_by=user,
+            ), movement))
+
+        _apply_deltas(deltas)
+        rows = _assign_batches(pending)
+        created = StockMovement.objects.bulk_create(rows)
+        _publish_low_stock(deltas)
+        transaction.on_commit(lambda: bump(INVENTORY))
+    return created
+
+
+def _apply_deltas(deltas):
+    """One conditional UPDATE for every item; raises if an item is missing or would go negative"""
+    changed = {item_id: delta for item_id, delta in deltas.items() if delta}
+    if not changed:
+        missing = set(deltas) - set(Item.objects.filter(pk__in=deltas).values_list('pk', flat=True))
+        if missing:
+            raise Item.DoesNotExist(f'Items not found: {sorted(missing)}')
+        return
+
+    allowed = Q(pk__in=[item_id for item_id, delta in changed.items() if delta > 0])
+    for item_id, delta in changed.items():
+        if delta < 0:
+            allowed |= Q(pk=item_id, quantity_in_stock__gte=-delta)
+
+    updated = Item.objects.filter(allowed).update(
+        quantity_in_stock=F('quantity_in_stock') + Case(
+            *[When(pk=item_id, then=Value(delta)) for item_id, delta in changed.items()],
+            default=Value(0),
+            output_field=IntegerField(),
+        ),
+        updated_at=timezone.now(),
+    )
+    if updated == len(changed):
+        return
+
+    available = dict(Item.objects.filter(pk__in=changed).values_list('pk', 'quantity_in_stock'))
+    missing = set(changed) - set(available)
+    if missing:
+        raise Item.DoesNotExist(f'Items not found: {sorted(missing)}')
+    raise InsufficientStock({
+        item_id: (-delta, available[item_id])
+        for item_id, delta in changed.items()
+        if delta < 0 and available[item_id] < -delta
+    })
+
+
+def _assign_batches(pending):
+    """Attach movements to lots, splitting stock-outs across lots earliest expiry first.
+
+    Receipts are added to their lot before any stock-out is allocated. An OUT
+    never draws from an expired lot (RETURN and ADJUST write-offs may), and
+    whatever the lots cannot cover comes from the item's stock without a lot;
+    if that is not enough the transaction is refused.
+    """
+    received = defaultdict(int)
+    for row, movement in pending:
+        lot_number = (movement.get('lot_number') or '').strip()
+        if row.quantity > 0 and lot_number:
+            batch, _ = ItemBatch.objects.get_or_create(
+                item_id=row.item_id,
+                lot_number=lot_number,
+                defaults={'expiry_date': movement.get('expiry_date') or None},
+            )
+            row.batch = batch
+            received[batch.pk] += row.quantity
+    if received:
+        _update_batches(received)
+
+    outflows = [row for row, movement in pending if row.quantity < 0]
+    if not outflows:
+        return [row for row, movement in pending]
+
+    lots = defaultdict(list)
+    for batch in ItemBatch.objects.select_for_update().filter(
+        item_id__in={row.item_id for row in outflows}, quantity__gt=0
+    ).order_by('item_id', F('expiry_date').asc(nulls_last=True), 'pk'):
+        lots[batch.item_id].append(batch)
+
+    taken = defaultdict(int)
+    rows = []
+    for row, movement in pending:
+        if row.quantity >= 0:
+            rows.append(row)
+            continue
+        wanted = -row.quantity
+        for batch in lots[row.item_id]:
+            if not wanted:
+                break
+            if row.movement_type == 'OUT' and batch.is_expired:
+                continue
+            take = min(wanted, batch.quantity - taken[batch.pk])
+            if take <= 0:
+                continue
+            taken[batch.pk] += take
+            wanted -= take
+            rows.append(StockMovement(
+                item_id=row.item_id,
+                batch=batch,
+                movement_type=row.movement_type,
+                quantity=-take,
+                reference=row.reference,
+                notes=row.notes,
+                created_by=row.created_by,
+            ))
+        if wanted:
+            row.quantity = -wanted
+            rows.append(row)
+
+    _update_batches({batch_id: -quantity for batch_id, quantity in taken.items()})
+
+    # Stock without a lot is whatever the item holds beyond its lots; a negative
+    # remainder means the stock-outs needed unexpired stock the item does not have
+    short = list(Item.objects.filter(pk__in={row.item_id for row in outflows}).annotate(
+        batched=Coalesce(Sum('batches__quantity'), 0)
+    ).filter(quantity_in_stock__lt=F('batched')).values_list('pk', 'quantity_in_stock', 'batched'))
+    if short:
+        requested = defaultdict(int)
+        for row in outflows:
+            requested[row.item_id] += -row.quantity
+        raise InsufficientStock({
+            item_id: (requested[item_id], requested[item_id] - (batched - quantity))
+            for item_id, quantity, batched in short
+        })
+    return rows
+
+
+def _update_batches(deltas):
+    """One UPDATE for all lot quantities; lots are locked by the caller, the guard is a backstop"""
+    deltas = {batch_id: delta for batch_id, delta in deltas.items() if delta}
+    if not deltas:
+        return
+    allowed = Q(pk__in=[batch_id for batch_id, delta in deltas.items() if delta > 0])
+    for batch_id, delta in deltas.items():
+        if delta < 0:
+            allowed |= Q(pk=batch_id, quantity__gte=-delta)
+    updated = ItemBatch.objects.filter(allowed).update(
+        quantity=F('quantity') + Case(
+            *[When(pk=batch_id, then=Value(delta)) for batch_id, delta in deltas.items()],
+            default=Value(0),
+            output_field=IntegerField(),
+        ),
+    )
+    if updated != len(deltas):
+        # The lots the guard refused were not updated, so they still hold what was available
+        shortages = {}
+        lots = ItemBatch.objects.filter(pk__in=deltas).values_list('pk', 'item_id', 'quantity')
+        for batch_id, item_id, quantity in lots:
+            if deltas[batch_id] < 0 and quantity < -deltas[batch_id]:
+                requested, available = shortages.get(item_id, (0, 0))
+                shortages[item_id] = (requested - deltas[batch_id], available + quantity)
+        raise InsufficientStock(shortages)
+
+
+def _publish_low_stock(deltas):
+    """Live low-stock alerts for items this batch took to (or below) their minimum"""
+    from clinic_project import live
+
+    took_out = [item_id for item_id, delta in deltas.items() if delta < 0]
+    if not took_out:
+        return
+    for item in Item.objects.filter(
+        pk__in=took_out, is_active=True, quantity_in_stock__lte=F('minimum_quantity')
+    ):
+        if item.quantity_in_stock - deltas[item.pk] > item.minimum_quantity:
+            live.inventory_low_stock(item)
+
+
+def ledger_quantities():
+    """``Item`` queryset annotated with ``ledger_quantity`` (sum of movements) and ``movement_count``"""
+    history = StockMovement.objects.filter(item=OuterRef('pk')).values('item')
+    return Item.objects.annotate(
+        ledger_quantity=Coalesce(Subquery(history.annotate(total=Sum('quantity')).values('total')), 0),
+        movement_count=Coalesce(Subquery(history.annotate(count=Count('id')).values('count')), 0),
+    )
+
+
+def reconcile(fix=False, baseline=False, user=None):
+    """Items whose stock differs from their movement history.
+
+    Returns one dict per mismatched item. With ``fix=True``:
+
+    - items with history are set to the history's total (unless it is negative,
+      which needs a human);
+    - items with stock but no history at all (created before the ledger) get an
+      opening-balance ADJUST movement so future runs agree.
+
+    ``baseline=True`` trusts the recorded stock instead and records a balancing
+    ADJUST movement for every mismatched item; run it once after a stock count,
+    or when history from before the ledger is incomplete.
+    """
+    mismatched = list(
+        ledger_quantities()
+        .exclude(quantity_in_stock=F('ledger_quantity'))
+        .values('pk', 'name', 'quantity_in_stock', 'ledger_quantity', 'movement_count')
+        .order_by('pk')
+    )
+    report = [
+        {
+            'item_id': row['pk'],
+            'name': row['name'],
+            'recorded': row['quantity_in_stock'],
+            'ledger': row['ledger_quantity'],
+            'has_history': row['movement_count'] > 0,
+            'fixed': False,
+        }
+        for row in mismatched
+    ]
+    if not (fix or baseline) or not report:
+        return report
+
+    with transaction.atomic():
+        if baseline:
+            recompute, opening = [], report
+        else:
+            recompute = [row for row in report if row['has_history'] and row['ledger'] >= 0]
+            opening = [row for row in report if not row['has_history']]
+        if recompute:
+            # Recomputed in the UPDATE itself, so a movement committed meanwhile is not lost
+            history = StockMovement.objects.filter(item=OuterRef('pk')).values('item')
+            Item.objects.filter(pk__in=[row['item_id'] for row in recompute]).update(
+                quantity_in_stock=Coalesce(Subquery(history.annotate(total=Sum('quantity')).values('total')), 0),
+                updated_at=timezone.now(),
+            )
+        StockMovement.objects.bulk_create([
+            StockMovement(
+                item_id=row['item_id'],
+                movement_type=ADJUST,
+                quantity=row['recorded'] - row['ledger'],
+                reference='Opening balance',
+                notes='Recorded by stock reconciliation to bring the movement history in line with stock',
+                created_by=user,
+            )
+            for row in opening
+        ])
+        for row in recompute + opening:
+            row['fixed'] = True
+        transaction.on_commit(lambda: bump(INVENTORY))
+    return report
@@ -1,5 +1,5 @@
 from django.core.management.base import BaseCommand
-from inventory.models import Category, Supplier, Item, StockMovement
+from inventory.models import Category, Supplier, Item, ItemBatch, StockMovement
 from decimal import Decimal
 from datetime import date, timedelta
 import random
@@ -345,12 +345,22 @@ class Command(BaseCommand):
             )
             created_items.append(item)
             
-            # Create some stock movements for history
-            if random.choice([True, False]):
+            # Record the opening stock as its purchase, so the movement history adds up,
+            # received as one lot when the item expires
+            if item.quantity_in_stock > 0:
+                batch = None
+                if item.expiry_date:
+                    batch = ItemBatch.objects.create(
+                        item=item,
+                        lot_number='INITIAL',
+                        expiry_date=item.expiry_date,
+                        quantity=item.quantity_in_stock
+                    )
                 StockMovement.objects.create(
                     item=item,
+                    batch=batch,
                     movement_type='IN',
-                    quantity=random.randint(50, 500),
+                    quantity=item.quantity_in_stock,
                     reference=f'PO-{random.randint(1000, 9999)}',
                     notes='Initial stock purchase'
                 )
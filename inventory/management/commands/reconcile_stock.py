@@ -0,0 +1,42 @@
+from django.core.management.base import BaseCommand
+from inventory.ledger import reconcile
+
+
+class Command(BaseCommand):
+    help = 'Compare item stock with the sum of its stock movements (run periodically, e.g. nightly from cron)'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--fix',
+            action='store_true',
+            help='Set drifted items to their movement total and record opening balances for items without history'
+        )
+        parser.add_argument(
+            '--baseline',
+            action='store_true',
+            help='Trust the recorded stock (e.g. right after a physical count) and record balancing movements'
+        )
+
+    def handle(self, *args, **options):
+        report = reconcile(fix=options['fix'], baseline=options['baseline'])
+        if not report:
+            self.stdout.write(self.style.SUCCESS('Stock matches the movement history for every item'))
+            return
+
+        for row in report:
+            if not row['has_history']:
+                detail = 'no movement history'
+            else:
+                detail = f"ledger {row['ledger']}"
+            line = f"#{row['item_id']} {row['name']}: recorded {row['recorded']}, {detail}"
+            if row['fixed']:
+                self.stdout.write(self.style.SUCCESS(f'{line} (fixed)'))
+            elif options['fix'] or options['baseline']:
+                self.stdout.write(self.style.ERROR(f'{line} (negative ledger total, needs a manual count)'))
+            else:
+                self.stdout.write(self.style.WARNING(line))
+
+        fixed = sum(row['fixed'] for row in report)
+        self.stdout.write(f'{len(report)} mismatched items, {fixed} fixed')
+        if not (options['fix'] or options['baseline']):
+            self.stdout.write('Run with --fix to recompute stock from the history, or --baseline to keep the recorded stock')
@@ -0,0 +1,23 @@
+from django.core.management.base import BaseCommand
+from inventory.forecasting import refresh_forecasts
+from inventory.models import ReorderForecast
+import time
+
+
+class Command(BaseCommand):
+    help = 'Rebuild reorder forecasts from stock movement history (run nightly, e.g. from cron)'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--window',
+            type=int,
+            help='Days of history to forecast from (default: INVENTORY_FORECAST_WINDOW_DAYS)'
+        )
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        written = refresh_forecasts(options['window'])
+        to_order = ReorderForecast.objects.filter(suggested_quantity__gt=0).count()
+        self.stdout.write(self.style.SUCCESS(
+            f'Forecast {written} items in {time.perf_counter() - started:.1f}s, {to_order} to reorder'
+        ))
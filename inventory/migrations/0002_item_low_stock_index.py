@@ -0,0 +1,17 @@
+# Generated by Django 5.0.14 on 2026-10-19 08:01
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='item',
+            index=models.Index(condition=models.Q(('is_active', True), ('quantity_in_stock__lte', models.F('minimum_quantity'))), fields=['quantity_in_stock'], name='inventory_item_low_stock_idx'),
+        ),
+    ]
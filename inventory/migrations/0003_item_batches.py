@@ -0,0 +1,56 @@
+# Generated by Django 5.0.14 on 2026-10-19 08:17
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def create_opening_lots(apps, schema_editor):
+    """Move the stock of items that carry an expiry date into one opening lot each"""
+    Item = apps.get_model('inventory', 'Item')
+    ItemBatch = apps.get_model('inventory', 'ItemBatch')
+
+    ItemBatch.objects.bulk_create([
+        ItemBatch(item_id=item_id, lot_number='OPENING', expiry_date=expiry_date, quantity=quantity)
+        for item_id, expiry_date, quantity in Item.objects.filter(
+            quantity_in_stock__gt=0, expiry_date__isnull=False
+        ).values_list('id', 'expiry_date', 'quantity_in_stock').iterator()
+    ], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0002_item_low_stock_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ItemBatch',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('lot_number', models.CharField(max_length=100)),
+                ('expiry_date', models.DateField(blank=True, null=True)),
+                ('quantity', models.PositiveIntegerField(default=0)),
+                ('received_at', models.DateTimeField(auto_now_add=True)),
+                ('item', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='batches', to='inventory.item')),
+            ],
+        ),
+        migrations.AddField(
+            model_name='stockmovement',
+            name='batch',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='movements', to='inventory.itembatch'),
+        ),
+        migrations.AddIndex(
+            model_name='itembatch',
+            index=models.Index(fields=['item', 'expiry_date'], name='inventory_batch_item_exp_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='itembatch',
+            index=models.Index(condition=models.Q(('quantity__gt', 0)), fields=['expiry_date'], name='inventory_batch_stock_exp_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='itembatch',
+            constraint=models.UniqueConstraint(fields=('item', 'lot_number'), name='inventory_batch_item_lot_uniq'),
+        ),
+        migrations.RunPython(create_opening_lots, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,38 @@
+# Generated by Django 5.0.14 on 2026-10-19 08:21
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0003_item_batches'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='supplier',
+            name='lead_time_days',
+            field=models.PositiveIntegerField(default=7, help_text='Days from placing an order to receiving it'),
+        ),
+        migrations.CreateModel(
+            name='ReorderForecast',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('daily_usage', models.DecimalField(decimal_places=3, max_digits=12)),
+                ('usage_stddev', models.DecimalField(decimal_places=3, max_digits=12)),
+                ('usable_stock', models.PositiveIntegerField(help_text='Stock at computation time, excluding expired lots')),
+                ('days_until_stockout', models.DecimalField(blank=True, decimal_places=1, help_text='Empty when the item has not been used', max_digits=10, null=True)),
+                ('stockout_date', models.DateField(blank=True, null=True)),
+                ('lead_time_days', models.PositiveIntegerField()),
+                ('reorder_point', models.PositiveIntegerField()),
+                ('suggested_quantity', models.PositiveIntegerField(default=0)),
+                ('computed_at', models.DateTimeField()),
+                ('item', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='forecast', to='inventory.item')),
+            ],
+            options={
+                'indexes': [models.Index(condition=models.Q(('suggested_quantity__gt', 0)), fields=['days_until_stockout'], name='inventory_forecast_reorder_idx')],
+            },
+        ),
+    ]
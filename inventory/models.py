@@ -21,6 +21,7 @@ class Supplier(models.Model):
     email = models.EmailField(unique=True)
     phone = models.CharField(max_length=20)
     address = models.TextField()
+    lead_time_days = models.PositiveIntegerField(default=7, help_text='Days from placing an order to receiving it')
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
@@ -43,6 +44,17 @@ class Item(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    class Meta:
+        indexes = [
+            # Low-stock reports and dashboard counts only ever look at the few active
+            # items at or below their minimum, so index exactly those rows
+            models.Index(
+                fields=['quantity_in_stock'],
+                condition=models.Q(is_active=True, quantity_in_stock__lte=models.F('minimum_quantity')),
+                name='inventory_item_low_stock_idx'
+            ),
+        ]
+
     def __str__(self):
         return f"{self.name} ({self.quantity_in_stock} {self.unit} in stock)"
 
@@ -50,6 +62,56 @@ class Item(models.Model):
     def needs_restock(self):
         return self.quantity_in_stock <= self.minimum_quantity
 
+class ItemBatchQuerySet(models.QuerySet):
+    def in_stock(self):
+        return self.filter(quantity__gt=0)
+
+    def expired(self, today=None):
+        return self.in_stock().filter(expiry_date__lt=today or timezone.localdate())
+
+    def expired_totals(self, today=None):
+        """item id -> quantity still on the shelf in expired lots"""
+        return dict(
+            self.expired(today).values('item_id').annotate(expired=models.Sum('quantity')).order_by()
+            .values_list('item_id', 'expired')
+        )
+
+class ItemBatch(models.Model):
+    """A received lot of an item. Stock-outs draw from the lot that expires first (FEFO).
+
+    ``Item.quantity_in_stock`` is the total over the item's lots plus any stock
+    recorded without a lot.
+    """
+    item = models.ForeignKey(Item, on_delete=models.CASCADE, related_name='batches')
+    lot_number = models.CharField(max_length=100)
+    expiry_date = models.DateField(blank=True, null=True)
+    quantity = models.PositiveIntegerField(default=0)
+    received_at = models.DateTimeField(auto_now_add=True)
+
+    objects = ItemBatchQuerySet.as_manager()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['item', 'lot_number'], name='inventory_batch_item_lot_uniq'),
+        ]
+        indexes = [
+            # FEFO allocation walks one item's lots in expiry order
+            models.Index(fields=['item', 'expiry_date'], name='inventory_batch_item_exp_idx'),
+            # Expiry and low-stock reports are date ranges over lots still holding stock
+            models.Index(
+                fields=['expiry_date'],
+                condition=models.Q(quantity__gt=0),
+                name='inventory_batch_stock_exp_idx'
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.item.name} lot {self.lot_number} ({self.quantity})"
+
+    @property
+    def is_expired(self):
+        return self.expiry_date is not None and self.expiry_date < timezone.localdate()
+
 class StockMovement(models.Model):
     MOVEMENT_TYPES = [
         ('IN', 'Stock In'),
@@ -59,6 +121,7 @@ class StockMovement(models.Model):
     ]
 
     item = models.ForeignKey(Item, on_delete=models.CASCADE, related_name='movements')
+    batch = models.ForeignKey(ItemBatch, on_delete=models.SET_NULL, null=True, blank=True, related_name='movements')
     movement_type = models.CharField(max_length=10, choices=MOVEMENT_TYPES)
     quantity = models.IntegerField(help_text='Positive for stock in, negative for stock out')
     reference = models.CharField(max_length=100, blank=True, null=True, help_text='Reference number or description')
@@ -66,12 +129,40 @@ class StockMovement(models.Model):
     created_by = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.SET_NULL, null=True)
     created_at = models.DateTimeField(auto_now_add=True)
 
-    def save(self, *args, **kwargs):
-        # Update item quantity when saving stock movement
-        if not self.pk:  # Only on creation
-            self.item.quantity_in_stock += self.quantity
-            self.item.save()
-        super().save(*args, **kwargs)
-
     def __str__(self):
         return f"{self.get_movement_type_display()}: {self.quantity} of {self.item.name}"
+
+    class Meta:
+        indexes = [
+            # Per-item history, its keyset pagination and the running-balance window
+            models.Index(fields=['item', 'created_at', 'id'], name='inventory_move_item_time_idx'),
+            # Date-range exports across all items
+            models.Index(fields=['created_at', 'id'], name='inventory_move_time_idx'),
+        ]
+
+class ReorderForecast(models.Model):
+    """Consumption forecast for an item, rebuilt nightly by ``refresh_reorder_forecasts``"""
+    item = models.OneToOneField(Item, on_delete=models.CASCADE, related_name='forecast')
+    daily_usage = models.DecimalField(max_digits=12, decimal_places=3)
+    usage_stddev = models.DecimalField(max_digits=12, decimal_places=3)
+    usable_stock = models.PositiveIntegerField(help_text='Stock at computation time, excluding expired lots')
+    days_until_stockout = models.DecimalField(max_digits=10, decimal_places=1, blank=True, null=True,
+                                              help_text='Empty when the item has not been used')
+    stockout_date = models.DateField(blank=True, null=True)
+    lead_time_days = models.PositiveIntegerField()
+    reorder_point = models.PositiveIntegerField()
+    suggested_quantity = models.PositiveIntegerField(default=0)
+    computed_at = models.DateTimeField()
+
+    class Meta:
+        indexes = [
+            # The reorder report only lists items with something to order, soonest stock-out first
+            models.Index(
+                fields=['days_until_stockout'],
+                condition=models.Q(suggested_quantity__gt=0),
+                name='inventory_forecast_reorder_idx'
+            ),
+        ]
+
+    def __str__(self):
+        return f"Forecast for {self.item.name}: {self.daily_usage}/day"
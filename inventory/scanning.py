@@ -0,0 +1,335 @@
+"""
+Barcode / RFID scanning.
+
+``resolve_codes()`` maps scanned codes to inventory items (``Item.barcode``)
+or equipment (``Equipment.barcode`` or ``rfid_tag``). Each lookup is an
+exact match on a unique index. Codes not yet known are resolved together
+in one ``IN (...)`` query per table.
+
+Resolutions are kept in a per-process LRU, so a scanner streaming the same
+shelf of codes does not touch the database to identify them. The LRU only
+holds ``code -> (kind, id)``; stock and status are always read fresh. It is
+dropped whenever the ``barcodes`` query-cache generation moves, which item
+and equipment saves bump (see the signals). The generation is only shared
+between processes that share the cache backend. ``apply_scans()`` therefore
+does not trust the LRU: it rechecks every cached resolution against the
+row's current code by primary key, so a code reassigned in another process
+never moves stock or equipment of its old owner.
+
+``apply_scans()`` applies a whole batch of scans in one transaction. Item
+scans go through the stock ledger and equipment scans check equipment out
+or in. If any scan fails, nothing is applied.
+"""
+import threading
+from collections import OrderedDict, defaultdict
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from clinic_project.query_cache import BARCODES, generations
+
+from . import ledger
+from .models import Item
+
+ITEM = 'item'
+EQUIPMENT = 'equipment'
+
+# Scan action -> ledger movement type for items
+ITEM_ACTIONS = {
+    'in': 'IN',
+    'out': 'OUT',
+    'return': 'RETURN',
+}
+DEFAULT_ACTIONS = {ITEM: 'out', EQUIPMENT: 'checkout'}
+# Largest id a (64-bit) primary key column holds
+MAX_ID = 2 ** 63 - 1
+# Largest quantity the PositiveIntegerField stock columns hold on every backend
+MAX_QUANTITY = 2 ** 31 - 1
+
+
+class ScanError(ValueError):
+    """A scan could not be resolved or applied; ``errors`` lists one dict per failed scan"""
+
+    def __init__(self, errors):
+        self.errors = errors
+        super().__init__('; '.join(f"{error['code']}: {error['error']}" for error in errors))
+
+
+class InvalidScan(ScanError):
+    """Scans that are malformed (unknown code, bad action, quantity or patient), as opposed to refused"""
+
+
+class CodeCache:
+    """Thread-safe LRU of code -> (kind, id), emptied when the barcode generation changes"""
+
+    def __init__(self, max_size):
+        self.max_size = max_size
+        self._entries = OrderedDict()
+        self._generation = None
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def sync(self, generation):
+        with self._lock:
+            if generation != self._generation:
+                self._entries.clear()
+                self._generation = generation
+
+    def get_many(self, codes):
+        found = {}
+        with self._lock:
+            for code in codes:
+                entry = self._entries.get(code)
+                if entry is not None:
+                    self._entries.move_to_end(code)
+                    found[code] = entry
+            self.hits += len(found)
+            self.misses += len(codes) - len(found)
+        return found
+
+    def discard(self, codes):
+        with self._lock:
+            for code in codes:
+                self._entries.pop(code, None)
+
+    def set_many(self, entries):
+        with self._lock:
+            for code, entry in entries.items():
+                self._entries[code] = entry
+                self._entries.move_to_end(code)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def stats(self):
+        with self._lock:
+            return {'size': len(self._entries), 'max_size': self.max_size, 'hits': self.hits, 'misses': self.misses}
+
+
+code_cache = CodeCache(settings.SCAN_CACHE_SIZE)
+
+
+def _stale(resolved):
+    """Codes of ``resolved`` whose item or equipment no longer carries that code"""
+    from emr.models import Equipment
+
+    current = set()
+    item_ids = {pk for kind, pk in resolved.values() if kind == ITEM}
+    if item_ids:
+        current.update(
+            (barcode, (ITEM, pk)) for pk, barcode in Item.objects.filter(pk__in=item_ids).values_list('pk', 'barcode')
+        )
+    equipment_ids = {pk for kind, pk in resolved.values() if kind == EQUIPMENT}
+    if equipment_ids:
+        for pk, barcode, rfid_tag in Equipment.objects.filter(pk__in=equipment_ids).order_by().values_list(
+            'pk', 'barcode', 'rfid_tag'
+        ):
+            current.update(((barcode, (EQUIPMENT, pk)), (rfid_tag, (EQUIPMENT, pk))))
+    return [code for code, entry in resolved.items() if (code, entry) not in current]
+
+
+def resolve_codes(codes, verify=False):
+    """code -> (kind, id) for every code that matches an item or equipment.
+
+    With ``verify``, resolutions taken from the LRU are rechecked against the
+    database (one primary-key query per table) before they are returned.
+    """
+    from emr.models import Equipment
+
+    codes = {code for code in codes if code}
+    code_cache.sync(generations([BARCODES])[0])
+    resolved = code_cache.get_many(codes)
+    if verify and resolved:
+        stale = _stale(resolved)
+        code_cache.discard(stale)
+        for code in stale:
+            del resolved[code]
+
+    missing = codes - set(resolved)
+    if missing:
+        found = {
+            barcode: (ITEM, pk)
+            for pk, barcode in Item.objects.filter(barcode__in=missing).values_list('pk', 'barcode')
+        }
+        missing -= set(found)
+        if missing:
+            # Two unique indexes, one query (SQLite and PostgreSQL OR the index scans together)
+            for pk, barcode, rfid_tag in Equipment.objects.filter(
+                Q(barcode__in=missing) | Q(rfid_tag__in=missing)
+            ).order_by().values_list('pk', 'barcode', 'rfid_tag'):
+                for code in (barcode, rfid_tag):
+                    if code in missing:
+                        found.setdefault(code, (EQUIPMENT, pk))
+        code_cache.set_many(found)
+        resolved.update(found)
+    return resolved
+
+
+def apply_scans(scans, user=None, reference=''):
+    """Apply a batch of scans in one transaction; returns one summary dict per applied action.
+
+    Each scan is a dict with ``code`` and optionally ``action`` (in/out/return
+    for items, checkout/checkin for equipment), ``quantity`` (items, default
+    1) and ``patient_id`` (checkouts). Repeated scans of the same code and
+    action are added up, so scanning a box five times takes out five.
+    """
+    resolved = resolve_codes((str(scan.get('code', '')).strip() for scan in scans), verify=True)
+
+    errors = []
+    item_quantities = defaultdict(int)
+    checkouts = {}
+    checkins = set()
+    order = {}
+    for scan in scans:
+        code = str(scan.get('code', '')).strip()
+        if code not in resolved:
+            errors.append({'code': code, 'error': 'Unknown code'})
+            continue
+        kind, pk = resolved[code]
+        action = scan.get('action') or DEFAULT_ACTIONS[kind]
+        if kind == ITEM:
+            if action not in ITEM_ACTIONS:
+                errors.append({'code': code, 'error': f'Invalid action for an item: {action}'})
+                continue
+            try:
+                quantity = int(scan.get('quantity', 1))
+            except (TypeError, ValueError, OverflowError):
+                quantity = 0
+            if not 0 < quantity <= MAX_QUANTITY - item_quantities[(pk, action)]:
+                errors.append({'code': code, 'error': f'Quantity must be a number from 1 to {MAX_QUANTITY:,}'})
+                continue
+            item_quantities[(pk, action)] += quantity
+        elif action == 'checkout':
+            patient_id = scan.get('patient_id')
+            if patient_id in (None, ''):
+                patient_id = None
+            elif isinstance(patient_id, bool) or not str(patient_id).isdecimal() or not 0 < int(patient_id) <= MAX_ID:
+                errors.append({'code': code, 'error': f'Invalid patient id: {patient_id}'})
+                continue
+            else:
+                patient_id = int(patient_id)
+            checkouts[pk] = patient_id
+        elif action == 'checkin':
+            checkins.add(pk)
+        else:
+            errors.append({'code': code, 'error': f'Invalid action for equipment: {action}'})
+            continue
+        order.setdefault((kind, pk, action))
+
+    patient_ids = {patient_id for patient_id in checkouts.values() if patient_id is not None}
+    if patient_ids:
+        from patients.models import Patient
+
+        unknown = patient_ids - set(Patient.objects.filter(pk__in=patient_ids).values_list('pk', flat=True))
+        errors.extend(
+            {'code': _code_for(resolved, EQUIPMENT, pk), 'error': f'Unknown patient: {patient_id}'}
+            for pk, patient_id in checkouts.items() if patient_id in unknown
+        )
+    if errors:
+        raise InvalidScan(errors)
+
+    with transaction.atomic():
+        try:
+            ledger.apply_movements([
+                {
+                    'item': pk,
+                    'movement_type': ITEM_ACTIONS[action],
+                    'quantity': quantity,
+                    'reference': reference or 'Scan',
+                }
+                for (pk, action), quantity in item_quantities.items()
+            ], user=user)
+        except ledger.InsufficientStock as e:
+            raise ScanError([
+                {'code': _code_for(resolved, ITEM, item_id), 'error': f'Insufficient stock ({available} available)'}
+                for item_id, (requested, available) in e.shortages.items()
+            ])
+        _check_out(checkouts, user, resolved)
+        _check_in(checkins, resolved)
+
+    return _summaries(order, item_quantities, resolved)
+
+
+def _code_for(resolved, kind, pk):
+    return next((code for code, entry in resolved.items() if entry == (kind, pk)), str(pk))
+
+
+def _check_out(checkouts, user, resolved):
+    from emr.models import Equipment, EquipmentCheckout
+
+    if not checkouts:
+        return
+    available = set(
+        Equipment.objects.select_for_update().filter(pk__in=checkouts, status='available', is_active=True)
+        .order_by().values_list('pk', flat=True)
+    )
+    unavailable = set(checkouts) - available
+    if unavailable:
+        raise ScanError([
+            {'code': _code_for(resolved, EQUIPMENT, pk), 'error': 'Equipment is not available'}
+            for pk in sorted(unavailable)
+        ])
+    # Still conditional, in case a database without row locks let another checkout in
+    now = timezone.now()
+    if Equipment.objects.filter(pk__in=available, status='available').update(
+        status='in_use', updated_at=now
+    ) != len(available):
+        raise ScanError([{'code': '', 'error': 'Equipment was checked out concurrently, scan again'}])
+    EquipmentCheckout.objects.bulk_create([
+        EquipmentCheckout(equipment_id=pk, checked_out_by=user, patient_id=patient_id, checkout_time=now)
+        for pk, patient_id in checkouts.items()
+    ])
+
+
+def _check_in(checkins, resolved):
+    from emr.models import Equipment, EquipmentCheckout
+
+    if not checkins:
+        return
+    open_checkouts = EquipmentCheckout.objects.filter(equipment_id__in=checkins, return_time__isnull=True)
+    returned = set(open_checkouts.values_list('equipment_id', flat=True))
+    not_out = checkins - returned
+    if not_out:
+        raise ScanError([
+            {'code': _code_for(resolved, EQUIPMENT, pk), 'error': 'Equipment is not checked out'}
+            for pk in sorted(not_out)
+        ])
+    now = timezone.now()
+    open_checkouts.update(return_time=now)
+    Equipment.objects.filter(pk__in=checkins, status='in_use').update(status='available', updated_at=now)
+
+
+def _summaries(order, item_quantities, resolved):
+    """Fresh stock and status of everything the batch touched, in scan order"""
+    from emr.models import Equipment
+
+    item_ids = {pk for kind, pk, action in order if kind == ITEM}
+    equipment_ids = {pk for kind, pk, action in order if kind == EQUIPMENT}
+    items = {
+        row['pk']: row for row in Item.objects.filter(pk__in=item_ids).values('pk', 'name', 'quantity_in_stock', 'unit')
+    }
+    equipment = {
+        row['pk']: row for row in Equipment.objects.filter(pk__in=equipment_ids).order_by().values('pk', 'name', 'status')
+    }
+
+    codes = {}
+    for code, entry in resolved.items():
+        codes.setdefault(entry, code)
+    summaries = []
+    for kind, pk, action in order:
+        summary = {'code': codes[(kind, pk)], 'kind': kind, 'id': pk, 'action': action}
+        if kind == ITEM:
+            row = items[pk]
+            summary.update(
+                name=row['name'],
+                quantity=item_quantities[(pk, action)],
+                quantity_in_stock=row['quantity_in_stock'],
+                unit=row['unit'],
+            )
+        else:
+            row = equipment[pk]
+            summary.update(name=row['name'], status=row['status'])
+        summaries.append(summary)
+    return summaries
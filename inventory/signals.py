@@ -0,0 +1,30 @@
+from django.db import transaction
+from django.db.models.signals import post_delete, post_init, post_save
+from django.dispatch import receiver
+from clinic_project.query_cache import BARCODES, INVENTORY, bump
+from .models import Item
+
+
+@receiver(post_init, sender=Item)
+def remember_restock_state(sender, instance, **kwargs):
+    quantity = instance.__dict__.get('quantity_in_stock')
+    minimum = instance.__dict__.get('minimum_quantity')
+    instance._loaded_needs_restock = quantity is not None and minimum is not None and quantity <= minimum
+
+
+@receiver(post_save, sender=Item)
+def publish_low_stock(sender, instance, **kwargs):
+    """Push an alert to the live dashboards when an item first drops to its restock level"""
+    from clinic_project import live
+
+    needs_restock = instance.needs_restock
+    if instance.is_active and needs_restock and not instance._loaded_needs_restock:
+        live.inventory_low_stock(instance)
+    instance._loaded_needs_restock = needs_restock
+
+
+@receiver(post_save, sender=Item)
+@receiver(post_delete, sender=Item)
+def bump_inventory_cache(sender, instance, **kwargs):
+    """Invalidate cached inventory statistics and scanned codes once the write is committed (the ledger bumps for stock changes)"""
+    transaction.on_commit(lambda: bump(INVENTORY, BARCODES))
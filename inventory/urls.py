@@ -9,6 +9,11 @@ urlpatterns = [
     path('update-stock/<int:item_id>/', views.update_stock, name='update_stock'),
     path('low-stock/', views.low_stock_report, name='low_stock_report'),
     path('expiry/', views.expiry_report, name='expiry_report'),
+    path('reorder/', views.reorder_report, name='reorder_report'),
     path('movements/<int:item_id>/', views.stock_movements, name='stock_movements'),
     path('export/', views.export_inventory, name='export_inventory'),
+    path('export/movements/', views.export_movements, name='export_movements'),
+    path('api/items/<int:item_id>/movements/', views.movement_history_api, name='movement_history_api'),
+    path('api/scan/', views.scan_lookup, name='scan_lookup'),
+    path('api/scan/batch/', views.scan_batch, name='scan_batch'),
 ]
@@ -1,10 +1,14 @@
 from django.shortcuts import render, get_object_or_404, redirect
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
-from django.db.models import Q, F, Sum, Count
-from django.http import JsonResponse
+from django.db.models import Q, F, Sum, Count, Max
+from django.http import JsonResponse, StreamingHttpResponse
+from django.views.decorators.http import require_GET, require_POST
 from django.core.paginator import Paginator
-from .models import Item, Category, Supplier, StockMovement
+from django.db import transaction
+from clinic_project.async_api import async_login_required
+from . import exports, ledger, scanning
+from .models import Item, ItemBatch, Category, Supplier, StockMovement, ReorderForecast
 from decimal import Decimal
 from datetime import date, timedelta
 import json
@@ -36,50 +40,51 @@ def inventory_dashboard(request):
         items = items.filter(quantity_in_stock__gt=F('minimum_quantity'))
     
     if search_query:
+        # Barcodes are matched exactly so a scanned code hits the unique index
         items = items.filter(
             Q(name__icontains=search_query) |
             Q(description__icontains=search_query) |
-            Q(barcode__icontains=search_query)
+            Q(barcode=search_query)
         )
     
-    # Pagination
-    paginator = Paginator(items, 10)
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
+    # Counters and top-N lists are cached until an item or its stock changes;
+    # on a miss the counters take one conditional aggregate over the catalog
+    from clinic_project.query_cache import INVENTORY, cached_result
     
-    # Statistics
-    total_items = Item.objects.filter(is_active=True).count()
-    low_stock_items = Item.objects.filter(
-        is_active=True,
-        quantity_in_stock__lte=F('minimum_quantity')
-    ).count()
-    out_of_stock_items = Item.objects.filter(
-        is_active=True,
-        quantity_in_stock=0
-    ).count()
-    
-    # Calculate total inventory value
-    total_value = Item.objects.filter(is_active=True).aggregate(
-        total=Sum(F('quantity_in_stock') * F('price_per_unit'))
-    )['total'] or Decimal('0')
-    
-    # Top items by value
-    top_items_by_value = Item.objects.filter(is_active=True).annotate(
-        total_value=F('quantity_in_stock') * F('price_per_unit')
-    ).order_by('-total_value')[:5]
+    def compute_stats():
+        return Item.objects.filter(is_active=True).aggregate(
+            total_items=Count('id'),
+            low_stock_items=Count('id', filter=Q(quantity_in_stock__lte=F('minimum_quantity'))),
+            out_of_stock_items=Count('id', filter=Q(quantity_in_stock=0)),
+            total_value=Sum(F('quantity_in_stock') * F('price_per_unit')),
+        )
     
-    # Top items by quantity
-    top_items_by_quantity = Item.objects.filter(is_active=True).order_by('-quantity_in_stock')[:5]
+    def compute_top_items():
+        active = Item.objects.filter(is_active=True)
+        return {
+            'by_value': list(active.annotate(
+                total_value=F('quantity_in_stock') * F('price_per_unit')
+            ).order_by('-total_value').values('id', 'name', 'quantity_in_stock', 'total_value')[:5]),
+            'by_quantity': list(active.order_by('-quantity_in_stock').values('id', 'name', 'quantity_in_stock')[:5]),
+        }
     
-    # Items expiring soon (within 30 days)
-    expiring_soon = Item.objects.filter(
-        is_active=True,
-        expiry_date__lte=date.today() + timedelta(days=30),
-        expiry_date__gte=date.today()
-    ).order_by('expiry_date')[:5]
+    stats = cached_result('inventory:stats', [INVENTORY], compute_stats)
+    top_items = cached_result('inventory:top_items', [INVENTORY], compute_top_items)
     
-    # Recent stock movements
-    recent_movements = StockMovement.objects.select_related('item', 'created_by').order_by('-created_at')[:10]
+    # Pagination
+    paginator = Paginator(items, 10)
+    if category_filter == 'all' and not search_query:
+        # The cached counters already hold the size of the unsearched lists
+        known_counts = {
+            'all': stats['total_items'],
+            'low_stock': stats['low_stock_items'],
+            'out_of_stock': stats['out_of_stock_items'],
+            'in_stock': stats['total_items'] - stats['low_stock_items'],
+        }
+        if status_filter in known_counts:
+            paginator.count = known_counts[status_filter]
+    page_number = request.GET.get('page')
+    page_obj = paginator.get_page(page_number)
     
     # Categories for filter dropdown
     categories = Category.objects.all()
@@ -87,14 +92,12 @@ def inventory_dashboard(request):
     context = {
         'items': page_obj,
         'categories': categories,
-        'total_items': total_items,
-        'low_stock_items': low_stock_items,
-        'out_of_stock_items': out_of_stock_items,
-        'total_value': total_value,
-        'top_items_by_value': top_items_by_value,
-        'top_items_by_quantity': top_items_by_quantity,
-        'expiring_soon': expiring_soon,
-        'recent_movements': recent_movements,
+        'total_items': stats['total_items'],
+        'low_stock_items': stats['low_stock_items'],
+        'out_of_stock_items': stats['out_of_stock_items'],
+        'total_value': stats['total_value'] or Decimal('0'),
+        'top_items_by_value': top_items['by_value'],
+        'top_items_by_quantity': top_items['by_quantity'],
         'current_category': category_filter,
         'current_status': status_filter,
         'search_query': search_query,
@@ -108,30 +111,37 @@ def add_item(request):
     """Add new inventory item"""
     if request.method == 'POST':
         try:
-            item = Item.objects.create(
-                name=request.POST['name'],
-                description=request.POST.get('description', ''),
-                category_id=request.POST['category'],
-                supplier_id=request.POST.get('supplier'),
-                unit=request.POST['unit'],
-                price_per_unit=Decimal(request.POST['price_per_unit']),
-                quantity_in_stock=int(request.POST['quantity_in_stock']),
-                minimum_quantity=int(request.POST['minimum_quantity']),
-                location=request.POST.get('location', ''),
-                barcode=request.POST.get('barcode', ''),
-                expiry_date=request.POST.get('expiry_date') or None,
-            )
-            
-            # Create initial stock movement
-            if item.quantity_in_stock > 0:
-                StockMovement.objects.create(
-                    item=item,
-                    movement_type='IN',
-                    quantity=item.quantity_in_stock,
-                    reference='Initial Stock',
-                    notes='Item added to inventory',
-                    created_by=request.user
+            initial_stock = int(request.POST['quantity_in_stock'])
+            with transaction.atomic():
+                # Stock starts at zero and the opening quantity goes through the ledger,
+                # so the movement history always adds up to quantity_in_stock
+                item = Item.objects.create(
+                    name=request.POST['name'],
+                    description=request.POST.get('description', ''),
+                    category_id=request.POST['category'],
+                    supplier_id=request.POST.get('supplier'),
+                    unit=request.POST['unit'],
+                    price_per_unit=Decimal(request.POST['price_per_unit']),
+                    quantity_in_stock=0,
+                    minimum_quantity=int(request.POST['minimum_quantity']),
+                    location=request.POST.get('location', ''),
+                    barcode=request.POST.get('barcode', ''),
+                    expiry_date=request.POST.get('expiry_date') or None,
                 )
+                if initial_stock > 0:
+                    # Stock with an expiry date is received as a lot so FEFO and the
+                    # expiry report can see it
+                    lot_number = request.POST.get('lot_number', '').strip()
+                    if not lot_number and item.expiry_date:
+                        lot_number = 'INITIAL'
+                    ledger.record_movement(
+                        item, 'IN', initial_stock,
+                        reference='Initial Stock',
+                        notes='Item added to inventory',
+                        user=request.user,
+                        lot_number=lot_number,
+                        expiry_date=item.expiry_date
+                    )
             
             messages.success(request, f'Item "{item.name}" added successfully!')
             return redirect('inventory:dashboard')
@@ -162,40 +172,25 @@ def update_stock(request, item_id):
         try:
             movement_type = request.POST['movement_type']
             quantity = int(request.POST['quantity'])
-            reference = request.POST.get('reference', '')
-            notes = request.POST.get('notes', '')
-            
-            # Validate stock out doesn't exceed current stock
-            if movement_type == 'OUT' and quantity > item.quantity_in_stock:
-                messages.error(request, 'Cannot remove more stock than available!')
-                return redirect('inventory:dashboard')
-            
-            # Create stock movement
-            if movement_type == 'IN':
-                movement_quantity = quantity
-            elif movement_type == 'OUT':
-                movement_quantity = -quantity
-            else:  # ADJUST
-                movement_quantity = quantity - item.quantity_in_stock
             
-            StockMovement.objects.create(
-                item=item,
-                movement_type=movement_type,
-                quantity=movement_quantity,
-                reference=reference,
-                notes=notes,
-                created_by=request.user
+            # IN/OUT quantities are counts, ADJUST sets the counted stock level.
+            # The ledger refuses a stock-out larger than the stock at the moment it
+            # is applied, not at the moment this page was loaded.
+            # Receipts may name the lot they belong to; stock-outs are drawn from
+            # the item's lots first-expiry-first-out
+            ledger.record_movement(
+                item, movement_type, quantity,
+                reference=request.POST.get('reference', ''),
+                notes=request.POST.get('notes', ''),
+                user=request.user,
+                lot_number=request.POST.get('lot_number', '') if movement_type == 'IN' else '',
+                expiry_date=request.POST.get('expiry_date') or None
             )
             
-            # Update item stock
-            if movement_type == 'ADJUST':
-                item.quantity_in_stock = quantity
-            else:
-                item.quantity_in_stock += movement_quantity
-            item.save()
-            
             messages.success(request, f'Stock updated for "{item.name}"!')
             
+        except ledger.InsufficientStock:
+            messages.error(request, 'Cannot remove more stock than available!')
         except Exception as e:
             messages.error(request, f'Error updating stock: {str(e)}')
     
@@ -204,11 +199,25 @@ def update_stock(request, item_id):
 
 @login_required
 def low_stock_report(request):
-    """Report of items with low stock"""
-    low_stock_items = Item.objects.filter(
-        is_active=True,
-        quantity_in_stock__lte=F('minimum_quantity')
-    ).select_related('category', 'supplier').order_by('quantity_in_stock')
+    """Report of items with low stock, counting only stock that has not expired"""
+    today = date.today()
+    
+    # Expired stock still on the shelf, per item (range scan over lots holding stock)
+    expired_by_item = ItemBatch.objects.expired_totals(today)
+    
+    # Items at or below their minimum (partial index), plus items only pushed
+    # there by their expired lots
+    items = Item.objects.filter(is_active=True).filter(
+        Q(quantity_in_stock__lte=F('minimum_quantity')) | Q(pk__in=list(expired_by_item))
+    ).select_related('category', 'supplier')
+    
+    low_stock_items = []
+    for item in items:
+        item.expired_quantity = expired_by_item.get(item.pk, 0)
+        item.usable_quantity = item.quantity_in_stock - item.expired_quantity
+        if item.usable_quantity <= item.minimum_quantity:
+            low_stock_items.append(item)
+    low_stock_items.sort(key=lambda item: item.usable_quantity)
     
     return render(request, 'inventory/low_stock_report.html', {
         'low_stock_items': low_stock_items
@@ -217,68 +226,215 @@ def low_stock_report(request):
 
 @login_required
 def expiry_report(request):
-    """Report of items expiring soon"""
-    # Items expiring within 30 days
-    expiring_soon = Item.objects.filter(
-        is_active=True,
-        expiry_date__lte=date.today() + timedelta(days=30),
-        expiry_date__gte=date.today()
-    ).select_related('category').order_by('expiry_date')
-    
-    # Expired items
-    expired_items = Item.objects.filter(
-        is_active=True,
-        expiry_date__lt=date.today()
-    ).select_related('category').order_by('expiry_date')
+    """Report of lots expiring soon and lots already expired"""
+    today = date.today()
+    try:
+        days = max(1, min(int(request.GET.get('days', 30)), 365))
+    except ValueError:
+        days = 30
+    
+    # Both are range scans over the expiry index of lots still holding stock
+    lots = ItemBatch.objects.filter(
+        quantity__gt=0, item__is_active=True
+    ).select_related('item', 'item__category').annotate(
+        value=F('quantity') * F('item__price_per_unit')
+    ).order_by('expiry_date', 'item__name')
+    
+    expiring_soon = lots.filter(expiry_date__gte=today, expiry_date__lte=today + timedelta(days=days))
+    expired_items = lots.filter(expiry_date__lt=today)
     
     return render(request, 'inventory/expiry_report.html', {
         'expiring_soon': expiring_soon,
-        'expired_items': expired_items
+        'expired_items': expired_items,
+        'days': days,
+        'today': today,
+    })
+
+
+@login_required
+def reorder_report(request):
+    """Suggested orders per supplier, read from the nightly forecasts"""
+    forecasts = ReorderForecast.objects.filter(suggested_quantity__gt=0, item__is_active=True).select_related(
+        'item', 'item__supplier'
+    ).order_by(F('days_until_stockout').asc(nulls_last=True))
+    
+    # Group by supplier, most urgent supplier first
+    suppliers = {}
+    for forecast in forecasts:
+        forecast.order_value = forecast.suggested_quantity * forecast.item.price_per_unit
+        supplier = forecast.item.supplier
+        group = suppliers.setdefault(supplier.pk if supplier else None, {
+            'supplier': supplier,
+            'forecasts': [],
+            'order_value': Decimal('0'),
+        })
+        group['forecasts'].append(forecast)
+        group['order_value'] += forecast.order_value
+    
+    computed_at = ReorderForecast.objects.aggregate(latest=Max('computed_at'))['latest']
+    
+    return render(request, 'inventory/reorder_report.html', {
+        'supplier_orders': list(suppliers.values()),
+        'computed_at': computed_at,
     })
 
 
 @login_required
 def stock_movements(request, item_id):
-    """View stock movement history for an item"""
+    """View stock movement history for an item, newest first, a page at a time"""
     item = get_object_or_404(Item, id=item_id)
-    movements = item.movements.select_related('created_by').order_by('-created_at')
+    cursor = request.GET.get('cursor')
+    try:
+        movements, next_cursor = exports.movement_page(item, cursor)
+    except ValueError:
+        return redirect('inventory:stock_movements', item_id=item.id)
+    batches = item.batches.filter(quantity__gt=0).order_by(F('expiry_date').asc(nulls_last=True), 'pk')
     
     # Calculate total value
     item.total_value = item.quantity_in_stock * item.price_per_unit
     
     return render(request, 'inventory/stock_movements.html', {
         'item': item,
-        'movements': movements
+        'movements': movements,
+        'batches': batches,
+        'next_cursor': next_cursor,
+        'is_first_page': not cursor,
     })
 
 
 @login_required
-def export_inventory(request):
-    """Export inventory data as JSON"""
-    items = Item.objects.filter(is_active=True).select_related('category', 'supplier')
-    
-    data = []
-    for item in items:
-        data.append({
-            'name': item.name,
-            'category': item.category.name if item.category else '',
-            'supplier': item.supplier.name if item.supplier else '',
-            'unit': item.unit,
-            'price_per_unit': float(item.price_per_unit),
-            'quantity_in_stock': item.quantity_in_stock,
-            'minimum_quantity': item.minimum_quantity,
-            'location': item.location,
-            'barcode': item.barcode or '',
-            'expiry_date': item.expiry_date.isoformat() if item.expiry_date else None,
-            'total_value': float(item.quantity_in_stock * item.price_per_unit),
-            'needs_restock': item.needs_restock
-        })
+@require_GET
+def movement_history_api(request, item_id):
+    """Cursor-paginated movement history of an item (?cursor=&limit=), each row with its running balance"""
+    item = get_object_or_404(Item, id=item_id)
+    try:
+        limit = int(request.GET.get('limit', exports.DEFAULT_PAGE_SIZE))
+        movements, next_cursor = exports.movement_page(item, request.GET.get('cursor'), limit)
+    except ValueError as e:
+        return JsonResponse({'error': str(e)}, status=400)
     
-    response = JsonResponse({
-        'export_date': date.today().isoformat(),
-        'total_items': len(data),
-        'items': data
+    return JsonResponse({
+        'item': {'id': item.id, 'name': item.name, 'quantity_in_stock': item.quantity_in_stock},
+        'results': movements,
+        'next_cursor': next_cursor,
     })
-    response['Content-Disposition'] = f'attachment; filename="inventory_export_{date.today()}.json"'
-    
+
+
+def _export_response(fmt, content, filename):
+    response = StreamingHttpResponse(content, content_type=exports.CONTENT_TYPES[fmt])
+    response['Content-Disposition'] = f'attachment; filename="{filename}.{fmt}"'
     return response
+
+
+@async_login_required
+@require_GET
+async def export_inventory(request):
+    """Stream active items as JSON (default), CSV or JSON Lines (?format=), optionally for one ?category="""
+    fmt = request.GET.get('format', 'json')
+    if fmt not in exports.FORMATS:
+        return JsonResponse({'error': f"format must be one of {', '.join(exports.FORMATS)}"}, status=400)
+    try:
+        start, end, category_id, item_id = exports.export_filters(request.GET)
+    except ValueError as e:
+        return JsonResponse({'error': str(e)}, status=400)
+    
+    rows = exports.item_rows(category_id)
+    if fmt == 'csv':
+        content = exports.stream_csv(exports.ITEM_COLUMNS, rows)
+    elif fmt == 'jsonl':
+        content = exports.stream_jsonl(rows)
+    else:
+        total = await exports.items_queryset(category_id).acount()
+        content = exports.stream_json_document(
+            {'export_date': date.today().isoformat(), 'total_items': total}, 'items', rows
+        )
+    return _export_response(fmt, content, f'inventory_export_{date.today()}')
+
+
+@async_login_required
+@require_GET
+async def export_movements(request):
+    """Stream stock movements with running balances (?format=csv|jsonl|json, ?start= ?end= ?category= ?item=)"""
+    fmt = request.GET.get('format', 'csv')
+    if fmt not in exports.FORMATS:
+        return JsonResponse({'error': f"format must be one of {', '.join(exports.FORMATS)}"}, status=400)
+    try:
+        start, end, category_id, item_id = exports.export_filters(request.GET)
+    except ValueError as e:
+        return JsonResponse({'error': str(e)}, status=400)
+    
+    rows = exports.movement_rows(start, end, category_id, item_id)
+    if fmt == 'csv':
+        content = exports.stream_csv(exports.MOVEMENT_COLUMNS, rows)
+    elif fmt == 'jsonl':
+        content = exports.stream_jsonl(rows)
+    else:
+        content = exports.stream_json_document({'export_date': date.today().isoformat()}, 'movements', rows)
+    return _export_response(fmt, content, f'stock_movements_{date.today()}')
+
+
+def _can_scan(user):
+    return user.is_staff or getattr(user, 'user_type', '') in ['admin', 'staff', 'nurse']
+
+
+@login_required
+@require_GET
+def scan_lookup(request):
+    """Resolve one scanned barcode or RFID tag (?code=...) to an item or equipment"""
+    from emr.models import Equipment
+    
+    if not _can_scan(request.user):
+        return JsonResponse({'error': 'Permission denied'}, status=403)
+    
+    code = request.GET.get('code', '').strip()
+    # The row is read with its code, so a resolution the LRU kept after the code
+    # moved in another process finds nothing; it is then resolved again, verified
+    for verify in (False, True):
+        resolved = scanning.resolve_codes([code], verify=verify).get(code)
+        if resolved is None:
+            break
+        kind, pk = resolved
+        if kind == scanning.ITEM:
+            row = Item.objects.filter(pk=pk, barcode=code).values(
+                'id', 'name', 'unit', 'quantity_in_stock', 'minimum_quantity', 'location'
+            ).first()
+        else:
+            row = Equipment.objects.filter(Q(barcode=code) | Q(rfid_tag=code), pk=pk).values(
+                'id', 'name', 'equipment_type', 'status', 'location'
+            ).first()
+        if row is not None:
+            return JsonResponse({'code': code, 'kind': kind, **row})
+    return JsonResponse({'error': 'Unknown code', 'code': code}, status=404)
+
+
+@login_required
+@require_POST
+def scan_batch(request):
+    """Apply a batch of scans in one transaction.
+    
+    JSON body: {"reference": "Ward 3", "scans": [{"code": "...", "action": "out", "quantity": 2}, ...]}.
+    Items take in/out/return (default out), equipment checkout/checkin (default
+    checkout, optionally with "patient_id"). Send the CSRF token as X-CSRFToken.
+    """
+    if not _can_scan(request.user):
+        return JsonResponse({'error': 'Permission denied'}, status=403)
+    
+    try:
+        payload = json.loads(request.body)
+        scans = payload['scans']
+        if not isinstance(scans, list) or not all(isinstance(scan, dict) for scan in scans):
+            raise ValueError
+    except (ValueError, KeyError, TypeError):
+        return JsonResponse({'error': 'Expected a JSON object with a "scans" list'}, status=400)
+    if not scans:
+        return JsonResponse({'applied': 0, 'results': []})
+    
+    try:
+        results = scanning.apply_scans(scans, user=request.user, reference=str(payload.get('reference', ''))[:100])
+    except scanning.ScanError as e:
+        # Nothing was applied; the scanner can fix the listed codes and resend the batch
+        status = 400 if isinstance(e, scanning.InvalidScan) else 409
+        return JsonResponse({'error': 'Scan batch rejected', 'errors': e.errors}, status=status)
+    
+    return JsonResponse({'applied': len(scans), 'results': results})
+
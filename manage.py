@@ -15,7 +15,14 @@ def main():
             "available on your PYTHONPATH environment variable? Did you "
             "forget to activate a virtual environment?"
         ) from exc
-    execute_from_command_line(sys.argv)
+    try:
+        execute_from_command_line(sys.argv)
+    finally:
+        # Send the broadcasts the command queued before the daemon thread's next
+        # tick. Not atexit: by then the executors that delivery needs have stopped.
+        broadcast = sys.modules.get('clinic_project.broadcast')
+        if broadcast is not None:
+            broadcast.broadcaster.flush()
 
 
 if __name__ == '__main__':
@@ -1,3 +1,12 @@
 from django.contrib import admin
+from .models import SurgeryType, SurgeryKitItem
 
-# Register your models here.
+class SurgeryKitItemInline(admin.TabularInline):
+    model = SurgeryKitItem
+    extra = 1
+
+@admin.register(SurgeryType)
+class SurgeryTypeAdmin(admin.ModelAdmin):
+    list_display = ('name', 'duration', 'updated_at')
+    search_fields = ('name', 'description')
+    inlines = [SurgeryKitItemInline]
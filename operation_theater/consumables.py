@@ -0,0 +1,129 @@
+"""
+Surgery consumables and inventory stock.
+
+Consumables linked to an inventory ``Item`` are taken out of stock when the
+surgery is completed. ``deduct_consumables()`` sends all of a surgery's
+pending consumables to the stock ledger as one batch of ``OUT`` movements
+(one transaction, one conditional ``UPDATE`` for all the items). If any item
+is short, nothing is deducted and ``InsufficientStock`` says which items.
+Consumables recorded on a surgery that is already completed are deducted
+straight away.
+
+``apply_kit()`` copies the standard kit of the surgery's type onto it, so
+the theater staff only record what differs from the kit.
+
+``consumption_by_theater()`` totals the deducted consumables per theater and
+item with two grouped queries.
+"""
+from collections import OrderedDict
+
+from django.db import transaction
+from django.db.models import Count, DecimalField, ExpressionWrapper, F, Sum
+from django.utils import timezone
+
+from inventory import ledger
+
+from .models import Surgery, SurgeryConsumable
+
+
+def deduct_consumables(surgery, user=None):
+    """Take every pending item-linked consumable of ``surgery`` out of stock; returns them"""
+    with transaction.atomic():
+        # Locking the surgery serialises two completions of the same surgery
+        Surgery.objects.select_for_update().filter(pk=surgery.pk).exists()
+        pending = list(
+            SurgeryConsumable.objects.filter(surgery=surgery, item__isnull=False, deducted_at__isnull=True)
+            .select_related('item')
+        )
+        if not pending:
+            return []
+
+        ledger.apply_movements([
+            {
+                'item': consumable.item_id,
+                'movement_type': 'OUT',
+                'quantity': consumable.quantity,
+                'reference': f'Surgery #{surgery.pk}',
+                'notes': f'{surgery.operation_theater.name}: {consumable.name}',
+            }
+            for consumable in pending
+        ], user=user)
+        now = timezone.now()
+        SurgeryConsumable.objects.filter(pk__in=[c.pk for c in pending]).update(deducted_at=now)
+        for consumable in pending:
+            consumable.deducted_at = now
+    return pending
+
+
+def shortage_message(error):
+    """Readable list of the items an ``InsufficientStock`` refused"""
+    from inventory.models import Item
+
+    names = dict(Item.objects.filter(pk__in=error.shortages).values_list('pk', 'name'))
+    return ', '.join(
+        f'{names.get(item_id, item_id)} ({requested} needed, {available} in stock)'
+        for item_id, (requested, available) in error.shortages.items()
+    )
+
+
+def apply_kit(surgery, user=None):
+    """Record the surgery type's standard kit items not already on the surgery; returns the new rows"""
+    if surgery.surgery_type_id is None:
+        return []
+    recorded = set(
+        SurgeryConsumable.objects.filter(surgery=surgery, item__isnull=False).values_list('item_id', flat=True)
+    )
+    created = SurgeryConsumable.objects.bulk_create([
+        SurgeryConsumable(
+            surgery=surgery,
+            item=kit_item.item,
+            name=kit_item.item.name,
+            quantity=kit_item.quantity,
+            unit=kit_item.item.unit,
+            notes='Standard kit',
+            recorded_by=user,
+        )
+        for kit_item in surgery.surgery_type.kit_items.select_related('item')
+        if kit_item.item_id not in recorded
+    ])
+    return created
+
+
+def consumption_by_theater(start, end):
+    """Per-theater totals and item breakdown of the stock deducted for surgeries between two dates"""
+    used = SurgeryConsumable.objects.filter(
+        deducted_at__isnull=False,
+        surgery__scheduled_date__gte=start,
+        surgery__scheduled_date__lte=end,
+    )
+    value = ExpressionWrapper(
+        F('quantity') * F('item__price_per_unit'), output_field=DecimalField(max_digits=14, decimal_places=2)
+    )
+
+    theaters = OrderedDict()
+    for row in (
+        used.values('surgery__operation_theater_id', 'surgery__operation_theater__name')
+        .annotate(surgeries=Count('surgery', distinct=True), used=Sum('quantity'), used_value=Sum(value))
+        .order_by('surgery__operation_theater__name')
+    ):
+        theaters[row['surgery__operation_theater_id']] = {
+            'name': row['surgery__operation_theater__name'],
+            'surgeries': row['surgeries'],
+            'quantity': row['used'],
+            'value': row['used_value'] or 0,
+            'items': [],
+        }
+
+    for row in (
+        used.values('surgery__operation_theater_id', 'item_id', 'item__name', 'item__unit')
+        .annotate(surgeries=Count('surgery', distinct=True), used=Sum('quantity'), used_value=Sum(value))
+        .order_by('surgery__operation_theater_id', '-used_value', 'item__name')
+    ):
+        theaters[row['surgery__operation_theater_id']]['items'].append({
+            'name': row['item__name'],
+            'unit': row['item__unit'],
+            'surgeries': row['surgeries'],
+            'quantity': row['used'],
+            'value': row['used_value'] or 0,
+        })
+    return list(theaters.values())
@@ -101,18 +101,38 @@ class SurgeryTeamForm(forms.ModelForm):
 class SurgeryConsumableForm(forms.ModelForm):
     class Meta:
         model = SurgeryConsumable
-        fields = ['name', 'quantity', 'unit', 'notes']
+        fields = ['item', 'name', 'quantity', 'unit', 'notes']
         widgets = {
             'notes': forms.Textarea(attrs={'rows': 2, 'class': 'form-control'}),
         }
     
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
+        from inventory.models import Item
+
+        # Inventory items are deducted from stock; the name is only needed for anything else
+        self.fields['item'].queryset = Item.objects.filter(is_active=True).only('name', 'unit').order_by('name')
+        self.fields['item'].required = False
+        self.fields['name'].required = False
+        self.fields['unit'].required = False
+
         # Add Bootstrap classes to all fields
         for field_name, field in self.fields.items():
             if field_name != 'notes':
                 field.widget.attrs.update({'class': 'form-control'})
 
+    def clean(self):
+        cleaned_data = super().clean()
+        item = cleaned_data.get('item')
+        if item:
+            cleaned_data['name'] = item.name
+            cleaned_data['unit'] = item.unit
+        elif not cleaned_data.get('name'):
+            raise ValidationError('Select an inventory item or enter the consumable name.')
+        else:
+            cleaned_data['unit'] = cleaned_data.get('unit') or 'pcs'
+        return cleaned_data
+
 class SurgeryStatusForm(forms.ModelForm):
     class Meta:
         model = Surgery
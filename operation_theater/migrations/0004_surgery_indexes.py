@@ -0,0 +1,25 @@
+# Generated by Django 5.0.14 on 2026-10-19 07:59
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('doctors', '0002_specialization_slug'),
+        ('operation_theater', '0003_alter_surgery_surgery_type'),
+        ('patients', '0013_payment_expense_indexes'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='surgery',
+            index=models.Index(fields=['operation_theater', 'scheduled_date', 'status'], name='ot_surgery_theater_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='surgery',
+            index=models.Index(fields=['scheduled_date', 'start_time'], name='ot_surgery_date_time_idx'),
+        ),
+    ]
@@ -0,0 +1,41 @@
+# Generated by Django 5.0.14 on 2026-10-19 08:26
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0004_reorder_forecasts'),
+        ('operation_theater', '0004_surgery_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='surgeryconsumable',
+            name='deducted_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='surgeryconsumable',
+            name='item',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.PROTECT, related_name='surgery_consumables', to='inventory.item'),
+        ),
+        migrations.CreateModel(
+            name='SurgeryKitItem',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('quantity', models.PositiveIntegerField(default=1)),
+                ('item', models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, related_name='surgery_kits', to='inventory.item')),
+                ('surgery_type', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='kit_items', to='operation_theater.surgerytype')),
+            ],
+            options={
+                'ordering': ['surgery_type', 'item__name'],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='surgerykititem',
+            constraint=models.UniqueConstraint(fields=('surgery_type', 'item'), name='ot_kit_type_item_uniq'),
+        ),
+    ]
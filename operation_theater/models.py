@@ -71,20 +71,51 @@ class Surgery(models.Model):
     class Meta:
         verbose_name_plural = "Surgeries"
         ordering = ['-scheduled_date', '-start_time']
+        indexes = [
+            # Per-theater schedule and booking conflict checks
+            models.Index(fields=['operation_theater', 'scheduled_date', 'status'], name='ot_surgery_theater_date_idx'),
+            # Calendar and dashboard queries by date range across all theaters
+            models.Index(fields=['scheduled_date', 'start_time'], name='ot_surgery_date_time_idx'),
+        ]
+
+class SurgeryKitItem(models.Model):
+    """Standard kit of inventory items used by a surgery type."""
+    surgery_type = models.ForeignKey(SurgeryType, on_delete=models.CASCADE, related_name='kit_items')
+    item = models.ForeignKey('inventory.Item', on_delete=models.PROTECT, related_name='surgery_kits')
+    quantity = models.PositiveIntegerField(default=1)
+
+    def __str__(self):
+        return f"{self.item.name} x{self.quantity} - {self.surgery_type}"
+
+    class Meta:
+        ordering = ['surgery_type', 'item__name']
+        constraints = [
+            models.UniqueConstraint(fields=['surgery_type', 'item'], name='ot_kit_type_item_uniq'),
+        ]
 
 class SurgeryConsumable(models.Model):
     """Model to track consumables used in surgeries."""
     surgery = models.ForeignKey(Surgery, on_delete=models.CASCADE, related_name='consumables')
+    # Blank for free-text consumables recorded before they were linked to inventory
+    item = models.ForeignKey(
+        'inventory.Item', on_delete=models.PROTECT, null=True, blank=True, related_name='surgery_consumables'
+    )
     name = models.CharField(max_length=200)
     quantity = models.PositiveIntegerField(default=1)
     unit = models.CharField(max_length=50, default='pcs')
     notes = models.TextField(blank=True)
     used_at = models.DateTimeField(auto_now_add=True)
     recorded_by = models.ForeignKey(User, on_delete=models.SET_NULL, null=True)
+    # Set when the quantity was taken out of inventory stock
+    deducted_at = models.DateTimeField(null=True, blank=True)
 
     def __str__(self):
         return f"{self.name} x{self.quantity} {self.unit} - {self.surgery}"
 
+    @property
+    def is_pending_deduction(self):
+        return self.item_id is not None and self.deducted_at is None
+
     class Meta:
         ordering = ['-used_at']
 
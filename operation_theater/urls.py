@@ -23,6 +23,9 @@ urlpatterns = [
     
     # Consumables URLs
     path('surgeries/<int:surgery_id>/add-consumable/', views.add_consumable, name='add_consumable'),
+    path('surgeries/<int:surgery_id>/apply-kit/', views.apply_surgery_kit, name='apply_surgery_kit'),
+    path('consumables/<int:consumable_id>/remove/', views.remove_consumable, name='remove_consumable'),
+    path('reports/consumption/', views.consumption_report, name='consumption_report'),
     
     # Operation Theater URLs
     path('operation-theaters/', views.OperationTheaterListView.as_view(), name='ot_list'),
@@ -2,6 +2,7 @@ from django.shortcuts import render, get_object_or_404, redirect
 from django.contrib import messages
 from django.contrib.auth.decorators import login_required, user_passes_test
 from django.utils import timezone
+from django.db import transaction
 from django.db.models import Count, Q
 from django.http import JsonResponse, HttpResponse
 from django.views.generic import ListView, DetailView, CreateView, UpdateView, DeleteView
@@ -11,8 +12,12 @@ from django.views.decorators.http import require_http_methods
 import json
 from datetime import datetime, time, date, timedelta
 
+from clinic_project.async_api import async_login_required, fetch_json
+
 from .models import Surgery, SurgeryType, OperationTheater, SurgeryTeam, SurgeryConsumable
 from .forms import SurgeryForm, SurgeryTeamForm, SurgeryConsumableForm, SurgeryStatusForm
+from . import consumables as surgery_consumables
+from inventory.ledger import InsufficientStock
 from patients.models import Patient
 from doctors.models import Doctor
 
@@ -20,6 +25,25 @@ from doctors.models import Doctor
 def is_staff_or_doctor(user):
     return user.is_authenticated and (user.is_staff or hasattr(user, 'doctor'))
 
+def save_surgery(form, request):
+    """Save a surgery form, deducting its consumables from stock if it is now completed.
+
+    Returns the saved surgery, or None (with an error message) if the stock
+    could not cover the consumables, in which case nothing is saved.
+    """
+    try:
+        with transaction.atomic():
+            surgery = form.save()
+            deducted = []
+            if surgery.status == 'completed':
+                deducted = surgery_consumables.deduct_consumables(surgery, request.user)
+    except InsufficientStock as e:
+        messages.error(request, f'Not enough stock for the consumables: {surgery_consumables.shortage_message(e)}')
+        return None
+    if deducted:
+        messages.info(request, f'{len(deducted)} consumable(s) deducted from inventory.')
+    return surgery
+
 # Dashboard View
 @login_required
 @user_passes_test(is_staff_or_doctor)
@@ -188,8 +212,11 @@ class SurgeryUpdateView(LoginRequiredMixin, UserPassesTestMixin, UpdateView):
     template_name = 'operation_theater/surgery_form.html'
     
     def form_valid(self, form):
+        self.object = save_surgery(form, self.request)
+        if self.object is None:
+            return self.form_invalid(form)
         messages.success(self.request, 'Surgery updated successfully.')
-        return super().form_valid(form)
+        return redirect(self.get_success_url())
     
     def get_form_kwargs(self):
         kwargs = super().get_form_kwargs()
@@ -271,14 +298,60 @@ def add_consumable(request, surgery_id):
             consumable = form.save(commit=False)
             consumable.surgery = surgery
             consumable.recorded_by = request.user
-            consumable.save()
-            messages.success(request, 'Consumable added successfully.')
+            try:
+                with transaction.atomic():
+                    consumable.save()
+                    # Completed surgeries have already used their stock
+                    if surgery.status == 'completed':
+                        surgery_consumables.deduct_consumables(surgery, request.user)
+            except InsufficientStock as e:
+                messages.error(request, f'Not enough stock: {surgery_consumables.shortage_message(e)}')
+            else:
+                messages.success(request, 'Consumable added successfully.')
         else:
             for error in form.errors.values():
                 messages.error(request, error)
     
     return redirect('operation_theater:surgery_detail', pk=surgery_id)
 
+# Add the surgery type's standard kit
+@login_required
+@user_passes_test(is_staff_or_doctor)
+@require_http_methods(['POST'])
+def apply_surgery_kit(request, surgery_id):
+    surgery = get_object_or_404(Surgery.objects.select_related('surgery_type'), id=surgery_id)
+    if surgery.surgery_type is None:
+        messages.warning(request, 'This surgery has no surgery type, so there is no standard kit.')
+        return redirect('operation_theater:surgery_detail', pk=surgery_id)
+
+    try:
+        with transaction.atomic():
+            created = surgery_consumables.apply_kit(surgery, request.user)
+            if created and surgery.status == 'completed':
+                surgery_consumables.deduct_consumables(surgery, request.user)
+    except InsufficientStock as e:
+        messages.error(request, f'Not enough stock: {surgery_consumables.shortage_message(e)}')
+    else:
+        if created:
+            messages.success(request, f'{len(created)} kit item(s) added.')
+        else:
+            messages.info(request, f'All {surgery.surgery_type.name} kit items are already recorded.')
+    return redirect('operation_theater:surgery_detail', pk=surgery_id)
+
+# Remove Consumable View
+@login_required
+@user_passes_test(is_staff_or_doctor)
+@require_http_methods(['POST'])
+def remove_consumable(request, consumable_id):
+    consumable = get_object_or_404(SurgeryConsumable, id=consumable_id)
+    surgery_id = consumable.surgery_id
+    if consumable.deducted_at:
+        messages.error(request, 'This consumable has already been deducted from stock; record a stock adjustment instead.')
+    else:
+        consumable.delete()
+        messages.success(request, 'Consumable removed successfully.')
+    return redirect('operation_theater:surgery_detail', pk=surgery_id)
+
 # Update Surgery Status
 @login_required
 @user_passes_test(is_staff_or_doctor)
@@ -287,8 +360,7 @@ def update_surgery_status(request, surgery_id):
     
     if request.method == 'POST':
         form = SurgeryStatusForm(request.POST, instance=surgery)
-        if form.is_valid():
-            form.save()
+        if form.is_valid() and save_surgery(form, request):
             messages.success(request, f'Surgery status updated to {surgery.get_status_display()}.')
     
     return redirect('operation_theater:surgery_detail', pk=surgery_id)
@@ -307,6 +379,30 @@ def update_surgery_notes(request, surgery_id):
     
     return redirect('operation_theater:surgery_detail', pk=surgery_id)
 
+# Consumption Report
+@login_required
+@user_passes_test(is_staff_or_doctor)
+def consumption_report(request):
+    """Inventory used per operation theater, by surgery date (default: the last 30 days)"""
+    today = timezone.localdate()
+    try:
+        end_date = datetime.strptime(request.GET['end'], '%Y-%m-%d').date() if request.GET.get('end') else today
+        start_date = (
+            datetime.strptime(request.GET['start'], '%Y-%m-%d').date() if request.GET.get('start')
+            else end_date - timedelta(days=30)
+        )
+    except ValueError:
+        messages.error(request, 'Invalid date format, showing the last 30 days.')
+        start_date, end_date = today - timedelta(days=30), today
+    
+    theaters = surgery_consumables.consumption_by_theater(start_date, end_date)
+    return render(request, 'operation_theater/consumption_report.html', {
+        'theaters': theaters,
+        'start_date': start_date,
+        'end_date': end_date,
+        'total_value': sum(theater['value'] for theater in theaters),
+    })
+
 # Get Available Time Slots (AJAX)
 @login_required
 @require_http_methods(['GET'])
@@ -367,10 +463,19 @@ def get_available_time_slots(request):
 def ot_calendar(request):
     return render(request, 'operation_theater/ot_calendar.html')
 
+# Status colours for calendar events
+CALENDAR_COLORS = {
+    'completed': '#10B981',  # Green
+    'cancelled': '#EF4444',  # Red
+    'postponed': '#F59E0B',  # Yellow
+    'in_progress': '#3B82F6',  # Blue
+}
+CALENDAR_DEFAULT_COLOR = '#8B5CF6'  # Purple (scheduled)
+
 # Get Calendar Events (AJAX)
-@login_required
+@async_login_required
 @require_http_methods(['GET'])
-def get_calendar_events(request):
+async def get_calendar_events(request):
     start = request.GET.get('start')
     end = request.GET.get('end')
     
@@ -383,36 +488,22 @@ def get_calendar_events(request):
     # Get all surgeries in the date range
     surgeries = Surgery.objects.filter(
         scheduled_date__range=[start_date, end_date]
-    ).select_related('patient__user', 'surgeon__user', 'operation_theater')
+    ).select_related('patient__user', 'surgeon__user', 'operation_theater', 'surgery_type')
     
     # Format events for FullCalendar
-    events = []
-    for surgery in surgeries:
-        # Set color based on status
-        if surgery.status == 'completed':
-            color = '#10B981'  # Green
-        elif surgery.status == 'cancelled':
-            color = '#EF4444'  # Red
-        elif surgery.status == 'postponed':
-            color = '#F59E0B'  # Yellow
-        elif surgery.status == 'in_progress':
-            color = '#3B82F6'  # Blue
-        else:  # scheduled
-            color = '#8B5CF6'  # Purple
-        
-        events.append({
-            'id': surgery.id,
-            'title': f"{surgery.patient.user.get_full_name()} - {surgery.surgery_type.name}",
-            'start': f"{surgery.scheduled_date}T{surgery.start_time}",
-            'end': f"{surgery.scheduled_date}T{surgery.end_time}",
-            'color': color,
-            'extendedProps': {
-                'theater': surgery.operation_theater.name,
-                'surgeon': surgery.surgeon.user.get_full_name(),
-                'status': surgery.get_status_display(),
-                'notes': surgery.notes or ''
-            }
-        })
+    events = await fetch_json(surgeries, lambda surgery: {
+        'id': surgery.id,
+        'title': f"{surgery.patient.user.get_full_name()} - {surgery.surgery_type.name}",
+        'start': f"{surgery.scheduled_date}T{surgery.start_time}",
+        'end': f"{surgery.scheduled_date}T{surgery.end_time}",
+        'color': CALENDAR_COLORS.get(surgery.status, CALENDAR_DEFAULT_COLOR),
+        'extendedProps': {
+            'theater': surgery.operation_theater.name,
+            'surgeon': surgery.surgeon.user.get_full_name(),
+            'status': surgery.get_status_display(),
+            'notes': surgery.notes or ''
+        }
+    })
     
     return JsonResponse(events, safe=False)
 
@@ -0,0 +1,90 @@
+"""
+Maintenance of the denormalized ``PatientAccountSummary`` rows.
+
+Summaries are recomputed from the source bills and payments with two
+grouped aggregate queries per batch of patients, so a refresh costs the same
+whether it covers one patient (a single bill or payment write) or thousands
+(bulk billing, rebuilds).
+"""
+from decimal import Decimal
+
+from django.db.models import F, Min, Q, Sum
+
+from .models import Patient, PatientAccountSummary, PatientBill, PatientPayment
+
+ZERO = Decimal('0')
+BATCH_SIZE = 500
+
+
+def refresh_account_summaries(patient_ids=None):
+    """Recompute account summaries for ``patient_ids`` (all patients if None).
+
+    Patients that no longer exist are skipped, so this is safe to call after
+    deletes. Returns the number of summaries written.
+    """
+    patients = Patient.objects.all()
+    if patient_ids is not None:
+        patient_ids = set(patient_ids)
+        if not patient_ids:
+            return 0
+        patients = patients.filter(id__in=patient_ids)
+    existing_ids = list(patients.values_list('id', flat=True))
+
+    written = 0
+    for start in range(0, len(existing_ids), BATCH_SIZE):
+        written += _refresh_batch(existing_ids[start:start + BATCH_SIZE])
+    return written
+
+
+def _refresh_batch(patient_ids):
+    open_bills = ~Q(status='paid')
+    bill_totals = {
+        row['patient_id']: row
+        for row in PatientBill.objects.filter(patient_id__in=patient_ids).values('patient_id').annotate(
+            billed=Sum('amount'),
+            paid=Sum('paid_amount'),
+            outstanding=Sum(F('amount') - F('paid_amount'), filter=open_bills),
+            oldest_due=Min('due_date', filter=open_bills),
+        ).order_by()
+    }
+    # Bill payments are already reflected in the bills' paid_amount
+    direct_payments = dict(
+        PatientPayment.objects.filter(patient_id__in=patient_ids).exclude(payment_type='bill_payment')
+        .values('patient_id').annotate(total=Sum('amount')).order_by()
+        .values_list('patient_id', 'total')
+    )
+
+    summaries = []
+    for patient_id in patient_ids:
+        bills = bill_totals.get(patient_id, {})
+        summaries.append(PatientAccountSummary(
+            patient_id=patient_id,
+            total_billed=bills.get('billed') or ZERO,
+            total_paid=(bills.get('paid') or ZERO) + (direct_payments.get(patient_id) or ZERO),
+            outstanding=bills.get('outstanding') or ZERO,
+            oldest_unpaid_due_date=bills.get('oldest_due'),
+        ))
+
+    PatientAccountSummary.objects.bulk_create(
+        summaries,
+        update_conflicts=True,
+        unique_fields=['patient'],
+        update_fields=['total_billed', 'total_paid', 'outstanding', 'oldest_unpaid_due_date', 'updated_at'],
+    )
+    return len(summaries)
+
+
+def get_account_summary(patient):
+    """Return the patient's summary, building it on first access"""
+    try:
+        return patient.account_summary
+    except PatientAccountSummary.DoesNotExist:
+        refresh_account_summaries([patient.id])
+        return PatientAccountSummary.objects.get(patient=patient)
+
+
+def top_debtors(limit=100):
+    """Patients with the largest outstanding balance, served from the summary index"""
+    return PatientAccountSummary.objects.filter(outstanding__gt=0).select_related(
+        'patient__user'
+    ).order_by('-outstanding')[:limit]
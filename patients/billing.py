@@ -0,0 +1,242 @@
+"""
+Batch creation of patient bills and payments.
+
+Month-end runs for insurance or corporate panels submit hundreds or
+thousands of rows at once. Instead of one request (and several queries) per
+bill, the helpers here validate a whole batch with a handful of queries,
+reserve all document numbers in one step and insert with ``bulk_create``.
+Each helper returns one result dict per input row, in input order, so the
+caller can report exactly which rows were rejected.
+"""
+from datetime import date, datetime
+from decimal import Decimal, InvalidOperation
+
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from clinic_project import live
+from clinic_project.query_cache import BILLS, PAYMENTS, bump
+
+from .balances import refresh_account_summaries
+from .models import Patient, PatientBill, PatientPayment
+from .sequences import BILL, PAYMENT, next_numbers
+
+BATCH_SIZE = 500
+MAX_ID = 2 ** 63 - 1
+# Largest amount PatientBill.amount and PatientPayment.amount (10 digits, 2 decimals) can hold
+MAX_AMOUNT = Decimal('99999999.99')
+AMOUNT_ERROR = f'Amount must be a number from 0.01 to {MAX_AMOUNT:,}'
+
+
+def _parse_amount(value):
+    try:
+        amount = Decimal(str(value)).quantize(Decimal('0.01'))
+    except (InvalidOperation, TypeError, ValueError):
+        return None
+    if not amount.is_finite():
+        return None
+    # Anything the amount columns cannot hold would fail the whole bulk_create
+    return amount if 0 < amount <= MAX_AMOUNT else None
+
+
+def _parse_date(value):
+    if isinstance(value, date):
+        return value
+    try:
+        return datetime.strptime(str(value), '%Y-%m-%d').date()
+    except (TypeError, ValueError):
+        return None
+
+
+def _parse_id(value):
+    try:
+        value = int(value)
+    except (TypeError, ValueError):
+        return None
+    # Anything the id column cannot hold matches no row
+    return value if 0 < value <= MAX_ID else None
+
+
+def _text(value):
+    """A string field of a JSON row, or '' for anything else (lists and objects are not hashable)"""
+    return value if isinstance(value, str) else ''
+
+
+def bulk_create_bills(rows, created_by=None):
+    """Validate and create many bills at once.
+
+    Each row is a mapping with ``patient_id``, ``description``, ``amount``,
+    ``due_date`` (``YYYY-MM-DD``) and optional ``notes``.
+    """
+    results = [None] * len(rows)
+    patient_ids = {_parse_id(row.get('patient_id')) for row in rows} - {None}
+    patients = Patient.objects.in_bulk(patient_ids)
+
+    pending = []
+    for index, row in enumerate(rows):
+        patient_id = _parse_id(row.get('patient_id'))
+        description = _text(row.get('description')).strip()
+        amount = _parse_amount(row.get('amount'))
+        due_date = _parse_date(row.get('due_date'))
+
+        if patient_id not in patients:
+            error = 'Patient not found'
+        elif not description:
+            error = 'Description is required'
+        elif amount is None:
+            error = AMOUNT_ERROR
+        elif due_date is None:
+            error = 'Due date must use the YYYY-MM-DD format'
+        else:
+            error = None
+
+        if error:
+            results[index] = {'index': index, 'success': False, 'error': error}
+            continue
+
+        bill = PatientBill(
+            patient=patients[patient_id],
+            description=description[:200],
+            amount=amount,
+            paid_amount=Decimal('0'),
+            due_date=due_date,
+            notes=_text(row.get('notes')),
+            created_by=created_by,
+        )
+        bill.update_status()
+        pending.append((index, bill))
+
+    if pending:
+        with transaction.atomic():
+            numbers = next_numbers(BILL, len(pending))
+            for (index, bill), number in zip(pending, numbers):
+                bill.bill_number = number
+            PatientBill.objects.bulk_create([bill for _, bill in pending], batch_size=BATCH_SIZE)
+            # bulk_create skips post_save, so refresh the balances it affects here
+            refresh_account_summaries({bill.patient_id for _, bill in pending})
+            transaction.on_commit(lambda: bump(BILLS))
+            live.bills_bulk_created([bill for _, bill in pending])
+
+    for index, bill in pending:
+        results[index] = {
+            'index': index,
+            'success': True,
+            'id': bill.pk,
+            'bill_number': bill.bill_number,
+        }
+    return results
+
+
+def bulk_record_payments(rows):
+    """Validate and record many payments at once.
+
+    A row either settles a bill (``bill_id`` or ``bill_number``) or records a
+    standalone payment (``patient_id`` plus ``payment_type``). Every row needs
+    ``amount`` and ``payment_method``; ``notes`` is optional. Several rows may
+    pay the same bill, in which case they are applied in input order.
+    """
+    results = [None] * len(rows)
+    payment_methods = dict(PatientPayment.PAYMENT_METHODS)
+    payment_types = dict(PatientPayment.PAYMENT_TYPES)
+
+    bill_ids = {_parse_id(row.get('bill_id')) for row in rows} - {None}
+    bill_numbers = {_text(row.get('bill_number')) for row in rows} - {''}
+    patient_ids = {_parse_id(row.get('patient_id')) for row in rows} - {None}
+
+    with transaction.atomic():
+        bills = PatientBill.objects.select_for_update().filter(
+            Q(id__in=bill_ids) | Q(bill_number__in=bill_numbers)
+        )
+        bills_by_id = {bill.id: bill for bill in bills}
+        bills_by_number = {bill.bill_number: bill for bill in bills_by_id.values()}
+        patients = Patient.objects.in_bulk(patient_ids)
+
+        pending = []
+        touched_bills = {}
+        for index, row in enumerate(rows):
+            amount = _parse_amount(row.get('amount'))
+            bill_number = _text(row.get('bill_number'))
+            payment_type = _text(row.get('payment_type'))
+            payment_method = _text(row.get('payment_method'))
+            notes = _text(row.get('notes')).strip()
+            bill = None
+            error = None
+
+            if row.get('bill_id') or row.get('bill_number'):
+                bill = bills_by_id.get(_parse_id(row.get('bill_id'))) or bills_by_number.get(bill_number)
+                if bill is None:
+                    error = 'Bill not found'
+            elif _parse_id(row.get('patient_id')) not in patients:
+                error = 'Patient not found'
+            elif payment_type not in payment_types:
+                error = 'Invalid payment type'
+
+            if error is None:
+                if amount is None:
+                    error = AMOUNT_ERROR
+                elif payment_method not in payment_methods:
+                    error = 'Invalid payment method'
+                elif bill is not None and amount > bill.remaining_amount:
+                    error = 'Payment amount cannot exceed remaining balance'
+
+            if error:
+                results[index] = {'index': index, 'success': False, 'error': error}
+                continue
+
+            if bill is not None:
+                bill.paid_amount += amount
+                bill.update_status()
+                touched_bills[bill.id] = bill
+                payment = PatientPayment(
+                    patient_id=bill.patient_id,
+                    payment_type='bill_payment',
+                    amount=amount,
+                    payment_method=payment_method,
+                    notes=f'Payment for bill {bill.bill_number}. {notes}'.strip(),
+                )
+            else:
+                payment = PatientPayment(
+                    patient=patients[_parse_id(row.get('patient_id'))],
+                    payment_type=payment_type,
+                    amount=amount,
+                    payment_method=payment_method,
+                    notes=notes,
+                )
+            pending.append((index, payment, bill))
+
+        if pending:
+            numbers = next_numbers(PAYMENT, len(pending))
+            for (index, payment, bill), number in zip(pending, numbers):
+                payment.payment_number = number
+            PatientPayment.objects.bulk_create([payment for _, payment, _ in pending], batch_size=BATCH_SIZE)
+
+        if touched_bills:
+            now = timezone.now()
+            for bill in touched_bills.values():
+                bill.updated_at = now
+            PatientBill.objects.bulk_update(
+                touched_bills.values(), ['paid_amount', 'status', 'updated_at'], batch_size=BATCH_SIZE
+            )
+
+        if pending:
+            refresh_account_summaries({payment.patient_id for _, payment, _ in pending})
+            # bulk_create/bulk_update skip the signals that normally bump the query cache
+            transaction.on_commit(lambda: bump(PAYMENTS, BILLS))
+            live.payments_bulk_created(
+                [payment for _, payment, _ in pending],
+                settled_bills=[bill for bill in touched_bills.values() if bill.status == 'paid'],
+            )
+
+    for index, payment, bill in pending:
+        result = {
+            'index': index,
+            'success': True,
+            'id': payment.pk,
+            'payment_number': payment.payment_number,
+        }
+        if bill is not None:
+            result['bill_number'] = bill.bill_number
+            result['bill_status'] = bill.status
+        results[index] = result
+    return results
@@ -0,0 +1,118 @@
+"""
+Time series for the finance dashboards.
+
+Revenue (patient payments) and expenses are bucketed by day, week or month
+with a single grouped ``Trunc*`` query per table, instead of one aggregate
+per period. Results are memoized per (range, granularity) in the versioned
+query cache, so they are recomputed only after payments or expenses change.
+"""
+from datetime import date, timedelta
+from decimal import Decimal
+
+from django.db.models import DateField, Sum
+from django.db.models.functions import TruncDay, TruncMonth, TruncWeek
+
+from clinic_project.query_cache import EXPENSES, PAYMENTS, cached_result
+
+from .models import Expense, ExpenseCategory, PatientPayment
+
+ZERO = Decimal('0')
+
+TRUNCATE = {
+    'day': TruncDay,
+    'week': TruncWeek,
+    'month': TruncMonth,
+}
+
+
+def period_start(value, granularity):
+    """First day of the period that contains ``value``"""
+    if granularity == 'month':
+        return value.replace(day=1)
+    if granularity == 'week':
+        return value - timedelta(days=value.weekday())
+    return value
+
+
+def next_period(value, granularity):
+    """First day of the period following the one starting at ``value``"""
+    if granularity == 'month':
+        return (value.replace(day=28) + timedelta(days=4)).replace(day=1)
+    if granularity == 'week':
+        return value + timedelta(days=7)
+    return value + timedelta(days=1)
+
+
+def shift_periods(value, granularity, count):
+    """Start of the period ``count`` periods before the one containing ``value``"""
+    start = period_start(value, granularity)
+    for _ in range(count):
+        start = period_start(start - timedelta(days=1), granularity)
+    return start
+
+
+def period_label(value, granularity):
+    if granularity == 'month':
+        return value.strftime('%b')
+    return value.strftime('%b %d')
+
+
+def _grouped_totals(queryset, date_field, date_lookup, granularity, start, end):
+    """Sum ``amount`` per period for rows dated ``start <= date < end``"""
+    period = TRUNCATE[granularity](date_field, output_field=DateField())
+    rows = queryset.filter(**{
+        f'{date_lookup}__gte': start,
+        f'{date_lookup}__lt': end,
+    }).annotate(period=period).values('period').annotate(total=Sum('amount')).order_by()
+    return {row['period']: row['total'] or ZERO for row in rows}
+
+
+def revenue_expense_series(start, end=None, granularity='month'):
+    """Revenue, expense and net totals per period between ``start`` and ``end``.
+
+    ``start`` is rounded down to the start of its period and ``end`` (default
+    today) is inclusive. Periods without activity are reported as zero.
+    Returns a dict with ``periods`` (dates), ``labels`` and ``revenue``,
+    ``expenses`` and ``net`` lists of Decimals.
+    """
+    if granularity not in TRUNCATE:
+        raise ValueError(f'Unsupported granularity: {granularity}')
+    start = period_start(start, granularity)
+    end = end or date.today()
+
+    def compute():
+        stop = end + timedelta(days=1)
+        # payment_date is a timestamp, so compare on its (UTC) calendar date
+        revenue = _grouped_totals(PatientPayment.objects.all(), 'payment_date', 'payment_date__date', granularity, start, stop)
+        expenses = _grouped_totals(Expense.objects.all(), 'expense_date', 'expense_date', granularity, start, stop)
+
+        series = {'periods': [], 'labels': [], 'revenue': [], 'expenses': [], 'net': []}
+        current = start
+        while current <= end:
+            period_revenue = revenue.get(current, ZERO)
+            period_expenses = expenses.get(current, ZERO)
+            series['periods'].append(current)
+            series['labels'].append(period_label(current, granularity))
+            series['revenue'].append(period_revenue)
+            series['expenses'].append(period_expenses)
+            series['net'].append(period_revenue - period_expenses)
+            current = next_period(current, granularity)
+        return series
+
+    return cached_result('finance:series', [PAYMENTS, EXPENSES], compute, params=[granularity, start, end])
+
+
+def expenses_by_category(start, end=None):
+    """Expense totals per category between ``start`` and ``end`` (inclusive), largest first"""
+    end = end or date.today()
+
+    def compute():
+        # Category ids: a renamed category bumps no group, so names are joined on every call
+        return list(
+            Expense.objects.filter(expense_date__gte=start, expense_date__lte=end)
+            .values_list('category_id').annotate(total=Sum('amount')).order_by('-total')
+        )
+
+    totals = cached_result('finance:category_totals', [EXPENSES], compute, params=[start, end])
+    names = dict(ExpenseCategory.objects.filter(pk__in=[pk for pk, _ in totals]).values_list('pk', 'name'))
+    return [(names.get(pk), total) for pk, total in totals]
@@ -0,0 +1,75 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.contrib.auth import get_user_model
+import csv
+import json
+import time
+from patients.billing import bulk_create_bills, bulk_record_payments
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    help = 'Create patient bills or payments in bulk from a CSV or JSON file'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', type=str, help='CSV file with a header row, or a JSON list of objects')
+        parser.add_argument(
+            '--kind',
+            choices=['bills', 'payments'],
+            default='bills',
+            help='Whether the rows are bills (patient_id, description, amount, due_date) '
+                 'or payments (bill_id/bill_number or patient_id+payment_type, amount, payment_method)'
+        )
+        parser.add_argument(
+            '--created-by',
+            type=str,
+            help='Email of the user recorded as creator of the bills'
+        )
+
+    def handle(self, *args, **options):
+        rows = self.load_rows(options['path'])
+        if not rows:
+            self.stdout.write(self.style.WARNING('No rows found'))
+            return
+
+        created_by = None
+        if options['created_by']:
+            try:
+                created_by = User.objects.get(email=options['created_by'])
+            except User.DoesNotExist:
+                raise CommandError(f"User {options['created_by']} not found")
+
+        started = time.perf_counter()
+        if options['kind'] == 'bills':
+            results = bulk_create_bills(rows, created_by=created_by)
+        else:
+            results = bulk_record_payments(rows)
+        elapsed = time.perf_counter() - started
+
+        failed = [result for result in results if not result['success']]
+        for result in failed:
+            # Report rows 1-based to match what the user sees in the file
+            self.stdout.write(self.style.ERROR(f"Row {result['index'] + 1}: {result['error']}"))
+
+        created = len(results) - len(failed)
+        rate = created / elapsed if elapsed > 0 else created
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Created {created} {options['kind']} ({len(failed)} rejected) "
+                f"in {elapsed:.2f}s ({rate:,.0f} rows/s)"
+            )
+        )
+
+    def load_rows(self, path):
+        try:
+            with open(path, newline='', encoding='utf-8') as handle:
+                if path.lower().endswith('.json'):
+                    rows = json.load(handle)
+                else:
+                    rows = list(csv.DictReader(handle))
+        except (OSError, ValueError) as e:
+            raise CommandError(f'Could not read {path}: {e}')
+
+        if not isinstance(rows, list) or not all(isinstance(row, dict) for row in rows):
+            raise CommandError('Expected a list of objects')
+        return rows
@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand
+from patients.balances import refresh_account_summaries
+
+
+class Command(BaseCommand):
+    help = 'Rebuild denormalized patient account summaries from bills and payments'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--patient',
+            type=int,
+            action='append',
+            dest='patient_ids',
+            help='Only rebuild this patient (may be given several times)'
+        )
+
+    def handle(self, *args, **options):
+        written = refresh_account_summaries(options['patient_ids'])
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt {written} account summaries'))
@@ -0,0 +1,56 @@
+# Generated by Django 5.0.14 on 2026-10-19 07:44
+
+from django.db import migrations, models
+
+
+def seed_sequences(apps, schema_editor):
+    """Continue numbering from existing bills and keep legacy PAY-<id> numbers"""
+    DocumentSequence = apps.get_model('patients', 'DocumentSequence')
+    PatientBill = apps.get_model('patients', 'PatientBill')
+    PatientPayment = apps.get_model('patients', 'PatientPayment')
+
+    last_bill = 0
+    for bill_number in PatientBill.objects.values_list('bill_number', flat=True).iterator():
+        try:
+            last_bill = max(last_bill, int(bill_number.split('-')[1]))
+        except (IndexError, ValueError):
+            continue
+
+    payments = list(PatientPayment.objects.filter(payment_number__isnull=True).only('id'))
+    for payment in payments:
+        payment.payment_number = f'PAY-{payment.id:06d}'
+    PatientPayment.objects.bulk_update(payments, ['payment_number'], batch_size=500)
+    last_payment = PatientPayment.objects.aggregate(last=models.Max('id'))['last'] or 0
+
+    DocumentSequence.objects.update_or_create(name='bill', defaults={'last_value': last_bill})
+    DocumentSequence.objects.update_or_create(name='payment', defaults={'last_value': last_payment})
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('patients', '0009_doctorpayment'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DocumentSequence',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=50, unique=True)),
+                ('last_value', models.PositiveBigIntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'verbose_name': 'document sequence',
+                'verbose_name_plural': 'document sequences',
+                'ordering': ['name'],
+            },
+        ),
+        migrations.AddField(
+            model_name='patientpayment',
+            name='payment_number',
+            field=models.CharField(blank=True, max_length=20, null=True, unique=True),
+        ),
+        migrations.RunPython(seed_sequences, migrations.RunPython.noop),
+    ]
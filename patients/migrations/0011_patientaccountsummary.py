@@ -0,0 +1,70 @@
+# Generated by Django 5.0.14 on 2026-10-19 07:46
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import F, Min, Q, Sum
+
+
+def build_summaries(apps, schema_editor):
+    """Backfill a summary row for every existing patient"""
+    Patient = apps.get_model('patients', 'Patient')
+    PatientBill = apps.get_model('patients', 'PatientBill')
+    PatientPayment = apps.get_model('patients', 'PatientPayment')
+    PatientAccountSummary = apps.get_model('patients', 'PatientAccountSummary')
+
+    open_bills = ~Q(status='paid')
+    bill_totals = {
+        row['patient_id']: row
+        for row in PatientBill.objects.values('patient_id').annotate(
+            billed=Sum('amount'),
+            paid=Sum('paid_amount'),
+            outstanding=Sum(F('amount') - F('paid_amount'), filter=open_bills),
+            oldest_due=Min('due_date', filter=open_bills),
+        ).order_by()
+    }
+    direct_payments = dict(
+        PatientPayment.objects.exclude(payment_type='bill_payment')
+        .values('patient_id').annotate(total=Sum('amount')).order_by()
+        .values_list('patient_id', 'total')
+    )
+
+    summaries = []
+    for patient_id in Patient.objects.values_list('id', flat=True).iterator():
+        bills = bill_totals.get(patient_id, {})
+        summaries.append(PatientAccountSummary(
+            patient_id=patient_id,
+            total_billed=bills.get('billed') or 0,
+            total_paid=(bills.get('paid') or 0) + (direct_payments.get(patient_id) or 0),
+            outstanding=bills.get('outstanding') or 0,
+            oldest_unpaid_due_date=bills.get('oldest_due'),
+        ))
+    PatientAccountSummary.objects.bulk_create(summaries, batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('patients', '0010_documentsequence_patientpayment_payment_number'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PatientAccountSummary',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('total_billed', models.DecimalField(decimal_places=2, default=0, max_digits=12)),
+                ('total_paid', models.DecimalField(decimal_places=2, default=0, max_digits=12)),
+                ('outstanding', models.DecimalField(decimal_places=2, default=0, max_digits=12)),
+                ('oldest_unpaid_due_date', models.DateField(blank=True, null=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('patient', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='account_summary', to='patients.patient')),
+            ],
+            options={
+                'verbose_name': 'patient account summary',
+                'verbose_name_plural': 'patient account summaries',
+                'ordering': ['-outstanding'],
+                'indexes': [models.Index(fields=['-outstanding'], name='patients_acct_outstanding_idx'), models.Index(fields=['oldest_unpaid_due_date'], name='patients_acct_oldest_due_idx')],
+            },
+        ),
+        migrations.RunPython(build_summaries, migrations.RunPython.noop),
+    ]
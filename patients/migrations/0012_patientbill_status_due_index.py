@@ -0,0 +1,17 @@
+# Generated by Django 5.0.14 on 2026-10-19 07:47
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('patients', '0011_patientaccountsummary'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='patientbill',
+            index=models.Index(fields=['status', 'due_date'], name='patients_bill_status_due_idx'),
+        ),
+    ]
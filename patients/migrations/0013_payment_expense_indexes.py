@@ -0,0 +1,25 @@
+# Generated by Django 5.0.14 on 2026-10-19 07:59
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('patients', '0012_patientbill_status_due_index'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='expense',
+            index=models.Index(fields=['expense_date', 'category'], name='patients_expense_date_cat_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='patientpayment',
+            index=models.Index(fields=['payment_date'], name='patients_payment_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='patientpayment',
+            index=models.Index(fields=['patient', 'payment_date'], name='patients_pay_patient_date_idx'),
+        ),
+    ]
@@ -148,6 +148,7 @@ class PatientPayment(models.Model):
         on_delete=models.CASCADE,
         related_name='payments'
     )
+    payment_number = models.CharField(max_length=20, unique=True, blank=True, null=True)
     payment_type = models.CharField(max_length=20, choices=PAYMENT_TYPES, default='registration')
     amount = models.DecimalField(max_digits=10, decimal_places=2)
     payment_method = models.CharField(max_length=20, choices=PAYMENT_METHODS)
@@ -160,9 +161,86 @@ class PatientPayment(models.Model):
         verbose_name = _('patient payment')
         verbose_name_plural = _('patient payments')
         ordering = ['-payment_date']
+        indexes = [
+            # Month-to-date revenue and finance time series
+            models.Index(fields=['payment_date'], name='patients_payment_date_idx'),
+            # Payment history and doctor revenue matching per patient
+            models.Index(fields=['patient', 'payment_date'], name='patients_pay_patient_date_idx'),
+        ]
     
     def __str__(self):
         return f"{self.patient.full_name} - ${self.amount} ({self.get_payment_type_display()})"
+    
+    def save(self, *args, **kwargs):
+        if not self.payment_number:
+            from .sequences import PAYMENT, next_number
+            self.payment_number = next_number(PAYMENT)
+        super().save(*args, **kwargs)
+
+
+class PatientBillQuerySet(models.QuerySet):
+    """Overdue and balance logic evaluated in SQL rather than per object"""
+    
+    AGING_BUCKETS = ('0-30', '31-60', '61-90', '90+')
+    # Listed rather than written as status != 'paid' so the (status, due_date) index applies
+    OPEN_STATUSES = ('unpaid', 'partially_paid')
+    
+    @staticmethod
+    def overdue_q(today=None):
+        """Condition for an overdue bill: due_date < today AND status != 'paid'"""
+        from datetime import date
+        return models.Q(
+            status__in=PatientBillQuerySet.OPEN_STATUSES, due_date__lt=today or date.today()
+        )
+    
+    def open(self):
+        return self.filter(status__in=self.OPEN_STATUSES)
+    
+    def overdue(self, today=None):
+        return self.filter(self.overdue_q(today))
+    
+    def with_overdue(self, today=None):
+        """Annotate ``balance_due`` and ``overdue`` (due_date < today AND status != 'paid')"""
+        from datetime import date
+        today = today or date.today()
+        return self.annotate(
+            balance_due=models.ExpressionWrapper(
+                models.F('amount') - models.F('paid_amount'),
+                output_field=models.DecimalField(max_digits=10, decimal_places=2)
+            ),
+            overdue=models.Case(
+                models.When(self.overdue_q(today), then=models.Value(True)),
+                default=models.Value(False),
+                output_field=models.BooleanField()
+            ),
+        )
+    
+    def aging_report(self, today=None):
+        """Overdue bills grouped into 0-30/31-60/61-90/90+ day buckets in one query"""
+        from datetime import date, timedelta
+        from decimal import Decimal
+        today = today or date.today()
+        bucket = models.Case(
+            models.When(due_date__gte=today - timedelta(days=30), then=models.Value('0-30')),
+            models.When(due_date__gte=today - timedelta(days=60), then=models.Value('31-60')),
+            models.When(due_date__gte=today - timedelta(days=90), then=models.Value('61-90')),
+            default=models.Value('90+'),
+            output_field=models.CharField()
+        )
+        rows = {
+            row['bucket']: row
+            for row in self.overdue(today).annotate(bucket=bucket).values('bucket').annotate(
+                bill_count=models.Count('id'),
+                patient_count=models.Count('patient', distinct=True),
+                outstanding=models.Sum(models.F('amount') - models.F('paid_amount')),
+            ).order_by()
+        }
+        return [{
+            'bucket': name,
+            'bill_count': rows.get(name, {}).get('bill_count', 0),
+            'patient_count': rows.get(name, {}).get('patient_count', 0),
+            'outstanding': rows.get(name, {}).get('outstanding') or Decimal('0'),
+        } for name in self.AGING_BUCKETS]
 
 
 class PatientBill(models.Model):
@@ -196,10 +274,16 @@ class PatientBill(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     
+    objects = PatientBillQuerySet.as_manager()
+    
     class Meta:
         verbose_name = _('patient bill')
         verbose_name_plural = _('patient bills')
         ordering = ['-bill_date']
+        indexes = [
+            # Open/overdue bill filters and the aging report
+            models.Index(fields=['status', 'due_date'], name='patients_bill_status_due_idx'),
+        ]
     
     def __str__(self):
         return f"{self.bill_number} - {self.patient.full_name} - ${self.amount}"
@@ -225,15 +309,15 @@ class PatientBill(models.Model):
     
     def save(self, *args, **kwargs):
         if not self.bill_number:
-            # Generate bill number
-            last_bill = PatientBill.objects.order_by('-id').first()
-            if last_bill:
-                last_number = int(last_bill.bill_number.split('-')[1])
-                self.bill_number = f'BILL-{last_number + 1:06d}'
-            else:
-                self.bill_number = 'BILL-000001'
+            # Reserve the next bill number from the shared document sequence
+            from .sequences import BILL, next_number
+            self.bill_number = next_number(BILL)
         
-        # Ensure amounts are Decimal for proper comparison
+        self.update_status()
+        super().save(*args, **kwargs)
+    
+    def update_status(self):
+        """Normalize amounts to Decimal and derive status from the paid amount"""
         from decimal import Decimal
         
         # Convert to Decimal if needed
@@ -249,8 +333,53 @@ class PatientBill(models.Model):
             self.status = 'partially_paid'
         else:
             self.status = 'unpaid'
-            
-        super().save(*args, **kwargs)
+
+
+class PatientAccountSummary(models.Model):
+    """Denormalized per-patient billing totals, kept current on bill and payment writes"""
+    patient = models.OneToOneField(
+        Patient,
+        on_delete=models.CASCADE,
+        related_name='account_summary'
+    )
+    total_billed = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    total_paid = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    outstanding = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    # Earliest due date among unpaid bills; the patient is overdue once it has passed
+    oldest_unpaid_due_date = models.DateField(blank=True, null=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    class Meta:
+        verbose_name = _('patient account summary')
+        verbose_name_plural = _('patient account summaries')
+        ordering = ['-outstanding']
+        indexes = [
+            models.Index(fields=['-outstanding'], name='patients_acct_outstanding_idx'),
+            models.Index(fields=['oldest_unpaid_due_date'], name='patients_acct_oldest_due_idx'),
+        ]
+    
+    def __str__(self):
+        return f"{self.patient} - outstanding ${self.outstanding}"
+    
+    @property
+    def is_overdue(self):
+        from datetime import date
+        return self.oldest_unpaid_due_date is not None and self.oldest_unpaid_due_date < date.today()
+
+
+class DocumentSequence(models.Model):
+    """Counter backing human-readable document numbers (BILL-..., PAY-...)"""
+    name = models.CharField(max_length=50, unique=True)
+    last_value = models.PositiveBigIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    class Meta:
+        verbose_name = _('document sequence')
+        verbose_name_plural = _('document sequences')
+        ordering = ['name']
+    
+    def __str__(self):
+        return f"{self.name}: {self.last_value}"
 
 
 class ExpenseCategory(models.Model):
@@ -331,6 +460,10 @@ class Expense(models.Model):
         verbose_name = _('expense')
         verbose_name_plural = _('expenses')
         ordering = ['-expense_date', '-created_at']
+        indexes = [
+            # Monthly totals and the per-category breakdown for a date range
+            models.Index(fields=['expense_date', 'category'], name='patients_expense_date_cat_idx'),
+        ]
     
     def __str__(self):
         return f"{self.description} - ${self.amount}"
@@ -0,0 +1,87 @@
+"""
+Atomic allocation of human-readable document numbers.
+
+Bills, payments and any future document type draw their numbers from a
+named ``DocumentSequence`` row. A block of numbers is reserved by one
+``UPDATE ... SET last_value = last_value + n`` so concurrent writers never
+read the same value, and batch jobs reserve N numbers at once. Where the
+backend supports ``UPDATE ... RETURNING`` (PostgreSQL, SQLite 3.35+) the
+new value comes back with the update, so an allocation is one round trip.
+Elsewhere the row is read back with a second query while the update still
+holds its lock.
+"""
+from django.db import IntegrityError, connection, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .models import DocumentSequence
+
+BILL = 'bill'
+PAYMENT = 'payment'
+
+PREFIXES = {
+    BILL: 'BILL',
+    PAYMENT: 'PAY',
+}
+
+# Backends whose UPDATE takes a RETURNING clause (SQLite only from 3.35, the
+# same release that allows it on INSERT); MariaDB allows it on INSERT only
+UPDATE_RETURNING_VENDORS = ('postgresql', 'sqlite')
+
+
+def _advance(name, count):
+    """Add ``count`` to sequence ``name``; its new last value, or None if the row does not exist yet"""
+    now = timezone.now()
+    if connection.vendor in UPDATE_RETURNING_VENDORS and connection.features.can_return_columns_from_insert:
+        table = connection.ops.quote_name(DocumentSequence._meta.db_table)
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'UPDATE {table} SET last_value = last_value + %s, updated_at = %s WHERE name = %s '
+                f'RETURNING last_value',
+                [count, connection.ops.adapt_datetimefield_value(now), name],
+            )
+            row = cursor.fetchone()
+        return row[0] if row else None
+
+    sequence = DocumentSequence.objects.filter(name=name)
+    if not sequence.update(last_value=F('last_value') + count, updated_at=now):
+        return None
+    return sequence.values_list('last_value', flat=True).get()
+
+
+def allocate(name, count=1):
+    """Reserve ``count`` consecutive values from sequence ``name``.
+
+    Returns a ``range`` of the reserved integers. The row stays locked until
+    the surrounding transaction commits, so callers that insert inside the
+    same transaction never observe a gap or a duplicate.
+    """
+    if count < 1:
+        raise ValueError('count must be at least 1')
+
+    with transaction.atomic():
+        last_value = _advance(name, count)
+        if last_value is None:
+            try:
+                with transaction.atomic():
+                    DocumentSequence.objects.create(name=name, last_value=count)
+                last_value = count
+            except IntegrityError:
+                # Another process created the sequence first; take our block from it
+                last_value = _advance(name, count)
+
+    return range(last_value - count + 1, last_value + 1)
+
+def format_number(name, value):
+    """Render a sequence value as a document number, e.g. ``BILL-000042``"""
+    return f'{PREFIXES[name]}-{value:06d}'
+
+
+def next_numbers(name, count):
+    """Reserve ``count`` formatted document numbers with one allocation"""
+    return [format_number(name, value) for value in allocate(name, count)]
+
+
+def next_number(name):
+    """Reserve a single formatted document number"""
+    return next_numbers(name, 1)[0]
@@ -0,0 +1,73 @@
+from django.db import transaction
+from django.db.models.signals import post_delete, post_init, post_save
+from django.dispatch import receiver
+from clinic_project.query_cache import BILLS, EXPENSES, PAYMENTS, bump
+from .models import Expense, PatientBill, PatientPayment
+
+
+@receiver(post_save, sender=PatientBill)
+@receiver(post_delete, sender=PatientBill)
+@receiver(post_save, sender=PatientPayment)
+@receiver(post_delete, sender=PatientPayment)
+def refresh_patient_account_summary(sender, instance, **kwargs):
+    """
+    Keep the patient's denormalized account summary in step with bill and payment writes.
+    Deferred until commit so a cascading patient delete does not recreate the row.
+    """
+    from .balances import refresh_account_summaries
+
+    patient_id = instance.patient_id
+    transaction.on_commit(lambda: refresh_account_summaries([patient_id]))
+
+
+QUERY_CACHE_GROUPS = {
+    PatientBill: BILLS,
+    PatientPayment: PAYMENTS,
+    Expense: EXPENSES,
+}
+
+
+@receiver(post_save, sender=PatientBill)
+@receiver(post_delete, sender=PatientBill)
+@receiver(post_save, sender=PatientPayment)
+@receiver(post_delete, sender=PatientPayment)
+@receiver(post_save, sender=Expense)
+@receiver(post_delete, sender=Expense)
+def bump_query_cache(sender, instance, **kwargs):
+    """Invalidate cached finance aggregates once the write is committed"""
+    group = QUERY_CACHE_GROUPS[sender]
+    transaction.on_commit(lambda: bump(group))
+
+
+@receiver(post_init, sender=PatientBill)
+def remember_bill_status(sender, instance, **kwargs):
+    # Read from __dict__ so a deferred status field is not fetched just for this
+    instance._loaded_status = instance.__dict__.get('status')
+
+
+@receiver(post_save, sender=PatientBill)
+def publish_bill_event(sender, instance, created, **kwargs):
+    """Push new and settled bills to the live dashboards"""
+    from clinic_project import live
+
+    if created:
+        live.bill_created(instance)
+    elif instance.status == 'paid' and instance._loaded_status != 'paid':
+        live.bill_paid(instance)
+    instance._loaded_status = instance.status
+
+
+@receiver(post_save, sender=PatientPayment)
+def publish_payment_event(sender, instance, created, **kwargs):
+    from clinic_project import live
+
+    if created:
+        live.payment_created(instance)
+
+
+@receiver(post_save, sender=Expense)
+def publish_expense_event(sender, instance, created, **kwargs):
+    from clinic_project import live
+
+    if created:
+        live.expense_created(instance)
@@ -4,7 +4,7 @@ from django.contrib.auth import get_user_model
 from django.contrib import messages
 from django.utils import timezone
 from django.core.paginator import Paginator, EmptyPage, PageNotAnInteger
-from django.db.models import Q
+from django.db.models import F, Q
 from django.db import transaction
 import csv
 import io
@@ -283,9 +283,18 @@ def patient_list(request):
         return redirect('home')
     
     search_query = request.GET.get('search', '')
+    sort = request.GET.get('sort', '')
     
     # Get all active patients (same as EMR patient selection)
-    patients = Patient.objects.select_related('user').filter(is_active=True).order_by('-created_at')
+    patients = Patient.objects.select_related('user', 'account_summary').filter(is_active=True).order_by('-created_at')
+    
+    # Balance sorting/filtering uses the indexed account summary instead of scanning bills
+    if sort == 'balance':
+        patients = patients.order_by(F('account_summary__outstanding').desc(nulls_last=True), '-created_at')
+    elif sort == 'overdue':
+        patients = patients.filter(
+            account_summary__oldest_unpaid_due_date__lt=date.today()
+        ).order_by('account_summary__oldest_unpaid_due_date')
     
     if search_query:
         patients = patients.filter(
@@ -310,6 +319,7 @@ def patient_list(request):
     context = {
         'patients': patients_page,
         'search_query': search_query,
+        'sort': sort,
         'active_page': 'patients',
         'is_admin': True,
         'page_obj': patients_page,